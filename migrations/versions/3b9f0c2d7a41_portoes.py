@@ -0,0 +1,36 @@
+"""portoes
+
+Revision ID: 3b9f0c2d7a41
+Revises: 692ce065558e
+Create Date: 2026-10-18 09:12:40.511204
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "3b9f0c2d7a41"
+down_revision: Union[str, Sequence[str], None] = "692ce065558e"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "portoes",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("nome", sa.String(), nullable=False),
+        sa.Column("posicao_x", sa.Integer(), nullable=False),
+        sa.Column("posicao_y", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("nome"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("portoes")
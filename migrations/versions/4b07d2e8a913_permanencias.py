@@ -0,0 +1,91 @@
+"""permanencias
+
+Revision ID: 4b07d2e8a913
+Revises: e5a93b17f2c6
+Create Date: 2026-10-18 16:02:47.318205
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "4b07d2e8a913"
+down_revision: Union[str, Sequence[str], None] = "e5a93b17f2c6"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "permanencias",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("usuario_id", sa.Integer(), nullable=False),
+        sa.Column("estacionamento_id", sa.Integer(), nullable=False),
+        sa.Column("automovel_id", sa.Integer(), nullable=True),
+        sa.Column("entrada_id", sa.Integer(), nullable=False),
+        sa.Column("entrada_em", sa.DateTime(), nullable=False),
+        sa.Column("saida_id", sa.Integer(), nullable=True),
+        sa.Column("saida_em", sa.DateTime(), nullable=True),
+        sa.Column("duracao", sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(["usuario_id"], ["usuarios.id"]),
+        sa.ForeignKeyConstraint(["estacionamento_id"], ["estacionamentos.id"]),
+        sa.ForeignKeyConstraint(["automovel_id"], ["automoveis.id"]),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("entrada_id"),
+    )
+    op.create_index(
+        "ix_permanencias_usuario_entrada",
+        "permanencias",
+        ["usuario_id", "entrada_em"],
+    )
+    op.create_index(
+        "ix_permanencias_estacionamento_entrada",
+        "permanencias",
+        ["estacionamento_id", "entrada_em"],
+    )
+
+    # Carga inicial: cada entrada pareada com o registro seguinte do mesmo
+    # usuário; se for uma saída ela fecha a estadia, se for outra entrada
+    # a estadia termina ali sem saída registrada
+    op.execute(
+        """
+        INSERT INTO permanencias (
+            usuario_id, estacionamento_id, entrada_id, entrada_em,
+            saida_id, saida_em, duracao
+        )
+        SELECT
+            usuario_id,
+            estacionamento_id,
+            id,
+            horario,
+            CASE WHEN proximo_tipo = 'SAIDA' THEN proximo_id END,
+            proximo_em,
+            CAST(ROUND(
+                (julianday(proximo_em) - julianday(horario)) * 86400
+            ) AS INTEGER)
+        FROM (
+            SELECT r.*,
+                LEAD(r.id) OVER seguinte AS proximo_id,
+                LEAD(r.tipo) OVER seguinte AS proximo_tipo,
+                LEAD(r.horario) OVER seguinte AS proximo_em
+            FROM registro_atividade r
+            WINDOW seguinte AS (
+                PARTITION BY r.usuario_id ORDER BY r.horario, r.id
+            )
+        )
+        WHERE tipo = 'ENTRADA'
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(
+        "ix_permanencias_estacionamento_entrada", table_name="permanencias"
+    )
+    op.drop_index("ix_permanencias_usuario_entrada", table_name="permanencias")
+    op.drop_table("permanencias")
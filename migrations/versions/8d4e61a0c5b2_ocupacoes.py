@@ -0,0 +1,56 @@
+"""ocupacoes
+
+Revision ID: 8d4e61a0c5b2
+Revises: 3b9f0c2d7a41
+Create Date: 2026-10-18 11:03:27.184930
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "8d4e61a0c5b2"
+down_revision: Union[str, Sequence[str], None] = "3b9f0c2d7a41"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "ocupacoes",
+        sa.Column("estacionamento_id", sa.Integer(), nullable=False),
+        sa.Column("usuario_id", sa.Integer(), nullable=False),
+        sa.Column("registro_id", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["estacionamento_id"], ["estacionamentos.id"]),
+        sa.ForeignKeyConstraint(["usuario_id"], ["usuarios.id"]),
+        sa.ForeignKeyConstraint(["registro_id"], ["registro_atividade.id"]),
+        sa.PrimaryKeyConstraint("estacionamento_id"),
+    )
+
+    # Carga inicial a partir do histórico: vagas cujo último registro
+    # (por horário, e por id no empate) é uma entrada
+    op.execute(
+        """
+        INSERT INTO ocupacoes (estacionamento_id, usuario_id, registro_id)
+        SELECT r.estacionamento_id, r.usuario_id, r.id
+        FROM registro_atividade r
+        WHERE r.tipo = 'ENTRADA'
+        AND NOT EXISTS (
+            SELECT 1 FROM registro_atividade p
+            WHERE p.estacionamento_id = r.estacionamento_id
+            AND (
+                p.horario > r.horario
+                OR (p.horario = r.horario AND p.id > r.id)
+            )
+        )
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("ocupacoes")
@@ -0,0 +1,76 @@
+"""registro atividade arquivo
+
+Revision ID: 9a6c3f51e2d7
+Revises: 4b07d2e8a913
+Create Date: 2026-10-18 16:48:12.504917
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "9a6c3f51e2d7"
+down_revision: Union[str, Sequence[str], None] = "4b07d2e8a913"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "registro_atividade_arquivo",
+        sa.Column("id", sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column("estacionamento_id", sa.Integer(), nullable=False),
+        sa.Column("usuario_id", sa.Integer(), nullable=False),
+        sa.Column("tipo", sa.SmallInteger(), nullable=False),
+        sa.Column("horario", sa.Integer(), nullable=False),
+        sa.Column("caminho", sa.String(), nullable=False),
+        sa.ForeignKeyConstraint(["estacionamento_id"], ["estacionamentos.id"]),
+        sa.ForeignKeyConstraint(["usuario_id"], ["usuarios.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_registro_atividade_arquivo_horario",
+        "registro_atividade_arquivo",
+        ["horario"],
+    )
+    # Sem AUTOINCREMENT o SQLite reaproveita o maior id que saiu da tabela,
+    # e ele pode já estar no arquivo
+    with op.batch_alter_table(
+        "registro_atividade",
+        recreate="always",
+        table_kwargs={"sqlite_autoincrement": True},
+    ):
+        pass
+    # Histórico completo para as análises, no formato da tabela quente
+    op.execute(
+        """
+        CREATE VIEW registro_atividade_historico AS
+        SELECT id, estacionamento_id, usuario_id, tipo, horario, caminho
+        FROM registro_atividade
+        UNION ALL
+        SELECT
+            id,
+            estacionamento_id,
+            usuario_id,
+            CASE tipo WHEN 0 THEN 'ENTRADA' ELSE 'SAIDA' END,
+            datetime(horario, 'unixepoch'),
+            caminho
+        FROM registro_atividade_arquivo
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP VIEW IF EXISTS registro_atividade_historico")
+    with op.batch_alter_table("registro_atividade", recreate="always"):
+        pass
+    op.drop_index(
+        "ix_registro_atividade_arquivo_horario",
+        table_name="registro_atividade_arquivo",
+    )
+    op.drop_table("registro_atividade_arquivo")
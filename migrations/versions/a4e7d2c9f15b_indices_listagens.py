@@ -0,0 +1,39 @@
+"""indices das listagens
+
+Revision ID: a4e7d2c9f15b
+Revises: d3f8b6a20c94
+Create Date: 2026-10-18 21:12:37.540918
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "a4e7d2c9f15b"
+down_revision: Union[str, Sequence[str], None] = "d3f8b6a20c94"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        "ix_registro_atividade_horario",
+        "registro_atividade",
+        ["horario"],
+    )
+    op.create_index(
+        "ix_automoveis_usuario_id",
+        "automoveis",
+        ["usuario_id"],
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_automoveis_usuario_id", table_name="automoveis")
+    op.drop_index(
+        "ix_registro_atividade_horario", table_name="registro_atividade"
+    )
@@ -0,0 +1,33 @@
+"""versoes
+
+Revision ID: b2d9e4f71a36
+Revises: a4e7d2c9f15b
+Create Date: 2026-10-19 09:14:26.730194
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "b2d9e4f71a36"
+down_revision: Union[str, Sequence[str], None] = "a4e7d2c9f15b"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "versoes",
+        sa.Column("nome", sa.String(), nullable=False),
+        sa.Column("valor", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("nome"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("versoes")
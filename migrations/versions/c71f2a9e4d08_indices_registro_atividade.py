@@ -0,0 +1,43 @@
+"""indices registro_atividade
+
+Revision ID: c71f2a9e4d08
+Revises: 8d4e61a0c5b2
+Create Date: 2026-10-18 13:40:52.907315
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "c71f2a9e4d08"
+down_revision: Union[str, Sequence[str], None] = "8d4e61a0c5b2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        "ix_registro_atividade_estacionamento_horario",
+        "registro_atividade",
+        ["estacionamento_id", "horario"],
+    )
+    op.create_index(
+        "ix_registro_atividade_usuario_horario",
+        "registro_atividade",
+        ["usuario_id", "horario"],
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(
+        "ix_registro_atividade_usuario_horario",
+        table_name="registro_atividade",
+    )
+    op.drop_index(
+        "ix_registro_atividade_estacionamento_horario",
+        table_name="registro_atividade",
+    )
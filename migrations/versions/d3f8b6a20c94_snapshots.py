@@ -0,0 +1,64 @@
+"""snapshots
+
+Revision ID: d3f8b6a20c94
+Revises: 9a6c3f51e2d7
+Create Date: 2026-10-18 17:31:55.102384
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "d3f8b6a20c94"
+down_revision: Union[str, Sequence[str], None] = "9a6c3f51e2d7"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "snapshots",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("ultimo_registro_id", sa.Integer(), nullable=False),
+        sa.Column("horario", sa.DateTime(), nullable=False),
+        sa.Column(
+            "criado_em",
+            sa.DateTime(),
+            server_default=sa.text("(CURRENT_TIMESTAMP)"),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        op.f("ix_snapshots_ultimo_registro_id"),
+        "snapshots",
+        ["ultimo_registro_id"],
+    )
+    op.create_index(op.f("ix_snapshots_horario"), "snapshots", ["horario"])
+    op.create_table(
+        "snapshot_ocupacoes",
+        sa.Column("snapshot_id", sa.Integer(), nullable=False),
+        sa.Column("estacionamento_id", sa.Integer(), nullable=False),
+        sa.Column("usuario_id", sa.Integer(), nullable=False),
+        sa.Column("registro_id", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["snapshot_id"], ["snapshots.id"], ondelete="CASCADE"
+        ),
+        sa.ForeignKeyConstraint(["estacionamento_id"], ["estacionamentos.id"]),
+        sa.ForeignKeyConstraint(["usuario_id"], ["usuarios.id"]),
+        sa.PrimaryKeyConstraint("snapshot_id", "estacionamento_id"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("snapshot_ocupacoes")
+    op.drop_index(op.f("ix_snapshots_horario"), table_name="snapshots")
+    op.drop_index(
+        op.f("ix_snapshots_ultimo_registro_id"), table_name="snapshots"
+    )
+    op.drop_table("snapshots")
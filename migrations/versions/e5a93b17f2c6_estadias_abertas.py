@@ -0,0 +1,55 @@
+"""estadias abertas
+
+Revision ID: e5a93b17f2c6
+Revises: c71f2a9e4d08
+Create Date: 2026-10-18 15:21:09.664120
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e5a93b17f2c6"
+down_revision: Union[str, Sequence[str], None] = "c71f2a9e4d08"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "estadias_abertas",
+        sa.Column("usuario_id", sa.Integer(), nullable=False),
+        sa.Column("estacionamento_id", sa.Integer(), nullable=False),
+        sa.Column("registro_id", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["usuario_id"], ["usuarios.id"]),
+        sa.ForeignKeyConstraint(["estacionamento_id"], ["estacionamentos.id"]),
+        sa.ForeignKeyConstraint(["registro_id"], ["registro_atividade.id"]),
+        sa.PrimaryKeyConstraint("usuario_id"),
+    )
+
+    # Carga inicial: usuários cujo último registro (por horário, e por id
+    # no empate) é uma entrada
+    op.execute(
+        """
+        INSERT INTO estadias_abertas
+            (usuario_id, estacionamento_id, registro_id)
+        SELECT usuario_id, estacionamento_id, id
+        FROM (
+            SELECT r.*, ROW_NUMBER() OVER (
+                PARTITION BY r.usuario_id
+                ORDER BY r.horario DESC, r.id DESC
+            ) AS ordem
+            FROM registro_atividade r
+        )
+        WHERE ordem = 1 AND tipo = 'ENTRADA'
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("estadias_abertas")
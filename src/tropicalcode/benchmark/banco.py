@@ -0,0 +1,164 @@
+"""Benchmark do perfil de conexão SQLite.
+
+Uso:
+    python -m tropicalcode.benchmark.banco --escritores 8 --leitores 4
+
+Roda a mesma carga duas vezes, cada uma num banco temporário novo: com
+as conexões nos padrões do driver e com o perfil do Settings (WAL,
+synchronous, busy_timeout, mmap, cache e foreign_keys). Escritores
+registram entradas e saídas enquanto leitores consultam as vagas livres
+e as estadias abertas; mede a vazão de escrita e a latência de leitura.
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from tropicalcode.benchmark.banco_temporario import popular, url_temporaria
+from tropicalcode.benchmark.lote_sintetico import gerar_lote
+from tropicalcode.benchmark.roteamento import _resumo
+from tropicalcode.database import criar_engine, engine
+from tropicalcode.models import table_registry
+from tropicalcode.repositorios.estacionamento_repo import (
+    get_available_estacionamentos,
+    get_estacionamentos,
+)
+from tropicalcode.repositorios.registro_atividade_repo import (
+    create_registro,
+    get_estadia_aberta,
+)
+from tropicalcode.settings import Settings
+
+
+async def _escritor(motor, pares, operacoes, falhas):
+    # Cada escritor entra e sai com os seus próprios usuários e vagas
+    feitas = 0
+    async with AsyncSession(motor, expire_on_commit=False) as session:
+        for n in range(operacoes):
+            usuario_id, vaga_id = pares[n // 2 % len(pares)]
+            try:
+                await create_registro(
+                    session,
+                    {
+                        "estacionamento_id": vaga_id,
+                        "usuario_id": usuario_id,
+                        "tipo": "ENTRADA" if n % 2 == 0 else "SAIDA",
+                        "caminho": "benchmark",
+                    },
+                )
+                feitas += 1
+            except OperationalError:
+                # "database is locked" depois de esgotar a espera
+                await session.rollback()
+                falhas.append(n)
+    return feitas
+
+
+async def _leitor(motor, usuario_ids, parar, tempos, falhas, rng):
+    async with AsyncSession(motor, expire_on_commit=False) as session:
+        while not parar.is_set():
+            inicio = time.perf_counter()
+            try:
+                await get_available_estacionamentos(session)
+                await get_estadia_aberta(session, rng.choice(usuario_ids))
+                # Fecha a transação de leitura como uma página faria
+                await session.commit()
+            except OperationalError:
+                await session.rollback()
+                falhas.append(1)
+                continue
+            tempos.append(time.perf_counter() - inicio)
+            await asyncio.sleep(0)
+
+
+async def cenario(args, lote, perfil):
+    nome = "com_perfil" if perfil else "sem_perfil"
+    settings = Settings(DATABASE_URL=url_temporaria(f"{nome}.db"))
+    motor = criar_engine(settings, perfil=perfil)
+    async with motor.begin() as conn:
+        await conn.run_sync(table_registry.metadata.create_all)
+
+    async with AsyncSession(motor, expire_on_commit=False) as session:
+        usuarios = await popular(session, lote, args.escritores * args.pares)
+        vagas = (await get_estacionamentos(session)).itens
+    pares = list(zip((u.id for u in usuarios), (v.id for v in vagas)))
+    por_escritor = [
+        pares[i :: args.escritores] for i in range(args.escritores)
+    ]
+
+    rng = random.Random(args.semente)
+    parar = asyncio.Event()
+    tempos, falhas_leitura, falhas_escrita = [], [], []
+    leitores = [
+        asyncio.create_task(
+            _leitor(
+                motor,
+                [u.id for u in usuarios],
+                parar,
+                tempos,
+                falhas_leitura,
+                rng,
+            )
+        )
+        for _ in range(args.leitores)
+    ]
+    inicio = time.perf_counter()
+    feitas = await asyncio.gather(
+        *(
+            _escritor(motor, meus, args.operacoes, falhas_escrita)
+            for meus in por_escritor
+            if meus
+        )
+    )
+    duracao = time.perf_counter() - inicio
+    parar.set()
+    await asyncio.gather(*leitores)
+    await motor.dispose()
+
+    linhas = {
+        "perfil": nome,
+        "escritas": sum(feitas),
+        "vazao_escrita": f"{sum(feitas) / duracao:.0f} registros/s",
+        "escritas_falhas": len(falhas_escrita),
+        "leituras": len(tempos),
+        "leituras_falhas": len(falhas_leitura),
+    }
+    if tempos:
+        linhas["latencia_leitura"] = _resumo(tempos)
+    return linhas
+
+
+def _argumentos():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--escritores", type=int, default=8)
+    parser.add_argument("--leitores", type=int, default=4)
+    parser.add_argument("--operacoes", type=int, default=100)
+    # Usuários (e vagas) de cada escritor
+    parser.add_argument("--pares", type=int, default=5)
+    parser.add_argument("--lado", type=int, default=60)
+    parser.add_argument("--semente", type=int, default=0)
+    return parser.parse_args()
+
+
+async def main():
+    args = _argumentos()
+    lote = gerar_lote(
+        args.lado,
+        densidade=0.2,
+        n_vagas=args.escritores * args.pares,
+        semente=args.semente,
+    )
+    for perfil in (False, True):
+        linhas = await cenario(args, lote, perfil)
+        print()
+        for nome, valor in linhas.items():
+            print(f"{nome:>20}: {valor}")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
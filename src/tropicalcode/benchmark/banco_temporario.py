@@ -0,0 +1,84 @@
+"""Banco SQLite descartável para os scripts de benchmark.
+
+Precisa ser importado antes de qualquer módulo que abra o banco: aponta o
+DATABASE_URL para um diretório temporário, nunca para o do .env.
+"""
+
+import os
+import tempfile
+
+_DIRETORIO = tempfile.TemporaryDirectory(prefix="tropicalcode-bench-")
+os.environ["DATABASE_URL"] = (
+    f"sqlite+aiosqlite:///{_DIRETORIO.name}/benchmark.db"
+)
+os.environ.setdefault("URL_ENTRADA", "http://localhost/entrada")
+os.environ.setdefault("URL_SAIDA", "http://localhost/saida")
+
+from tropicalcode.database import engine
+from tropicalcode.models import (
+    Caminho,
+    Estacionamento,
+    LocalTrabalho,
+    Portao,
+    Usuario,
+    table_registry,
+)
+from tropicalcode.repositorios import referencia
+from tropicalcode.roteamento.cache import invalidar_grafo, mapa_alterado
+
+
+def url_temporaria(nome):
+    # Outro banco no mesmo diretório descartável
+    return f"sqlite+aiosqlite:///{_DIRETORIO.name}/{nome}"
+
+
+async def recriar_banco():
+    async with engine.begin() as conn:
+        await conn.run_sync(table_registry.metadata.drop_all)
+        await conn.run_sync(table_registry.metadata.create_all)
+    referencia.limpar_tudo()
+    # O banco novo recomeça a contagem de versões do mapa
+    invalidar_grafo()
+
+
+async def popular(session, lote, n_usuarios):
+    session.add_all(
+        Caminho(
+            origem_x=ox, origem_y=oy, destino_x=dx, destino_y=dy, direcao=d
+        )
+        for ox, oy, dx, dy, d in lote.caminhos
+    )
+    session.add_all(
+        Estacionamento(
+            codigo_vaga=f"V{i}",
+            tipo_vaga=tipo,
+            posicao_geral=i,
+            posicao_x=x,
+            posicao_y=y,
+        )
+        for i, (x, y, tipo) in enumerate(lote.vagas, start=1)
+    )
+    locais = [
+        LocalTrabalho(nome=f"Local {i}", posicao_x=x, posicao_y=y)
+        for i, (x, y) in enumerate(lote.locais, start=1)
+    ]
+    session.add_all(locais)
+    session.add_all(
+        Portao(nome=f"Portão {i}", posicao_x=x, posicao_y=y)
+        for i, (x, y) in enumerate(lote.portoes, start=1)
+    )
+    await session.flush()
+
+    usuarios = [
+        Usuario(
+            nome_usuario=f"usuario{i}",
+            senha="benchmark",
+            email=f"usuario{i}@benchmark",
+            local_trabalho=locais[i % len(locais)].id if locais else None,
+        )
+        for i in range(n_usuarios)
+    ]
+    session.add_all(usuarios)
+    await mapa_alterado(session)
+    await session.commit()
+    return usuarios
@@ -0,0 +1,133 @@
+"""Benchmark da carga em lote.
+
+Uso:
+    python -m tropicalcode.benchmark.carga --vagas 10000 --dias 30
+
+Num banco SQLite temporário carrega um lote de vagas e um mês de
+histórico de entradas e saídas com as funções em lote dos repositórios,
+e compara com as de uma linha por vez numa amostra, projetando o tempo
+que elas levariam para a carga inteira.
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from tropicalcode.benchmark.banco_temporario import recriar_banco
+from tropicalcode.benchmark.lote_sintetico import TIPOS
+from tropicalcode.database import engine, get_session
+from tropicalcode.repositorios.estacionamento_repo import (
+    create_estacionamento,
+    create_estacionamentos,
+)
+from tropicalcode.repositorios.registro_atividade_repo import (
+    create_registro,
+    create_registros,
+)
+from tropicalcode.repositorios.usuario_repo import create_usuarios
+
+
+def _vagas(n, rng, inicio=0):
+    return [
+        {
+            "codigo_vaga": f"V{i}",
+            "tipo_vaga": rng.choice(TIPOS),
+            "posicao_geral": i,
+            "posicao_x": rng.uniform(0, 1000),
+            "posicao_y": rng.uniform(0, 1000),
+        }
+        for i in range(inicio, inicio + n)
+    ]
+
+
+def _historico(dias, usuario_ids, vaga_ids, rng):
+    # Cada usuário entra e sai uma vez por dia, numa vaga qualquer
+    comeco = datetime.now(timezone.utc) - timedelta(days=dias)
+    registros = []
+    for dia in range(dias):
+        for usuario_id in usuario_ids:
+            entrada = comeco + timedelta(days=dia, hours=rng.uniform(6, 10))
+            saida = entrada + timedelta(hours=rng.uniform(4, 10))
+            vaga_id = rng.choice(vaga_ids)
+            for tipo, horario in (("ENTRADA", entrada), ("SAIDA", saida)):
+                registros.append({
+                    "estacionamento_id": vaga_id,
+                    "usuario_id": usuario_id,
+                    "tipo": tipo,
+                    "horario": horario,
+                    "caminho": "benchmark",
+                })
+    return registros
+
+
+async def _cronometrar(funcao, *args):
+    inicio = time.perf_counter()
+    resultado = await funcao(*args)
+    return time.perf_counter() - inicio, resultado
+
+
+async def main():
+    args = _argumentos()
+    rng = random.Random(args.semente)
+    await recriar_banco()
+    linhas = {}
+
+    async for session in get_session():
+        t, vaga_ids = await _cronometrar(
+            create_estacionamentos, session, _vagas(args.vagas, rng)
+        )
+        linhas[f"{args.vagas} vagas em lote"] = f"{t:.2f} s"
+
+        inicio = time.perf_counter()
+        for dados in _vagas(args.amostra, rng, args.vagas):
+            await create_estacionamento(session, dados)
+        t = (time.perf_counter() - inicio) / args.amostra * args.vagas
+        linhas[f"{args.vagas} vagas uma a uma"] = f"~{t:.2f} s (projetado)"
+
+        usuario_ids = await create_usuarios(
+            session,
+            [
+                {
+                    "nome_usuario": f"usuario{i}",
+                    "senha": "benchmark",
+                    "email": f"usuario{i}@benchmark",
+                    "local_trabalho": None,
+                }
+                for i in range(args.usuarios)
+            ],
+        )
+        historico = _historico(args.dias, usuario_ids, vaga_ids, rng)
+        t, _ = await _cronometrar(create_registros, session, historico)
+        linhas[f"{len(historico)} registros em lote"] = f"{t:.2f} s"
+
+        amostra = _historico(1, usuario_ids, vaga_ids, rng)[: args.amostra]
+        inicio = time.perf_counter()
+        for dados in amostra:
+            # create_registro grava o horário de agora
+            del dados["horario"]
+            await create_registro(session, dados)
+        t = (time.perf_counter() - inicio) / len(amostra) * len(historico)
+        linhas[f"{len(historico)} registros um a um"] = (
+            f"~{t:.2f} s (projetado)"
+        )
+
+    for nome, valor in linhas.items():
+        print(f"{nome:>32}: {valor}")
+    await engine.dispose()
+
+
+def _argumentos():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vagas", type=int, default=10_000)
+    parser.add_argument("--usuarios", type=int, default=1000)
+    parser.add_argument("--dias", type=int, default=30)
+    # Linhas gravadas uma a uma para a projeção
+    parser.add_argument("--amostra", type=int, default=200)
+    parser.add_argument("--semente", type=int, default=0)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,189 @@
+"""Teste de estresse das entradas simultâneas.
+
+Uso:
+    python -m tropicalcode.benchmark.concorrencia --usuarios 400
+
+Muitas corrotinas, cada uma com a sua sessão, disputam as vagas de um
+lote sintético ao mesmo tempo, parte com reservar_vaga e parte em ondas
+de registrar_entradas; alguns usuários chegam duas vezes. No fim confere
+que nenhuma vaga ficou com dois donos, nenhum usuário com duas entradas
+e que ocupações e estadias batem com o histórico, inteiro e a partir do
+último snapshot. Sai com código 1 se alguma conferência falhar.
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+import time
+from collections import Counter
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from tropicalcode.benchmark.banco_temporario import popular, recriar_banco
+from tropicalcode.benchmark.lote_sintetico import TIPOS, gerar_lote
+from tropicalcode.database import engine, get_session
+from tropicalcode.models import (
+    Automovel,
+    EstadiaAberta,
+    Ocupacao,
+    RegistroAtividade,
+)
+from tropicalcode.repositorios.registro_atividade_repo import (
+    create_registro,
+    registrar_entradas,
+    reservar_vaga,
+    ultimos_registros,
+)
+from tropicalcode.repositorios.snapshot_repo import ocupacoes_em
+from tropicalcode.roteamento import cache
+
+
+async def _sozinho(usuario, tipo):
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        resultado = await reservar_vaga(session, usuario, tipo)
+    if "registro" in resultado:
+        return [(usuario.id, resultado["estacionamento"].id)]
+    return []
+
+
+async def _onda(pedidos):
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        resultados = await registrar_entradas(session, pedidos)
+    return [
+        (u.id, r["estacionamento"].id)
+        for (u, _), r in zip(pedidos, resultados)
+        if "registro" in r
+    ]
+
+
+async def rodada(args, usuarios, rng):
+    # Metade chega sozinha, metade em ondas do tamanho pedido
+    tarefas = []
+    fila = list(usuarios)
+    fila += rng.sample(usuarios, int(len(usuarios) * args.repetidos))
+    rng.shuffle(fila)
+    while fila:
+        if rng.random() < 0.5:
+            usuario = fila.pop()
+            tarefas.append(_sozinho(usuario, rng.choice(TIPOS)))
+        else:
+            onda, fila = fila[: args.onda], fila[args.onda :]
+            tarefas.append(
+                _onda([
+                    (u, Automovel(u.id, "benchmark", rng.choice(TIPOS)))
+                    for u in onda
+                ])
+            )
+
+    inicio = time.perf_counter()
+    concedidas = [
+        par for pares in await asyncio.gather(*tarefas) for par in pares
+    ]
+    return concedidas, time.perf_counter() - inicio
+
+
+async def conferir(concedidas):
+    erros = []
+    usuarios = [u for u, _ in concedidas]
+    vagas = [v for _, v in concedidas]
+    repetidas = [v for v, n in Counter(vagas).items() if n > 1]
+    if repetidas:
+        erros.append(f"vagas entregues mais de uma vez: {repetidas}")
+    repetidos = [u for u, n in Counter(usuarios).items() if n > 1]
+    if repetidos:
+        erros.append(f"usuários com duas entradas: {repetidos}")
+
+    async for session in get_session():
+        ocupadas = set(
+            (await session.execute(select(Ocupacao.estacionamento_id)))
+            .scalars()
+            .all()
+        )
+        ultimos = await session.execute(
+            ultimos_registros(RegistroAtividade.estacionamento_id)
+        )
+        pelo_historico = {
+            r.estacionamento_id
+            for r in ultimos.scalars()
+            if r.tipo == "ENTRADA"
+        }
+        pelo_snapshot = set(await ocupacoes_em(session))
+        dentro = set(
+            (await session.execute(select(EstadiaAberta.usuario_id)))
+            .scalars()
+            .all()
+        )
+
+    if ocupadas != set(vagas):
+        erros.append("ocupacoes não bate com as vagas entregues")
+    if ocupadas != pelo_historico:
+        erros.append("ocupacoes não bate com o histórico")
+    if ocupadas != pelo_snapshot:
+        erros.append("ocupacoes não bate com o snapshot mais o histórico")
+    if dentro != set(usuarios):
+        erros.append("estadias_abertas não bate com as entradas")
+    return erros
+
+
+async def liberar_todas():
+    async for session in get_session():
+        ocupacoes = (await session.execute(select(Ocupacao))).scalars().all()
+        for o in ocupacoes:
+            await create_registro(
+                session,
+                {
+                    "estacionamento_id": o.estacionamento_id,
+                    "usuario_id": o.usuario_id,
+                    "tipo": "SAIDA",
+                    "caminho": "benchmark",
+                },
+            )
+
+
+def _argumentos():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lado", type=int, default=60)
+    parser.add_argument("--vagas", type=int, default=200)
+    parser.add_argument("--usuarios", type=int, default=400)
+    parser.add_argument("--onda", type=int, default=5)
+    # Fração dos usuários que chega duas vezes na mesma rodada
+    parser.add_argument("--repetidos", type=float, default=0.1)
+    parser.add_argument("--rodadas", type=int, default=3)
+    parser.add_argument("--semente", type=int, default=0)
+    return parser.parse_args()
+
+
+async def main():
+    args = _argumentos()
+    rng = random.Random(args.semente)
+    lote = gerar_lote(
+        args.lado, densidade=0.2, n_vagas=args.vagas, semente=args.semente
+    )
+    await recriar_banco()
+    async for session in get_session():
+        usuarios = await popular(session, lote, args.usuarios)
+    cache.invalidar_grafo()
+
+    falhou = False
+    for n in range(1, args.rodadas + 1):
+        concedidas, duracao = await rodada(args, usuarios, rng)
+        erros = await conferir(concedidas)
+        print(
+            f"rodada {n}: {len(concedidas)} vagas entregues a "
+            f"{len(usuarios)} usuários em {duracao:.2f} s"
+        )
+        for erro in erros:
+            print(f"  ERRO: {erro}")
+        falhou = falhou or bool(erros)
+        await liberar_todas()
+
+    await engine.dispose()
+    if falhou:
+        sys.exit(1)
+    print("nenhuma vaga com dois donos")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
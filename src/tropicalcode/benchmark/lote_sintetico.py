@@ -0,0 +1,83 @@
+import random
+from dataclasses import dataclass, field
+from itertools import pairwise
+
+TIPOS = ["MOTO", "CARRO", "PCD", "CARRO_ELETRICO"]
+DIRECOES = ["IDA", "VOLTA", "AMBOS"]
+
+
+@dataclass
+class LoteSintetico:
+    lado: int
+    # (origem_x, origem_y, destino_x, destino_y, direcao)
+    caminhos: list = field(default_factory=list)
+    # (x, y, tipo_vaga)
+    vagas: list = field(default_factory=list)
+    # (x, y)
+    locais: list = field(default_factory=list)
+    # (x, y)
+    portoes: list = field(default_factory=list)
+
+
+def _corredores(lado, densidade):
+    # densidade = fração das linhas (e colunas) que viram corredor; a
+    # linha 0 e a coluna 0 sempre são, para a entrada ficar no mapa
+    passo = max(1, round(1 / densidade))
+    return list(range(0, lado, passo))
+
+
+def _perto_do_corredor(rng, linhas, lado):
+    # Célula ao lado de um corredor, na horizontal ou na vertical, para
+    # a vaga ficar ligada ao caminho
+    corredor = rng.choice(linhas)
+    ao_longo = rng.randrange(lado)
+    lado_a_lado = min(corredor + 1, lado - 1)
+    if rng.random() < 0.5:
+        return ao_longo, lado_a_lado
+    return lado_a_lado, ao_longo
+
+
+def gerar_lote(
+    lado,
+    densidade=0.1,
+    n_vagas=100,
+    n_locais=3,
+    n_portoes=1,
+    mistura=(1, 1, 2),
+    semente=0,
+):
+    """Mapa lado x lado com corredores retos cortados nos cruzamentos.
+
+    mistura são os pesos de IDA, VOLTA e AMBOS sorteados por trecho.
+    """
+    rng = random.Random(semente)
+    linhas = _corredores(lado, densidade)
+    lote = LoteSintetico(lado)
+
+    # Cada corredor vira um trecho por quarteirão, com sentido próprio
+    cortes = [*linhas, lado - 1] if linhas[-1] != lado - 1 else linhas
+    for fixo in linhas:
+        for a, b in pairwise(cortes):
+            horizontal, vertical = rng.choices(DIRECOES, mistura, k=2)
+            lote.caminhos.append((a, fixo, b, fixo, horizontal))
+            lote.caminhos.append((fixo, a, fixo, b, vertical))
+
+    # Mapas pequenos demais para o pedido ficam com o que couber
+    ocupadas = set()
+    for _ in range(20 * (n_vagas + n_locais)):
+        if len(lote.vagas) == n_vagas and len(lote.locais) == n_locais:
+            break
+        pos = _perto_do_corredor(rng, linhas, lado)
+        if pos in ocupadas:
+            continue
+        ocupadas.add(pos)
+        if len(lote.locais) < n_locais:
+            lote.locais.append(pos)
+        else:
+            lote.vagas.append((*pos, rng.choice(TIPOS)))
+
+    lote.portoes.append((0, 0))
+    while len(lote.portoes) < n_portoes:
+        lote.portoes.append((rng.choice(linhas), rng.choice(linhas)))
+
+    return lote
@@ -0,0 +1,125 @@
+"""Benchmark do cache de leitura dos dados de referência.
+
+Uso:
+    python -m tropicalcode.benchmark.referencia --paginas 2000
+
+Num banco SQLite temporário simula páginas que leem o usuário logado, a
+lista de locais de trabalho e uma vaga, como entrada.py, saida.py e
+criar_conta fazem, com o cache desligado (validade zero) e ligado, e
+mostra acertos e faltas de cada cache.
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+from tropicalcode.benchmark.banco_temporario import recriar_banco
+from tropicalcode.benchmark.lote_sintetico import TIPOS
+from tropicalcode.database import engine, get_session
+from tropicalcode.repositorios import referencia
+from tropicalcode.repositorios.estacionamento_repo import (
+    create_estacionamentos,
+    get_estacionamento,
+)
+from tropicalcode.repositorios.trabalho_repo import (
+    create_locais_trabalho,
+    get_locais_trabalho,
+)
+from tropicalcode.repositorios.usuario_repo import (
+    create_usuarios,
+    get_usuario_por_nome,
+)
+
+
+async def _popular(args, rng):
+    async for session in get_session():
+        locais = await create_locais_trabalho(
+            session,
+            [
+                {"nome": f"Local {i}", "posicao_x": i, "posicao_y": 0}
+                for i in range(args.locais)
+            ],
+        )
+        await create_usuarios(
+            session,
+            [
+                {
+                    "nome_usuario": f"usuario{i}",
+                    "senha": "benchmark",
+                    "email": f"usuario{i}@benchmark",
+                    "local_trabalho": rng.choice(locais),
+                }
+                for i in range(args.usuarios)
+            ],
+        )
+        return await create_estacionamentos(
+            session,
+            [
+                {
+                    "codigo_vaga": f"V{i}",
+                    "tipo_vaga": rng.choice(TIPOS),
+                    "posicao_geral": i,
+                    "posicao_x": i,
+                    "posicao_y": 1,
+                }
+                for i in range(args.vagas)
+            ],
+        )
+
+
+async def _paginas(args, vaga_ids, rng):
+    # Uma sessão por página, como cada execução do Streamlit
+    tempos = []
+    for _ in range(args.paginas):
+        inicio = time.perf_counter()
+        async for session in get_session():
+            await get_usuario_por_nome(
+                session, f"usuario{rng.randrange(args.usuarios)}"
+            )
+            await get_locais_trabalho(session)
+            await get_estacionamento(session, rng.choice(vaga_ids))
+        tempos.append(time.perf_counter() - inicio)
+    tempos.sort()
+    return tempos
+
+
+def _resumo(tempos):
+    media = sum(tempos) / len(tempos)
+    p95 = tempos[min(len(tempos) - 1, int(len(tempos) * 0.95))]
+    return f"{media * 1000:.2f} ms (p95 {p95 * 1000:.2f} ms)"
+
+
+async def main():
+    args = _argumentos()
+    await recriar_banco()
+    vaga_ids = await _popular(args, random.Random(args.semente))
+
+    validades = {c: c.validade for c in referencia.CACHES}
+    for nome, validade in (("sem cache", 0), ("com cache", None)):
+        referencia.limpar_tudo()
+        for cache in referencia.CACHES:
+            cache.validade = validades[cache] if validade is None else 0
+            cache.acertos = cache.faltas = 0
+        tempos = await _paginas(args, vaga_ids, random.Random(args.semente))
+        print(f"{nome:>10}: {_resumo(tempos)} por página")
+        for cache, numeros in referencia.estatisticas().items():
+            print(
+                f"{cache:>20}: {numeros['acertos']} acertos, "
+                f"{numeros['faltas']} faltas"
+            )
+    await engine.dispose()
+
+
+def _argumentos():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--paginas", type=int, default=2000)
+    parser.add_argument("--usuarios", type=int, default=200)
+    parser.add_argument("--locais", type=int, default=20)
+    parser.add_argument("--vagas", type=int, default=500)
+    parser.add_argument("--semente", type=int, default=0)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,179 @@
+"""Benchmark do roteamento em lotes sintéticos.
+
+Uso:
+    python -m tropicalcode.benchmark.roteamento --lados 10 100 1000
+
+Cada cenário roda num banco SQLite temporário, nunca no configurado no
+.env: mede a montagem do grafo, as buscas, o pico de memória e a
+latência de ponta a ponta da alocação de vaga.
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+import tracemalloc
+
+from tropicalcode.benchmark.banco_temporario import popular, recriar_banco
+from tropicalcode.benchmark.lote_sintetico import gerar_lote
+from tropicalcode.database import engine, get_session
+from tropicalcode.repositorios.estacionamento_repo import (
+    build_graph,
+    calcular_distancia,
+    find_best_for_user,
+    get_estacionamentos,
+)
+from tropicalcode.roteamento import cache, tabela
+from tropicalcode.roteamento.grafo import dijkstra
+
+
+def _ms(segundos):
+    return f"{segundos * 1000:.1f} ms"
+
+
+def _resumo(tempos):
+    # Média e p95 das chamadas
+    tempos = sorted(tempos)
+    p95 = tempos[min(len(tempos) - 1, int(len(tempos) * 0.95))]
+    return f"{_ms(statistics.mean(tempos))} (p95 {_ms(p95)})"
+
+
+async def _cronometrar(funcao, *args):
+    inicio = time.perf_counter()
+    resultado = funcao(*args)
+    if asyncio.iscoroutine(resultado):
+        resultado = await resultado
+    return time.perf_counter() - inicio, resultado
+
+
+async def _esperar_tabela(session):
+    # A reconstrução roda em segundo plano depois de invalidar_grafo
+    while (t := await tabela.get_tabela(session)) is None:
+        await asyncio.sleep(0.01)
+    return t
+
+
+async def cenario(args, lado):
+    lote = gerar_lote(
+        lado,
+        densidade=args.densidade,
+        n_vagas=args.vagas,
+        n_locais=args.locais,
+        n_portoes=args.portoes,
+        mistura=args.mistura,
+        semente=args.semente,
+    )
+    await recriar_banco()
+    linhas = {
+        "lote": f"{lado}x{lado}",
+        "caminhos": len(lote.caminhos),
+        "vagas": len(lote.vagas),
+    }
+
+    async for session in get_session():
+        usuarios = await popular(session, lote, args.usuarios)
+        cache.invalidar_grafo()
+        vagas = (await get_estacionamentos(session)).itens
+        amostra = vagas[: args.amostras]
+
+        # Caminho antigo: grafo célula a célula montado por consulta
+        tempos_build, tempos_dijkstra = [], []
+        for vaga in amostra[: args.amostras_build_graph]:
+            t, graph = await _cronometrar(build_graph, session, [vaga])
+            tempos_build.append(t)
+            t, _ = await _cronometrar(
+                dijkstra,
+                graph,
+                lote.portoes[0],
+                (vaga.posicao_x, vaga.posicao_y),
+            )
+            tempos_dijkstra.append(t)
+        if tempos_build:
+            linhas["build_graph"] = _resumo(tempos_build)
+            linhas["dijkstra"] = _resumo(tempos_dijkstra)
+
+        # Grafo compilado e tabela de distâncias, com o pico de memória
+        # medido numa segunda passada para o tracemalloc não pesar no tempo
+        versao = await cache.sincronizar(session)
+        t, grafo = await _cronometrar(cache.compilar_grafo, session, versao)
+        linhas["compilar_grafo"] = _ms(t)
+        t, _ = await _cronometrar(tabela.calcular_tabela, grafo)
+        linhas["calcular_tabela"] = _ms(t)
+        del grafo
+
+        tracemalloc.start()
+        grafo = await cache.compilar_grafo(session, versao)
+        tabela.calcular_tabela(grafo)
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        linhas["pico_memoria"] = f"{pico / 2**20:.2f} MB"
+
+        # Busca ao vivo, o que find_best_for_user faz sem a tabela pronta
+        origem = next(iter(grafo.portoes.values()))
+        t, _ = await _cronometrar(grafo.distancias_vagas, origem)
+        linhas["busca_portao"] = _ms(t)
+        del grafo
+
+        await _esperar_tabela(session)
+        tempos = []
+        for vaga in amostra:
+            t, _ = await _cronometrar(calcular_distancia, session, vaga)
+            tempos.append(t)
+        if tempos:
+            linhas["calcular_distancia"] = _resumo(tempos)
+
+        tempos = []
+        for i, usuario in enumerate(usuarios):
+            tipo = lote.vagas[i % len(lote.vagas)][2]
+            t, _ = await _cronometrar(
+                find_best_for_user, session, usuario, tipo
+            )
+            tempos.append(t)
+        if tempos:
+            linhas["find_best_for_user"] = _resumo(tempos)
+
+    return linhas
+
+
+def _mistura(texto):
+    pesos = tuple(float(p) for p in texto.split(":"))
+    if len(pesos) != 3:
+        raise argparse.ArgumentTypeError("use IDA:VOLTA:AMBOS, ex. 1:1:2")
+    return pesos
+
+
+def _argumentos():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--lados", type=int, nargs="+", default=[10, 100, 300, 1000]
+    )
+    parser.add_argument("--densidade", type=float, default=0.1)
+    parser.add_argument("--vagas", type=int, default=500)
+    parser.add_argument("--locais", type=int, default=3)
+    parser.add_argument("--portoes", type=int, default=1)
+    parser.add_argument(
+        "--mistura",
+        type=_mistura,
+        default=(1, 1, 2),
+        help="pesos IDA:VOLTA:AMBOS dos trechos",
+    )
+    parser.add_argument("--usuarios", type=int, default=50)
+    parser.add_argument("--amostras", type=int, default=20)
+    # build_graph expande o mapa inteiro a cada chamada
+    parser.add_argument("--amostras-build-graph", type=int, default=3)
+    parser.add_argument("--semente", type=int, default=0)
+    return parser.parse_args()
+
+
+async def main():
+    args = _argumentos()
+    for lado in args.lados:
+        linhas = await cenario(args, lado)
+        print()
+        for nome, valor in linhas.items():
+            print(f"{nome:>20}: {valor}")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,37 @@
+"""Move os registros antigos de estadias fechadas para o arquivo.
+
+Uso:
+    python -m tropicalcode.dados.arquivar --horizonte-dias 180
+
+Sem argumentos usa ARQUIVO_HORIZONTE_DIAS e ARQUIVO_LOTE do .env. Pode
+rodar com o sistema no ar: cada lote é uma transação curta.
+"""
+
+import argparse
+import asyncio
+
+from tropicalcode.database import engine, get_session
+from tropicalcode.repositorios.registro_atividade_repo import (
+    arquivar_registros,
+)
+
+
+def _argumentos():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--horizonte-dias", type=int)
+    parser.add_argument("--lote", type=int)
+    return parser.parse_args()
+
+
+async def main():
+    args = _argumentos()
+    async for session in get_session():
+        movidos = await arquivar_registros(
+            session, args.horizonte_dias, args.lote
+        )
+        print(f"{movidos} registros arquivados")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -9,8 +9,9 @@ from tropicalcode.database import get_session
 from tropicalcode.models import (
     Automovel,
     Estacionamento,
-    RegistroAtividade,
+    Permanencia,
     Usuario,
+    registro_historico,
 )
 
 # Definir a pasta base para exportação
@@ -60,16 +61,16 @@ async def export_automoveis_xlsx(session: AsyncSession, path: str):
 
 
 async def export_registros_csv(session: AsyncSession, path: str):
-    result = await session.execute(select(RegistroAtividade))
-    rows = result.scalars().all()
-    df = pd.DataFrame([r.__dict__ for r in rows])
+    # Inclui os registros já arquivados
+    result = await session.execute(select(registro_historico))
+    df = pd.DataFrame(result.mappings().all())
     df.to_csv(path, index=False)
 
 
 async def export_registros_xlsx(session: AsyncSession, path: str):
-    result = await session.execute(select(RegistroAtividade))
-    rows = result.scalars().all()
-    df = pd.DataFrame([r.__dict__ for r in rows])
+    # Inclui os registros já arquivados
+    result = await session.execute(select(registro_historico))
+    df = pd.DataFrame(result.mappings().all())
     df.to_excel(path, index=False)
 
 
@@ -92,31 +93,37 @@ async def export_dimensoes_xlsx(session: AsyncSession, path: str):
 
 async def export_fatos_xlsx(session: AsyncSession, path: str):
     registros = (
-        (await session.execute(select(RegistroAtividade))).scalars().all()
+        (await session.execute(select(registro_historico))).mappings().all()
     )
-    df_registros = pd.DataFrame([r.__dict__ for r in registros])
+    permanencias = (await session.execute(select(Permanencia))).scalars().all()
+    df_registros = pd.DataFrame(registros)
+    df_permanencias = pd.DataFrame([r.__dict__ for r in permanencias])
     with pd.ExcelWriter(path) as writer:
         df_registros.to_excel(writer, sheet_name="fato_movimento", index=False)
+        df_permanencias.to_excel(
+            writer, sheet_name="fato_permanencia", index=False
+        )
 
 
 async def export_estado_atual_estacionamentos_xlsx(
     session: AsyncSession, path: str
 ):
+    registro = registro_historico.c
     sub = (
         select(
-            RegistroAtividade.estacionamento_id,
-            func.max(RegistroAtividade.horario).label("max_horario"),
+            registro.estacionamento_id,
+            func.max(registro.horario).label("max_horario"),
         )
-        .group_by(RegistroAtividade.estacionamento_id)
+        .group_by(registro.estacionamento_id)
         .subquery()
     )
-    query = select(RegistroAtividade).join(
+    query = select(registro_historico).join(
         sub,
-        (RegistroAtividade.estacionamento_id == sub.c.estacionamento_id)
-        & (RegistroAtividade.horario == sub.c.max_horario),
+        (registro.estacionamento_id == sub.c.estacionamento_id)
+        & (registro.horario == sub.c.max_horario),
     )
-    rows = (await session.execute(query)).scalars().all()
-    df = pd.DataFrame([r.__dict__ for r in rows])
+    rows = (await session.execute(query)).mappings().all()
+    df = pd.DataFrame(rows)
     df.to_excel(path, index=False)
 
 
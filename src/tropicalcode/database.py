@@ -1,7 +1,197 @@
+import json
+import logging
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
 from tropicalcode.settings import Settings
 
-engine = create_async_engine(Settings().DATABASE_URL)
+
+def pragmas_sqlite(settings: Settings):
+    return {
+        "journal_mode": settings.SQLITE_JOURNAL_MODE,
+        "synchronous": settings.SQLITE_SYNCHRONOUS,
+        "busy_timeout": settings.SQLITE_BUSY_TIMEOUT_MS,
+        "mmap_size": settings.SQLITE_MMAP_MB * 2**20,
+        # Negativo: tamanho em KiB em vez de páginas
+        "cache_size": -settings.SQLITE_CACHE_MB * 1024,
+        "foreign_keys": "ON" if settings.SQLITE_FOREIGN_KEYS else "OFF",
+    }
+
+
+logger = logging.getLogger("tropicalcode.sql")
+
+# Página medida na execução atual; None fora de medir_pagina
+_pagina = ContextVar("pagina_sql", default=None)
+
+# Listas de parâmetros de IN e de VALUES viram um só ?, para que o mesmo
+# comando com mais ou menos itens tenha a mesma forma
+_PARAMETROS = re.compile(r"\(\?(?:, \?)*\)(?:, \(\?(?:, \?)*\))*")
+_ESPACOS = re.compile(r"\s+")
+
+
+def forma_do_comando(statement):
+    return _PARAMETROS.sub("(?)", _ESPACOS.sub(" ", statement).strip())
+
+
+@dataclass
+class MedicaoPagina:
+    nome: str
+    inicio: float = field(default_factory=time.perf_counter)
+    # (forma, segundos, linhas) de cada comando, na ordem
+    comandos: list = field(default_factory=list)
+
+    def resumo(self, repeticoes):
+        formas = {}
+        for forma, segundos, linhas in self.comandos:
+            total = formas.setdefault(forma, [0, 0.0, 0])
+            total[0] += 1
+            total[1] += segundos
+            total[2] += linhas or 0
+        lentos = sorted(self.comandos, key=lambda c: c[1], reverse=True)
+        return {
+            "pagina": self.nome,
+            "horario": datetime.now(timezone.utc).isoformat(),
+            "duracao_ms": (time.perf_counter() - self.inicio) * 1000,
+            "comandos": len(self.comandos),
+            "tempo_sql_ms": sum(c[1] for c in self.comandos) * 1000,
+            "linhas": sum(c[2] or 0 for c in self.comandos),
+            "repetidos": [
+                {
+                    "forma": forma,
+                    "vezes": vezes,
+                    "tempo_ms": segundos * 1000,
+                    "linhas": linhas,
+                }
+                for forma, (vezes, segundos, linhas) in formas.items()
+                if vezes > repeticoes
+            ],
+            "lentos": [
+                {"forma": forma, "tempo_ms": segundos * 1000, "linhas": linhas}
+                for forma, segundos, linhas in lentos[:5]
+            ],
+        }
+
+
+def _linhas(cursor):
+    # Alterados num INSERT/UPDATE/DELETE; num SELECT o driver não conta,
+    # mas o adaptador do aiosqlite já trouxe as linhas para a memória
+    if cursor.rowcount >= 0:
+        return cursor.rowcount
+    linhas = getattr(cursor, "_rows", None)
+    return len(linhas) if linhas is not None else None
+
+
+def _configurar_log(settings: Settings):
+    if logger.handlers:
+        return
+    handler = logging.FileHandler(settings.SQL_LOG_ARQUIVO, encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+
+
+def instrumentar(novo, settings: Settings):
+    """Mede cada comando SQL do engine feito dentro de medir_pagina."""
+    _configurar_log(settings)
+
+    @event.listens_for(novo.sync_engine, "before_cursor_execute")
+    def _antes(conn, cursor, statement, parameters, context, executemany):
+        if _pagina.get() is not None:
+            conn.info.setdefault("sql_inicio", []).append(time.perf_counter())
+
+    @event.listens_for(novo.sync_engine, "after_cursor_execute")
+    def _depois(conn, cursor, statement, parameters, context, executemany):
+        pagina = _pagina.get()
+        inicios = conn.info.get("sql_inicio")
+        if pagina is None or not inicios:
+            return
+        segundos = time.perf_counter() - inicios.pop()
+        pagina.comandos.append((
+            forma_do_comando(statement),
+            segundos,
+            _linhas(cursor),
+        ))
+
+
+@contextmanager
+def medir_pagina(nome):
+    """Agrupa os comandos SQL de uma execução da página num resumo.
+
+    O resumo vai para o log em JSON, com um aviso por forma de comando
+    repetida demais; sem SQL_MEDIR não faz nada.
+    """
+    settings = Settings()
+    if not settings.SQL_MEDIR:
+        yield None
+        return
+
+    pagina = MedicaoPagina(nome)
+    token = _pagina.set(pagina)
+    try:
+        yield pagina
+    finally:
+        # st.stop() e st.rerun() interrompem a página com uma exceção
+        _pagina.reset(token)
+        resumo = pagina.resumo(settings.SQL_REPETICOES_AVISO)
+        logger.info(json.dumps(resumo, ensure_ascii=False))
+        for repetido in resumo["repetidos"]:
+            logger.warning(
+                json.dumps(
+                    {"aviso": "N+1", "pagina": nome, **repetido},
+                    ensure_ascii=False,
+                )
+            )
+
+
+def criar_engine(settings: Settings | None = None, perfil=None):
+    """Engine do DATABASE_URL com o pool e, no SQLite, o perfil do Settings.
+
+    perfil=False deixa as conexões SQLite com os padrões do driver.
+    """
+    settings = settings or Settings()
+    url = make_url(settings.DATABASE_URL)
+    sqlite = url.get_backend_name() == "sqlite"
+
+    opcoes = {
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+    # SQLite em memória usa um pool de uma conexão só, sem tamanho
+    if not (sqlite and url.database in {None, "", ":memory:"}):
+        opcoes.update(
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+        )
+    novo = create_async_engine(url, **opcoes)
+
+    if perfil is None:
+        perfil = settings.SQLITE_PERFIL
+    if sqlite and perfil:
+        pragmas = pragmas_sqlite(settings)
+
+        @event.listens_for(novo.sync_engine, "connect")
+        def _aplicar_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for nome, valor in pragmas.items():
+                cursor.execute(f"PRAGMA {nome}={valor}")
+            cursor.close()
+
+    if settings.SQL_MEDIR:
+        instrumentar(novo, settings)
+
+    return novo
+
+
+engine = criar_engine()
 
 
 async def get_session():
@@ -4,13 +4,13 @@ import streamlit as st
 from sqlalchemy import select
 from streamlit_cookies_manager import EncryptedCookieManager
 
-from tropicalcode.database import get_session
+from tropicalcode.database import get_session, medir_pagina
 from tropicalcode.models import Automovel
-from tropicalcode.repositorios.estacionamento_repo import find_best_for_user
 from tropicalcode.repositorios.registro_atividade_repo import (
-    create_registro,
+    reservar_vaga,
     usuario_tem_entrada_ativa,
 )
+from tropicalcode.repositorios.transacao import unidade_de_trabalho
 from tropicalcode.repositorios.usuario_repo import get_usuario_por_nome
 
 cookies = EncryptedCookieManager(prefix="app_", password="senha_muito_secreta")
@@ -20,6 +20,8 @@ if not cookies.ready():
 
 query = st.query_params
 chave = query.get("chave", "")
+portao = query.get("portao", "")
+portao_id = int(portao) if portao.isdigit() else None
 
 
 if not chave.isdigit() or len(chave) != 4:
@@ -38,33 +40,20 @@ st.success(f"Usuário logado: {username}")
 
 async def registrar_entrada(usuario, automovel_selecionado):
 
+    # Checagem e reserva numa transação, com um commit no fim
     async for session in get_session():
-        if await usuario_tem_entrada_ativa(session, usuario.id):
-            return {"error": "Você já possui uma entrada ativa."}
-
-        estacionamento = await find_best_for_user(
-            session, usuario, automovel_selecionado.tipo
-        )
-
-        if not estacionamento:
-            return {
-                "error": f"Nenhuma vaga do tipo '{automovel_selecionado.tipo}' está disponível no momento."
-            }
-
-        registro = await create_registro(
-            session,
-            {
-                "estacionamento_id": estacionamento.id,
-                "usuario_id": usuario.id,
-                "tipo": "ENTRADA",
-                "caminho": f"/entrada?chave={chave}",
-            },
-        )
-
-        return {
-            "estacionamento": estacionamento,
-            "registro": registro,
-        }
+        async with unidade_de_trabalho(session):
+            if await usuario_tem_entrada_ativa(session, usuario.id):
+                return {"error": "Você já possui uma entrada ativa."}
+
+            return await reservar_vaga(
+                session,
+                usuario,
+                automovel_selecionado.tipo,
+                portao_id,
+                f"/entrada?chave={chave}&portao={portao}",
+                automovel_selecionado.id,
+            )
 
 
 async def setup_ui_selecao():
@@ -141,4 +130,5 @@ if "entrada_result" in st.session_state:
         st.rerun()
 
 else:
-    asyncio.run(setup_ui_selecao())
+    with medir_pagina("entrada"):
+        asyncio.run(setup_ui_selecao())
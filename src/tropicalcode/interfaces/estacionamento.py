@@ -6,8 +6,14 @@ import streamlit as st
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from tropicalcode.database import get_session
+from tropicalcode.database import get_session, medir_pagina
 from tropicalcode.models import Caminho, Estacionamento
+from tropicalcode.repositorios.em_massa import EmUso, recusar_em_uso
+from tropicalcode.roteamento.cache import (
+    atualizar_vaga,
+    mapa_alterado,
+    vaga_no_mapa,
+)
 
 MAP_SIZE = 10
 
@@ -41,8 +47,15 @@ async def salvar_estacionamento(
         posicao_y=posicao_y,
     )
     session.add(novo_estacionamento)
+    versao = await mapa_alterado(session)
     await session.commit()
     await session.refresh(novo_estacionamento)
+    atualizar_vaga(
+        versao,
+        novo_estacionamento.id,
+        None,
+        vaga_no_mapa(novo_estacionamento),
+    )
     st.toast(f"Estacionamento {codigo_vaga} criado!", icon="🅿️")
     return novo_estacionamento
 
@@ -54,9 +67,20 @@ async def deletar_estacionamento(session: AsyncSession, estacionamento_id):
     existente = q.scalar_one_or_none()
 
     if existente:
+        try:
+            await recusar_em_uso(session, Estacionamento, [existente.id])
+        except EmUso:
+            st.error(
+                f"A vaga {existente.codigo_vaga} já tem histórico de uso e "
+                "não pode ser removida."
+            )
+            return False
         await session.delete(existente)
+        versao = await mapa_alterado(session)
         await session.commit()
+        atualizar_vaga(versao, existente.id, vaga_no_mapa(existente), None)
         st.toast(f"Estacionamento {existente.codigo_vaga} removido.", icon="🗑️")
+    return True
 
 
 async def carregar_estacionamentos(session: AsyncSession):
@@ -246,6 +270,7 @@ async def interface_estacionamento_caminhos():
                 ):
                     # Lógica de atualização aqui
                     # (Exemplo: atualizar o tipo no banco de dados e no session_state)
+                    antes = vaga_no_mapa(estacionamento_existente)
                     async for session in get_session():
                         estacionamento_existente.tipo_vaga = (
                             tipo_vaga_selecionado
@@ -253,8 +278,15 @@ async def interface_estacionamento_caminhos():
                         session.add(
                             estacionamento_existente
                         )  # Adiciona para "merge"
+                        versao = await mapa_alterado(session)
                         await session.commit()
                         await session.refresh(estacionamento_existente)
+                    atualizar_vaga(
+                        versao,
+                        estacionamento_existente.id,
+                        antes,
+                        vaga_no_mapa(estacionamento_existente),
+                    )
                     st.session_state.estacionamentos_map[ponto] = (
                         estacionamento_existente
                     )
@@ -270,13 +302,16 @@ async def interface_estacionamento_caminhos():
                     type="secondary",
                 ):
                     async for session in get_session():
-                        await deletar_estacionamento(
+                        removida = await deletar_estacionamento(
                             session, estacionamento_existente.id
                         )
-                    del st.session_state.estacionamentos_map[ponto]
-                    st.session_state.ponto_selecionado_estacionamento = None
-                    st.toast("Vaga removida.", icon="🗑️")
-                    st.rerun()
+                    if removida:
+                        del st.session_state.estacionamentos_map[ponto]
+                        st.session_state.ponto_selecionado_estacionamento = (
+                            None
+                        )
+                        st.toast("Vaga removida.", icon="🗑️")
+                        st.rerun()
 
             else:
                 st.write("Cadastrar novo estacionamento:")
@@ -341,4 +376,5 @@ async def interface_estacionamento_caminhos():
 
 
 if __name__ == "__main__":
-    asyncio.run(interface_estacionamento_caminhos())
+    with medir_pagina("estacionamento"):
+        asyncio.run(interface_estacionamento_caminhos())
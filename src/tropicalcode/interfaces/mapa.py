@@ -4,8 +4,13 @@ import streamlit as st
 from sqlalchemy import delete, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from tropicalcode.database import get_session
+from tropicalcode.database import get_session, medir_pagina
 from tropicalcode.models import Caminho
+from tropicalcode.roteamento.cache import (
+    atualizar_caminho,
+    invalidar_grafo,
+    mapa_alterado,
+)
 
 MAP_SIZE = 10
 
@@ -36,9 +41,18 @@ async def salvar_caminho(session: AsyncSession, p1, p2, direcao):
     existente = q.scalar_one_or_none()
 
     if existente:
+        antigo = Caminho(
+            origem_x=existente.origem_x,
+            origem_y=existente.origem_y,
+            destino_x=existente.destino_x,
+            destino_y=existente.destino_y,
+            direcao=existente.direcao,
+        )
         existente.direcao = direcao
+        versao = await mapa_alterado(session)
         await session.commit()
         await session.refresh(existente)
+        atualizar_caminho(versao, antigo, existente)
         st.toast(
             f"Caminho {origem_norm}↔{destino_norm} atualizado: {direcao}",
             icon="🔄",
@@ -53,8 +67,10 @@ async def salvar_caminho(session: AsyncSession, p1, p2, direcao):
         direcao=direcao,
     )
     session.add(novo)
+    versao = await mapa_alterado(session)
     await session.commit()
     await session.refresh(novo)
+    atualizar_caminho(versao, None, novo)
     st.toast(
         f"Caminho {origem_norm}↔{destino_norm} criado: {direcao}", icon="✨"
     )
@@ -78,7 +94,9 @@ async def deletar_caminho(session: AsyncSession, p1, p2):
 
     if existente:
         await session.delete(existente)
+        versao = await mapa_alterado(session)
         await session.commit()
+        atualizar_caminho(versao, existente, None)
         st.toast(f"Caminho {origem_norm}↔{destino_norm} removido.", icon="🗑️")
 
 
@@ -89,7 +107,9 @@ async def carregar_caminhos(session: AsyncSession):
 
 async def limpar_mapa_db(session: AsyncSession):
     await session.execute(delete(Caminho))
+    await mapa_alterado(session)
     await session.commit()
+    invalidar_grafo()
 
 
 # --- INTERFACE STREAMLIT (Atualizada) ---
@@ -272,4 +292,5 @@ async def interface_mapa():
 
 # --- Ponto de entrada ---
 if __name__ == "__main__":
-    asyncio.run(interface_mapa())
+    with medir_pagina("mapa"):
+        asyncio.run(interface_mapa())
@@ -5,6 +5,8 @@ from io import BytesIO
 import qrcode
 import streamlit as st
 
+from tropicalcode.database import get_session, medir_pagina
+from tropicalcode.repositorios.portao_repo import create_portao, get_portoes
 from tropicalcode.settings import Settings
 
 SETTINGS = Settings()
@@ -14,7 +16,33 @@ st.title("Gerador de QR Code com Chave Dinâmica")
 st.markdown("---")
 
 
+async def cadastrar_portao():
+    with st.expander("Cadastrar portão"):
+        with st.form("form_portao", clear_on_submit=True):
+            nome = st.text_input("Nome do portão")
+            col1, col2 = st.columns(2)
+            x = col1.number_input("Posição X", min_value=0, step=1)
+            y = col2.number_input("Posição Y", min_value=0, step=1)
+            enviado = st.form_submit_button("Salvar portão")
+
+        if enviado:
+            if not nome:
+                st.error("Informe o nome do portão")
+                return
+            async for session in get_session():
+                await create_portao(
+                    session,
+                    {"nome": nome, "posicao_x": int(x), "posicao_y": int(y)},
+                )
+            st.success(f"Portão '{nome}' criado em ({x},{y})")
+
+
 async def main():
+    await cadastrar_portao()
+
+    async for session in get_session():
+        portoes = await get_portoes(session)
+
     code = str(random.randint(1000, 9999))
 
     base_url = SETTINGS.URL_ENTRADA
@@ -23,6 +51,14 @@ async def main():
 
     full_url = f"{base_url}{separator}chave={code}"
 
+    # Cada portão tem o seu QR; a entrada sabe de onde o carro vem pela URL
+    if portoes:
+        opcoes = {
+            f"{p.nome} ({p.posicao_x},{p.posicao_y})": p for p in portoes
+        }
+        portao = opcoes[st.selectbox("Portão", options=opcoes.keys())]
+        full_url = f"{full_url}&portao={portao.id}"
+
     try:
         img = qrcode.make(full_url)
         buffer = BytesIO()
@@ -45,4 +81,5 @@ async def main():
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    with medir_pagina("qr_entrada"):
+        asyncio.run(main())
@@ -1,15 +1,14 @@
 import asyncio
 
 import streamlit as st
-from sqlalchemy import select
 from streamlit_cookies_manager import EncryptedCookieManager
 
-from tropicalcode.database import get_session
-from tropicalcode.models import RegistroAtividade
+from tropicalcode.database import get_session, medir_pagina
 from tropicalcode.repositorios.registro_atividade_repo import (
     create_registro,
-    usuario_tem_entrada_ativa,
+    get_estadia_aberta,
 )
+from tropicalcode.repositorios.transacao import unidade_de_trabalho
 from tropicalcode.repositorios.usuario_repo import get_usuario_por_nome
 
 cookies = EncryptedCookieManager(prefix="app_", password="senha_muito_secreta")
@@ -34,35 +33,26 @@ st.title("Registrar Saída")
 
 
 async def fluxo():
+    # Leituras e registro da saída numa transação, com um commit no fim
     async for session in get_session():
-        usuario = await get_usuario_por_nome(session, username)
-        if not usuario:
-            return {"error": "Usuário não encontrado"}
-
-        if not await usuario_tem_entrada_ativa(session, usuario.id):
-            return {"error": "Você não possui saida ativa"}
-
-        result = await session.execute(select(RegistroAtividade))
-        registros = result.scalars().all()
-
-        latest = None
-        for r in registros:
-            if r.usuario_id == usuario.id:
-                if latest is None or r.horario > latest.horario:
-                    latest = r
-
-        if not latest:
-            return {"error": "Nenhum registro de entrada encontrado"}
-
-        registro = await create_registro(
-            session,
-            {
-                "estacionamento_id": latest.estacionamento_id,
-                "usuario_id": usuario.id,
-                "tipo": "SAIDA",
-                "caminho": f"/saida?chave={chave}",
-            },
-        )
+        async with unidade_de_trabalho(session):
+            usuario = await get_usuario_por_nome(session, username)
+            if not usuario:
+                return {"error": "Usuário não encontrado"}
+
+            estadia = await get_estadia_aberta(session, usuario.id)
+            if estadia is None:
+                return {"error": "Você não possui saida ativa"}
+
+            registro = await create_registro(
+                session,
+                {
+                    "estacionamento_id": estadia.estacionamento_id,
+                    "usuario_id": usuario.id,
+                    "tipo": "SAIDA",
+                    "caminho": f"/saida?chave={chave}",
+                },
+            )
 
         return {"registro": registro}
 
@@ -70,7 +60,8 @@ async def fluxo():
 result = st.session_state.get("saida_result")
 
 if result is None:
-    result = asyncio.run(fluxo())
+    with medir_pagina("saida"):
+        result = asyncio.run(fluxo())
     st.session_state["saida_result"] = result
 
 if "error" in result:
@@ -0,0 +1,77 @@
+import json
+from pathlib import Path
+
+import streamlit as st
+
+from tropicalcode.settings import Settings
+
+# Painel dos resumos que database.medir_pagina grava no log, um JSON por
+# linha; as outras páginas rodam em outros processos do Streamlit
+
+settings = Settings()
+arquivo = Path(settings.SQL_LOG_ARQUIVO)
+
+st.title("Consultas SQL por página")
+
+if not settings.SQL_MEDIR:
+    st.info("A medição está desligada; ligue SQL_MEDIR no .env.")
+
+if not arquivo.exists():
+    st.warning(f"Nenhum resumo em {arquivo} ainda.")
+    st.stop()
+
+ultimas = st.number_input("Últimas páginas", min_value=10, value=100)
+
+resumos, avisos = [], []
+with arquivo.open(encoding="utf-8") as f:
+    for linha in f:
+        registro = json.loads(linha)
+        if "aviso" in registro:
+            avisos.append(registro)
+        else:
+            resumos.append(registro)
+resumos = resumos[-ultimas:]
+avisos = avisos[-ultimas:]
+
+paginas = {}
+for r in resumos:
+    total = paginas.setdefault(
+        r["pagina"], {"pagina": r["pagina"], "execucoes": 0, "comandos": 0}
+    )
+    total["execucoes"] += 1
+    total["comandos"] += r["comandos"]
+    total["tempo_sql_ms"] = total.get("tempo_sql_ms", 0) + r["tempo_sql_ms"]
+for total in paginas.values():
+    total["comandos_por_execucao"] = total["comandos"] / total["execucoes"]
+    total["sql_ms_por_execucao"] = total["tempo_sql_ms"] / total["execucoes"]
+
+st.subheader("Por página")
+st.dataframe(list(paginas.values()), use_container_width=True)
+
+st.subheader("Possíveis N+1")
+if avisos:
+    st.dataframe(
+        [
+            {
+                "pagina": a["pagina"],
+                "vezes": a["vezes"],
+                "tempo_ms": round(a["tempo_ms"], 2),
+                "forma": a["forma"],
+            }
+            for a in reversed(avisos)
+        ],
+        use_container_width=True,
+    )
+else:
+    st.success("Nenhuma forma de comando repetida demais.")
+
+st.subheader("Execuções")
+for r in reversed(resumos):
+    titulo = (
+        f"{r['horario'][:19]} · {r['pagina']} · {r['comandos']} comandos · "
+        f"{r['tempo_sql_ms']:.1f} ms de SQL em {r['duracao_ms']:.0f} ms"
+    )
+    with st.expander(titulo):
+        st.write(f"Linhas: {r['linhas']}")
+        st.write("Comandos mais lentos")
+        st.dataframe(r["lentos"], use_container_width=True)
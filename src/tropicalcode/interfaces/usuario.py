@@ -3,16 +3,21 @@ import asyncio
 import streamlit as st
 from streamlit_cookies_manager import EncryptedCookieManager
 
-from tropicalcode.database import get_session
+from tropicalcode.database import get_session, medir_pagina
 from tropicalcode.repositorios.automovel_repo import (
     create_automovel,
     get_automoveis,
 )
+from tropicalcode.repositorios.registro_atividade_repo import get_registros
 from tropicalcode.repositorios.trabalho_repo import (
     create_local_trabalho,
     get_locais_trabalho,
 )
-from tropicalcode.repositorios.usuario_repo import create_usuario, get_usuarios
+from tropicalcode.repositorios.usuario_repo import (
+    create_usuario,
+    get_usuario_por_nome,
+    get_usuarios,
+)
 
 cookies = EncryptedCookieManager(prefix="app_", password="senha_muito_secreta")
 
@@ -20,11 +25,13 @@ if not cookies.ready():
     st.stop()
 
 MAP_SIZE = 10
+TAMANHO_PAGINA = 50
 
 menu_options = [
     "Criar Conta",
     "Login",
     "Listar Usuários",
+    "Listar Registros",
     "Registrar Automóvel",
     "Criar Local de Trabalho",
 ]
@@ -76,16 +83,78 @@ async def criar_conta():
         st.success("Usuário criado")
 
 
+def chave_da_pagina(nome, filtros):
+    # Chaves das páginas já vistas, para voltar; filtro novo recomeça
+    estado = st.session_state.setdefault(
+        nome, {"filtros": None, "chaves": [None]}
+    )
+    if estado["filtros"] != filtros:
+        estado["filtros"] = filtros
+        estado["chaves"] = [None]
+    return estado["chaves"][-1]
+
+
+def navegar(nome, pagina):
+    chaves = st.session_state[nome]["chaves"]
+    col1, col2, col3 = st.columns([1, 1, 2])
+    if col1.button(
+        "Anterior", key=f"{nome}-anterior", disabled=len(chaves) == 1
+    ):
+        chaves.pop()
+        st.rerun()
+    if col2.button(
+        "Próxima", key=f"{nome}-proxima", disabled=pagina.proxima is None
+    ):
+        chaves.append(pagina.proxima)
+        st.rerun()
+    col3.write(f"Página {len(chaves)}")
+
+
 async def listar():
     if "user" not in cookies or cookies.get("user") == "":
         st.error("Necessário login")
         return
+    nome = st.text_input("Nome começando com")
+    depois = chave_da_pagina("pagina_usuarios", nome)
     async for session in get_session():
-        usuarios = await get_usuarios(session)
-    for u in usuarios:
+        pagina = await get_usuarios(session, depois, TAMANHO_PAGINA, nome=nome)
+    for u in pagina.itens:
         st.write(
             f"ID: {u.id} | Usuário: {u.nome_usuario} | Email: {u.email} | Local: {u.local_trabalho}"
         )
+    navegar("pagina_usuarios", pagina)
+
+
+async def listar_registros():
+    if "user" not in cookies or cookies.get("user") == "":
+        st.error("Necessário login")
+        return
+    col1, col2, col3 = st.columns(3)
+    nome = col1.text_input("Usuário")
+    vaga = col2.number_input("ID da vaga", min_value=0, step=1)
+    tipo = col3.selectbox("Tipo", ["Todos", "ENTRADA", "SAIDA"])
+
+    filtros = {}
+    async for session in get_session():
+        if nome:
+            usuario = await get_usuario_por_nome(session, nome)
+            if not usuario:
+                st.error("Usuário não encontrado")
+                return
+            filtros["usuario_id"] = usuario.id
+        if vaga:
+            filtros["estacionamento_id"] = vaga
+        if tipo != "Todos":
+            filtros["tipo"] = tipo
+        depois = chave_da_pagina("pagina_registros", filtros)
+        pagina = await get_registros(
+            session, depois, TAMANHO_PAGINA, **filtros
+        )
+    for r in pagina.itens:
+        st.write(
+            f"{r.horario:%d/%m/%Y %H:%M:%S} | {r.tipo} | Usuário: {r.usuario_id} | Vaga: {r.estacionamento_id}"
+        )
+    navegar("pagina_registros", pagina)
 
 
 def login():
@@ -102,10 +171,9 @@ def login():
 
     async def validar():
         async for session in get_session():
-            usuarios = await get_usuarios(session)
-        for u in usuarios:
-            if u.nome_usuario == nome and u.senha == senha:
-                return u
+            usuario = await get_usuario_por_nome(session, nome)
+        if usuario and usuario.senha == senha:
+            return usuario
         return None
 
     if st.button("Entrar"):
@@ -125,10 +193,7 @@ async def registrar_automovel():
         return
 
     async for session in get_session():
-        usuarios = await get_usuarios(session)
-    usuario = next(
-        (u for u in usuarios if u.nome_usuario == cookies.get("user")), None
-    )
+        usuario = await get_usuario_por_nome(session, cookies.get("user"))
     if not usuario:
         st.error("Usuário não encontrado")
         return
@@ -149,11 +214,14 @@ async def registrar_automovel():
         st.success("Automóvel registrado")
 
     st.subheader("Meus Automóveis")
+    depois = chave_da_pagina("pagina_automoveis", usuario.id)
     async for session in get_session():
-        autos = await get_automoveis(session)
-    autos_user = [a for a in autos if a.usuario_id == usuario.id]
-    for a in autos_user:
+        pagina = await get_automoveis(
+            session, depois, TAMANHO_PAGINA, usuario_id=usuario.id
+        )
+    for a in pagina.itens:
         st.write(f"ID: {a.id} | Placa: {a.placa} | Tipo: {a.tipo}")
+    navegar("pagina_automoveis", pagina)
 
 
 async def criar_local():
@@ -216,13 +284,16 @@ async def criar_local():
         st.rerun()
 
 
-if menu == "Criar Conta":
-    asyncio.run(criar_conta())
-elif menu == "Login":
-    login()
-elif menu == "Listar Usuários":
-    asyncio.run(listar())
-elif menu == "Registrar Automóvel":
-    asyncio.run(registrar_automovel())
-elif menu == "Criar Local de Trabalho":
-    asyncio.run(criar_local())
+with medir_pagina(f"usuario: {menu}"):
+    if menu == "Criar Conta":
+        asyncio.run(criar_conta())
+    elif menu == "Login":
+        login()
+    elif menu == "Listar Usuários":
+        asyncio.run(listar())
+    elif menu == "Listar Registros":
+        asyncio.run(listar_registros())
+    elif menu == "Registrar Automóvel":
+        asyncio.run(registrar_automovel())
+    elif menu == "Criar Local de Trabalho":
+        asyncio.run(criar_local())
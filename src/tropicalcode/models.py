@@ -1,6 +1,20 @@
 from datetime import datetime
 
-from sqlalchemy import Enum, ForeignKey, func
+from sqlalchemy import (
+    DDL,
+    Column,
+    DateTime,
+    Enum,
+    ForeignKey,
+    Index,
+    Integer,
+    MetaData,
+    SmallInteger,
+    String,
+    Table,
+    event,
+    func,
+)
 from sqlalchemy.orm import Mapped, mapped_as_dataclass, mapped_column, registry
 
 table_registry = registry()
@@ -42,16 +56,37 @@ class Automovel:
     __tablename__ = "automoveis"
 
     id: Mapped[int] = mapped_column(init=False, primary_key=True)
-    usuario_id: Mapped[int] = mapped_column(ForeignKey("usuarios.id"))
+    usuario_id: Mapped[int] = mapped_column(
+        ForeignKey("usuarios.id"), index=True
+    )
     placa: Mapped[str]
     tipo: Mapped[Enum] = mapped_column(
         Enum("MOTO", "CARRO", "PCD", "CARRO_ELETRICO", name="tipo_automovel")
     )
 
 
+# No arquivo o tipo do movimento é guardado como a posição nesta tupla
+TIPOS_MOVIMENTO = ("ENTRADA", "SAIDA")
+
+
 @mapped_as_dataclass(table_registry)
 class RegistroAtividade:
     __tablename__ = "registro_atividade"
+    # Último registro de cada vaga e de cada usuário sem varrer a tabela
+    __table_args__ = (
+        Index(
+            "ix_registro_atividade_estacionamento_horario",
+            "estacionamento_id",
+            "horario",
+        ),
+        Index(
+            "ix_registro_atividade_usuario_horario", "usuario_id", "horario"
+        ),
+        # Listagem pelos mais recentes e o corte do arquivamento
+        Index("ix_registro_atividade_horario", "horario"),
+        # ids de registros arquivados nunca voltam a ser usados
+        {"sqlite_autoincrement": True},
+    )
 
     id: Mapped[int] = mapped_column(init=False, primary_key=True)
     estacionamento_id: Mapped[int] = mapped_column(
@@ -59,7 +94,7 @@ class RegistroAtividade:
     )
     usuario_id: Mapped[int] = mapped_column(ForeignKey("usuarios.id"))
     tipo: Mapped[Enum] = mapped_column(
-        Enum("ENTRADA", "SAIDA", name="tipo_movimento")
+        Enum(*TIPOS_MOVIMENTO, name="tipo_movimento")
     )
     horario: Mapped[datetime] = mapped_column(server_default=func.now())
     caminho: Mapped[str]
@@ -87,3 +122,175 @@ class LocalTrabalho:
     nome: Mapped[str] = mapped_column(unique=True)
     posicao_x: Mapped[float]
     posicao_y: Mapped[float]
+
+
+@mapped_as_dataclass(table_registry)
+class Portao:
+    __tablename__ = "portoes"
+
+    id: Mapped[int] = mapped_column(init=False, primary_key=True)
+    nome: Mapped[str] = mapped_column(unique=True)
+    posicao_x: Mapped[int]
+    posicao_y: Mapped[int]
+
+
+@mapped_as_dataclass(table_registry)
+class Ocupacao:
+    # Estado atual de cada vaga ocupada: a entrada que a ocupa. Mantida
+    # junto com registro_atividade para ninguém precisar varrer o histórico
+    __tablename__ = "ocupacoes"
+
+    estacionamento_id: Mapped[int] = mapped_column(
+        ForeignKey("estacionamentos.id"), primary_key=True
+    )
+    usuario_id: Mapped[int] = mapped_column(ForeignKey("usuarios.id"))
+    registro_id: Mapped[int] = mapped_column(
+        ForeignKey("registro_atividade.id")
+    )
+
+
+@mapped_as_dataclass(table_registry)
+class EstadiaAberta:
+    # Entrada ainda sem saída de cada usuário: uma linha por usuário dentro
+    # do estacionamento, aberta na entrada e apagada na saída
+    __tablename__ = "estadias_abertas"
+
+    usuario_id: Mapped[int] = mapped_column(
+        ForeignKey("usuarios.id"), primary_key=True
+    )
+    estacionamento_id: Mapped[int] = mapped_column(
+        ForeignKey("estacionamentos.id")
+    )
+    registro_id: Mapped[int] = mapped_column(
+        ForeignKey("registro_atividade.id")
+    )
+
+
+@mapped_as_dataclass(table_registry)
+class Permanencia:
+    # Entrada e saída de registro_atividade já pareadas, uma linha por
+    # estadia; saida_em fica nulo enquanto o usuário está dentro
+    __tablename__ = "permanencias"
+    __table_args__ = (
+        Index("ix_permanencias_usuario_entrada", "usuario_id", "entrada_em"),
+        Index(
+            "ix_permanencias_estacionamento_entrada",
+            "estacionamento_id",
+            "entrada_em",
+        ),
+    )
+
+    id: Mapped[int] = mapped_column(init=False, primary_key=True)
+    usuario_id: Mapped[int] = mapped_column(ForeignKey("usuarios.id"))
+    estacionamento_id: Mapped[int] = mapped_column(
+        ForeignKey("estacionamentos.id")
+    )
+    automovel_id: Mapped[int | None] = mapped_column(
+        ForeignKey("automoveis.id")
+    )
+    # ids em registro_atividade ou, depois de arquivados, em
+    # registro_atividade_arquivo; por isso sem chave estrangeira
+    entrada_id: Mapped[int] = mapped_column(unique=True)
+    entrada_em: Mapped[datetime]
+    saida_id: Mapped[int | None] = mapped_column(default=None)
+    saida_em: Mapped[datetime | None] = mapped_column(default=None)
+    # Em segundos
+    duracao: Mapped[int | None] = mapped_column(default=None)
+
+
+@mapped_as_dataclass(table_registry)
+class RegistroArquivado:
+    # Registros antigos de estadias já fechadas, tirados de
+    # registro_atividade em lotes; mesmo id, tipo como inteiro
+    # (TIPOS_MOVIMENTO) e horário em segundos desde 1970 (UTC)
+    __tablename__ = "registro_atividade_arquivo"
+    __table_args__ = (
+        Index("ix_registro_atividade_arquivo_horario", "horario"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    estacionamento_id: Mapped[int] = mapped_column(
+        ForeignKey("estacionamentos.id")
+    )
+    usuario_id: Mapped[int] = mapped_column(ForeignKey("usuarios.id"))
+    tipo: Mapped[int] = mapped_column(SmallInteger)
+    horario: Mapped[int]
+    caminho: Mapped[str]
+
+
+@mapped_as_dataclass(table_registry)
+class Snapshot:
+    # Ocupação das vagas depois de todos os registros até
+    # ultimo_registro_id; horario é o do mais recente deles
+    __tablename__ = "snapshots"
+
+    id: Mapped[int] = mapped_column(init=False, primary_key=True)
+    ultimo_registro_id: Mapped[int] = mapped_column(index=True)
+    horario: Mapped[datetime] = mapped_column(index=True)
+    criado_em: Mapped[datetime] = mapped_column(
+        init=False, server_default=func.now()
+    )
+
+
+@mapped_as_dataclass(table_registry)
+class SnapshotOcupacao:
+    # Uma linha por vaga ocupada no snapshot, como em ocupacoes
+    __tablename__ = "snapshot_ocupacoes"
+
+    snapshot_id: Mapped[int] = mapped_column(
+        ForeignKey("snapshots.id", ondelete="CASCADE"), primary_key=True
+    )
+    estacionamento_id: Mapped[int] = mapped_column(
+        ForeignKey("estacionamentos.id"), primary_key=True
+    )
+    usuario_id: Mapped[int] = mapped_column(ForeignKey("usuarios.id"))
+    registro_id: Mapped[int]
+
+
+@mapped_as_dataclass(table_registry)
+class Versao:
+    # Contador de cada dado que os processos guardam em memória, como o
+    # mapa; quem escreve nele sobe o contador na mesma transação
+    __tablename__ = "versoes"
+
+    nome: Mapped[str] = mapped_column(primary_key=True)
+    valor: Mapped[int]
+
+
+# Histórico completo, quente e arquivado, no formato de registro_atividade;
+# só para análises. Fica fora do table_registry para o create_all e o
+# alembic não tentarem criar uma tabela com esse nome
+REGISTRO_HISTORICO_SQL = """
+CREATE VIEW IF NOT EXISTS registro_atividade_historico AS
+SELECT id, estacionamento_id, usuario_id, tipo, horario, caminho
+FROM registro_atividade
+UNION ALL
+SELECT
+    id,
+    estacionamento_id,
+    usuario_id,
+    CASE tipo WHEN 0 THEN 'ENTRADA' ELSE 'SAIDA' END,
+    datetime(horario, 'unixepoch'),
+    caminho
+FROM registro_atividade_arquivo
+"""
+
+registro_historico = Table(
+    "registro_atividade_historico",
+    MetaData(),
+    Column("id", Integer),
+    Column("estacionamento_id", Integer),
+    Column("usuario_id", Integer),
+    Column("tipo", String),
+    Column("horario", DateTime),
+    Column("caminho", String),
+)
+
+event.listen(
+    table_registry.metadata, "after_create", DDL(REGISTRO_HISTORICO_SQL)
+)
+event.listen(
+    table_registry.metadata,
+    "before_drop",
+    DDL("DROP VIEW IF EXISTS registro_atividade_historico"),
+)
@@ -1,13 +1,16 @@
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from tropicalcode.models import Automovel
+from tropicalcode.models import Automovel, Permanencia
+from tropicalcode.repositorios import em_massa
+from tropicalcode.repositorios.paginacao import paginar, prefixo
+from tropicalcode.repositorios.transacao import confirmar
 
 
 async def create_automovel(session: AsyncSession, data: dict):
     auto = Automovel(**data)
     session.add(auto)
-    await session.commit()
+    await confirmar(session)
     await session.refresh(auto)
     return auto
 
@@ -19,9 +22,22 @@ async def get_automovel(session: AsyncSession, automovel_id: int):
     return result.scalar_one_or_none()
 
 
-async def get_automoveis(session: AsyncSession):
-    result = await session.execute(select(Automovel))
-    return result.scalars().all()
+async def get_automoveis(
+    session: AsyncSession,
+    depois=None,
+    limite=None,
+    usuario_id=None,
+    placa=None,
+    tipo=None,
+):
+    consulta = select(Automovel)
+    if usuario_id is not None:
+        consulta = consulta.where(Automovel.usuario_id == usuario_id)
+    if placa:
+        consulta = consulta.where(prefixo(Automovel.placa, placa))
+    if tipo:
+        consulta = consulta.where(Automovel.tipo == tipo)
+    return await paginar(session, consulta, (Automovel.id,), depois, limite)
 
 
 async def update_automovel(
@@ -32,7 +48,7 @@ async def update_automovel(
         return None
     for k, v in data.items():
         setattr(auto, k, v)
-    await session.commit()
+    await confirmar(session)
     await session.refresh(auto)
     return auto
 
@@ -41,6 +57,28 @@ async def delete_automovel(session: AsyncSession, automovel_id: int):
     auto = await get_automovel(session, automovel_id)
     if not auto:
         return False
+    # As permanências do automóvel ficam, sem ele
+    await em_massa.soltar(session, Permanencia.automovel_id, [auto.id])
     await session.delete(auto)
-    await session.commit()
+    await confirmar(session)
     return True
+
+
+async def create_automoveis(session: AsyncSession, dados: list[dict]):
+    ids = await em_massa.inserir(session, Automovel, dados)
+    await confirmar(session)
+    return ids
+
+
+async def upsert_automoveis(session: AsyncSession, dados: list[dict]):
+    # Linhas com id atualizam o automóvel, sem id criam um novo
+    ids = await em_massa.upsert(session, Automovel, dados)
+    await confirmar(session)
+    return ids
+
+
+async def delete_automoveis(session: AsyncSession, automovel_ids):
+    await em_massa.soltar(session, Permanencia.automovel_id, automovel_ids)
+    apagados = await em_massa.apagar(session, Automovel, automovel_ids)
+    await confirmar(session)
+    return apagados
@@ -0,0 +1,93 @@
+"""Escritas em lote para os repositórios.
+
+Inserts de várias linhas por comando, com os ids gerados devolvidos na
+ordem das linhas. Nada aqui faz commit: quem chama fecha a transação.
+"""
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+
+def _grupos(dados):
+    # Um executemany pede as mesmas colunas em todas as linhas
+    grupos = {}
+    for i, linha in enumerate(dados):
+        grupos.setdefault(tuple(sorted(linha)), []).append(i)
+    return grupos
+
+
+async def _executar(session, comando, modelo, dados):
+    ids = [None] * len(dados)
+    for colunas, indices in _grupos(dados).items():
+        result = await session.execute(
+            comando(colunas).returning(
+                modelo.id, sort_by_parameter_order=True
+            ),
+            [dados[i] for i in indices],
+        )
+        for i, id_ in zip(indices, result.scalars()):
+            ids[i] = id_
+    return ids
+
+
+async def inserir(session, modelo, dados):
+    return await _executar(session, lambda _: insert(modelo), modelo, dados)
+
+
+async def upsert(session, modelo, dados, chave=("id",)):
+    """Insere ou, se a chave já existir, atualiza as colunas enviadas."""
+
+    def comando(colunas):
+        stmt = sqlite_insert(modelo)
+        # Sem o que atualizar a chave é regravada igual, para a linha
+        # ainda voltar no RETURNING
+        atualizar = {c: stmt.excluded[c] for c in colunas if c not in chave}
+        atualizar = atualizar or {c: stmt.excluded[c] for c in chave}
+        return stmt.on_conflict_do_update(
+            index_elements=list(chave), set_=atualizar
+        )
+
+    return await _executar(session, comando, modelo, dados)
+
+
+async def apagar(session, modelo, ids):
+    result = await session.execute(
+        delete(modelo).where(modelo.id.in_(set(ids)))
+    )
+    return result.rowcount
+
+
+class EmUso(Exception):
+    """Apagar deixaria linhas de outras tabelas apontando para o nada."""
+
+
+async def recusar_em_uso(session, modelo, ids):
+    # Com as chaves estrangeiras ligadas o banco recusaria o DELETE no
+    # meio da transação; aqui a recusa vem antes de qualquer escrita, com
+    # as tabelas que ainda usam as linhas
+    ids = set(ids)
+    tabelas = []
+    for tabela in modelo.__table__.metadata.sorted_tables:
+        for fk in tabela.foreign_keys:
+            if fk.column.table is not modelo.__table__ or fk.ondelete:
+                continue
+            result = await session.execute(
+                select(fk.parent).where(fk.parent.in_(ids)).limit(1)
+            )
+            if result.first() is not None:
+                tabelas.append(tabela.name)
+    if tabelas:
+        raise EmUso(
+            f"Não é possível apagar de {modelo.__tablename__}: ainda há "
+            f"linhas em {', '.join(sorted(set(tabelas)))} apontando para "
+            f"{', '.join(map(str, sorted(ids)))}."
+        )
+
+
+async def soltar(session, coluna, ids):
+    # Referência opcional: quem apontava para as linhas apagadas fica sem
+    await session.execute(
+        update(coluna.class_)
+        .where(coluna.in_(set(ids)))
+        .values({coluna.key: None})
+    )
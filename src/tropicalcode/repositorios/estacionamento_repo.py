@@ -1,122 +1,163 @@
-import heapq
-
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from tropicalcode.models import (
     Caminho,
     Estacionamento,
-    RegistroAtividade,
+    Ocupacao,
     Usuario,
 )
-from tropicalcode.repositorios.trabalho_repo import get_local_trabalho
-
-ORIGEM_X = 0
-ORIGEM_Y = 0
+from tropicalcode.repositorios import em_massa, referencia
+from tropicalcode.repositorios.paginacao import paginar, prefixo
+from tropicalcode.repositorios.transacao import (
+    confirmar,
+    depois_do_commit,
+)
+from tropicalcode.roteamento import alocador
+from tropicalcode.roteamento.cache import (
+    atualizar_vaga,
+    escolher_portao,
+    get_grafo,
+    invalidar_grafo,
+    mapa_alterado,
+    vaga_no_mapa,
+)
+from tropicalcode.roteamento.grafo import (
+    conectar_nos,
+    contrair,
+    expandir_caminhos,
+)
+from tropicalcode.roteamento.tabela import (
+    SETTINGS,
+    calcular_fora_do_laco,
+    get_tabela,
+    pontuar,
+)
 
 
 async def create_estacionamento(session: AsyncSession, data: dict):
     est = Estacionamento(**data)
     session.add(est)
-    await session.commit()
+    versao = await mapa_alterado(session)
+    await confirmar(session)
+    await referencia.invalidar(session, referencia.estacionamentos)
     await session.refresh(est)
+    await depois_do_commit(
+        session, atualizar_vaga, versao, est.id, None, vaga_no_mapa(est)
+    )
     return est
 
 
-async def get_estacionamento(session: AsyncSession, estacionamento_id: int):
+async def _ler_estacionamento(session: AsyncSession, estacionamento_id: int):
     result = await session.execute(
         select(Estacionamento).where(Estacionamento.id == estacionamento_id)
     )
     return result.scalar_one_or_none()
 
 
-async def get_estacionamentos(session: AsyncSession):
-    result = await session.execute(select(Estacionamento))
-    return result.scalars().all()
+async def get_estacionamento(session: AsyncSession, estacionamento_id: int):
+    return await referencia.estacionamentos.ler(
+        session, estacionamento_id, _ler_estacionamento, estacionamento_id
+    )
+
+
+async def get_estacionamentos(
+    session: AsyncSession,
+    depois=None,
+    limite=None,
+    tipo_vaga=None,
+    codigo=None,
+):
+    consulta = select(Estacionamento)
+    if tipo_vaga:
+        consulta = consulta.where(Estacionamento.tipo_vaga == tipo_vaga)
+    if codigo:
+        consulta = consulta.where(prefixo(Estacionamento.codigo_vaga, codigo))
+    return await paginar(
+        session, consulta, (Estacionamento.id,), depois, limite
+    )
 
 
 async def update_estacionamento(
     session: AsyncSession, estacionamento_id: int, data: dict
 ):
-    est = await get_estacionamento(session, estacionamento_id)
+    est = await _ler_estacionamento(session, estacionamento_id)
     if not est:
         return None
+    antes = vaga_no_mapa(est)
     for k, v in data.items():
         setattr(est, k, v)
-    await session.commit()
+    versao = await mapa_alterado(session)
+    await confirmar(session)
+    await referencia.invalidar(session, referencia.estacionamentos)
     await session.refresh(est)
+    await depois_do_commit(
+        session, atualizar_vaga, versao, est.id, antes, vaga_no_mapa(est)
+    )
     return est
 
 
 async def delete_estacionamento(session: AsyncSession, estacionamento_id: int):
-    est = await get_estacionamento(session, estacionamento_id)
+    est = await _ler_estacionamento(session, estacionamento_id)
     if not est:
         return False
+    # Vaga com histórico fica: o histórico não pode perder a vaga
+    await em_massa.recusar_em_uso(session, Estacionamento, [est.id])
     await session.delete(est)
-    await session.commit()
+    versao = await mapa_alterado(session)
+    await confirmar(session)
+    await referencia.invalidar(session, referencia.estacionamentos)
+    await depois_do_commit(
+        session, atualizar_vaga, versao, est.id, vaga_no_mapa(est), None
+    )
     return True
 
 
-async def get_available_estacionamentos(session):
-    result = await session.execute(select(Estacionamento))
-    estacionamentos = result.scalars().all()
+# Em lote o grafo é recompilado uma vez em vez de editado vaga a vaga
+async def create_estacionamentos(session: AsyncSession, dados: list[dict]):
+    ids = await em_massa.inserir(session, Estacionamento, dados)
+    await mapa_alterado(session)
+    await confirmar(session)
+    await referencia.invalidar(session, referencia.estacionamentos)
+    await depois_do_commit(session, invalidar_grafo)
+    return ids
 
-    result2 = await session.execute(select(RegistroAtividade))
-    registros = result2.scalars().all()
 
-    latest = {}
-    for r in registros:
-        e = r.estacionamento_id
-        if e not in latest or r.horario > latest[e].horario:
-            latest[e] = r
+async def upsert_estacionamentos(session: AsyncSession, dados: list[dict]):
+    # Linhas com id atualizam a vaga, sem id criam uma nova
+    ids = await em_massa.upsert(session, Estacionamento, dados)
+    await mapa_alterado(session)
+    await confirmar(session)
+    await referencia.invalidar(session, referencia.estacionamentos)
+    await depois_do_commit(session, invalidar_grafo)
+    return ids
 
-    ocupados = {k for k, v in latest.items() if v.tipo == "ENTRADA"}
 
-    return [e for e in estacionamentos if e.id not in ocupados]
+async def delete_estacionamentos(session: AsyncSession, estacionamento_ids):
+    await em_massa.recusar_em_uso(session, Estacionamento, estacionamento_ids)
+    apagados = await em_massa.apagar(
+        session, Estacionamento, estacionamento_ids
+    )
+    await mapa_alterado(session)
+    await confirmar(session)
+    await referencia.invalidar(session, referencia.estacionamentos)
+    await depois_do_commit(session, invalidar_grafo)
+    return apagados
 
 
-async def build_graph(session, vagas=[], local_trabalho=None):
+async def get_available_estacionamentos(session):
+    # Vagas sem ocupação atual; não depende do tamanho do histórico
+    result = await session.execute(
+        select(Estacionamento)
+        .outerjoin(Ocupacao, Ocupacao.estacionamento_id == Estacionamento.id)
+        .where(Ocupacao.estacionamento_id.is_(None))
+    )
+    return result.scalars().all()
+
+
+async def build_graph(session, vagas=[], local_trabalho=None, contraido=False):
     result = await session.execute(select(Caminho))
-    caminhos = result.scalars().all()
-    graph = {}
-
-    for c in caminhos:
-        o = (c.origem_x, c.origem_y)
-        d = (c.destino_x, c.destino_y)
-
-        if o not in graph:
-            graph[o] = []
-        if d not in graph:
-            graph[d] = []
-
-        current = o
-        while current != d:
-            if current not in graph:
-                graph[current] = []
-
-            next_node = None
-            if current[0] < d[0]:
-                next_node = (current[0] + 1, current[1])
-            elif current[0] > d[0]:
-                next_node = (current[0] - 1, current[1])
-            elif current[1] < d[1]:
-                next_node = (current[0], current[1] + 1)
-            elif current[1] > d[1]:
-                next_node = (current[0], current[1] - 1)
-            else:
-                break
-
-            if next_node not in graph:
-                graph[next_node] = []
-
-            if c.direcao in ("IDA", "AMBOS"):
-                if next_node not in graph[current]:
-                    graph[current].append(next_node)
-            if c.direcao in ("VOLTA", "AMBOS"):
-                if current not in graph[next_node]:
-                    graph[next_node].append(current)
-
-            current = next_node
+    graph = expandir_caminhos(result.scalars().all())
 
     # 2. Cria uma lista de "nós especiais" (vagas + local de trabalho)
     nodes_to_connect = []
@@ -130,52 +171,44 @@ async def build_graph(session, vagas=[], local_trabalho=None):
         ))
 
     # 3. Conecta os "nós especiais" ao grafo principal
-    for pos in nodes_to_connect:
-        if pos not in graph:
-            graph[pos] = []
-
-        for node in graph:
-            if node != pos:
-                # Sua lógica original de conexão
-                if node[0] == pos[0] or node[1] == pos[1]:
-                    if abs(node[0] - pos[0]) + abs(node[1] - pos[1]) <= 1.5:
-                        if pos not in graph[node]:
-                            graph[node].append(pos)
-                        if node not in graph[pos]:
-                            graph[pos].append(node)
+    graph = conectar_nos(graph, nodes_to_connect)
 
+    # 4. Opcional: trechos retos viram uma aresta só, com peso
+    if contraido:
+        return contrair(graph, set(nodes_to_connect))
     return graph
 
 
-def dijkstra(graph, start, target):
-    queue = [(0, start)]
-    visited = set()
-    while queue:
-        dist, node = heapq.heappop(queue)
-        if node == target:
-            return dist
-        if node in visited:
-            continue
-        visited.add(node)
-        for neigh in graph.get(node, []):
-            heapq.heappush(queue, (dist + 1, neigh))
-    return float("inf")
-
-
-async def calcular_distancia(session, vaga):
-    graph = await build_graph(session, vagas=[vaga])
-    origem = (ORIGEM_X, ORIGEM_Y)
-    destino = (vaga.posicao_x, vaga.posicao_y)
+async def calcular_distancia(session, vaga, portao_id=None):
+    tabela = await get_tabela(session)
+    if tabela is not None:
+        portao = escolher_portao(tabela.portoes, portao_id)
+        if vaga.id in tabela.portoes[portao]:
+            return tabela.portoes[portao][vaga.id]
 
-    if origem not in graph or destino not in graph:
-        return float("inf")
-    print("ENTREI AQUi")
-    return dijkstra(graph, origem, destino)
+    grafo = await get_grafo(session)
+    origem = grafo.portoes[escolher_portao(grafo.portoes, portao_id)]
+    destino = (vaga.posicao_x, vaga.posicao_y)
+    return grafo.distancia(origem, destino)
 
 
 async def find_best_for_user(
-    session, usuario: Usuario, tipo_veiculo_selecionado: str
+    session, usuario: Usuario, tipo_veiculo_selecionado: str, portao_id=None
 ):
+    tabela = await get_tabela(session)
+    if tabela is not None:
+        # Topo da fila de vagas livres do portão, local e tipo
+        vaga_id = await alocador.melhor_vaga(
+            session,
+            tabela,
+            escolher_portao(tabela.portoes, portao_id),
+            usuario.local_trabalho,
+            tipo_veiculo_selecionado,
+        )
+        if vaga_id is None:
+            return None
+        return await get_estacionamento(session, vaga_id)
+
     disponiveis = await get_available_estacionamentos(session)
 
     if not disponiveis:
@@ -187,28 +220,68 @@ async def find_best_for_user(
 
     if not vagas_compativeis:
         return None
-    local_trabalho = await get_local_trabalho(session, usuario.local_trabalho)
-    graph = await build_graph(
-        session, vagas=vagas_compativeis, local_trabalho=local_trabalho
-    )
-    origem = (ORIGEM_X, ORIGEM_Y)
-
-    if origem not in graph:
-        return None
 
-    menor = None
-    menor_dist = float("inf")
+    # Tabela ainda sendo reconstruída em segundo plano: busca no grafo
+    grafo = await get_grafo(session)
+    origem = grafo.portoes[escolher_portao(grafo.portoes, portao_id)]
+
+    if usuario.local_trabalho in grafo.locais and SETTINGS.PESO_CAMINHADA:
+        # Uma busca do portão e a árvore a pé do local, que fica guardada
+        # no grafo compilado para os próximos pedidos
+        conducao = grafo.distancias_vagas(origem)
+        a_pe = grafo.distancias_a_pe(usuario.local_trabalho)
+        candidatas = [
+            (pontuar(conducao[v.id], a_pe.get(v.id)), i, v)
+            for i, v in enumerate(vagas_compativeis)
+            if v.id in conducao
+        ]
+        return min(candidatas, default=(None, None, None))[2]
+
+    destinos = {(v.posicao_x, v.posicao_y) for v in vagas_compativeis}
+    ativos = set(destinos)
+    if usuario.local_trabalho in grafo.locais:
+        ativos.add(grafo.locais[usuario.local_trabalho])
+
+    # Uma só busca a partir do portão; entre vagas à mesma distância vale
+    # a primeira da lista, como na comparação vaga a vaga.
+    mais_proximos = grafo.mais_proximos(origem, destinos, ativos)
 
     for v in vagas_compativeis:
-        destino = (v.posicao_x, v.posicao_y)
-
-        if destino not in graph:
-            continue
-
-        d = dijkstra(graph, origem, destino)
-
-        if d < menor_dist:
-            menor = v
-            menor_dist = d
-
-    return menor
+        if (v.posicao_x, v.posicao_y) in mais_proximos:
+            return v
+
+    return None
+
+
+async def alocar_lote(session, pedidos, portao_id=None):
+    # pedidos: [(usuario, automovel)] na ordem de chegada. Guloso sobre a
+    # tabela compartilhada: cada um leva a melhor vaga ainda livre para o
+    # seu portão e local, quem chegou antes escolhe antes.
+    livres = {v.id: v for v in await get_available_estacionamentos(session)}
+
+    tabela = await get_tabela(session)
+    if tabela is None:
+        # Tabela em reconstrução: a onda inteira paga uma montagem só,
+        # no executor da tabela e não no laço de eventos
+        tabela = await calcular_fora_do_laco(await get_grafo(session))
+    portao = escolher_portao(tabela.portoes, portao_id)
+
+    # Vagas só saem de livres, então cada lista é percorrida uma vez só
+    cursores = {}
+    vagas = []
+    for usuario, automovel in pedidos:
+        local = usuario.local_trabalho
+        if (portao, local) in tabela.por_local:
+            ordenadas = tabela.por_local[portao, local]
+        else:
+            local = None
+            ordenadas = tabela.ordenadas[portao]
+        lista = ordenadas.get(automovel.tipo, [])
+
+        i = cursores.get((local, automovel.tipo), 0)
+        while i < len(lista) and lista[i][1] not in livres:
+            i += 1
+        cursores[local, automovel.tipo] = i
+        vagas.append(livres.pop(lista[i][1]) if i < len(lista) else None)
+
+    return vagas
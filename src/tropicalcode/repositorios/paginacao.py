@@ -0,0 +1,65 @@
+"""Paginação por chave (keyset) para as listagens dos repositórios.
+
+Cada página continua depois da chave da última linha da anterior, em vez
+de pular linhas com OFFSET: o custo de uma página é o mesmo na primeira e
+na milésima, e linhas inseridas no meio não repetem nem somem itens.
+"""
+
+from dataclasses import dataclass
+
+from sqlalchemy import literal, tuple_
+
+
+@dataclass
+class Pagina:
+    itens: list
+    # Chave para pedir a página seguinte; None na última
+    proxima: tuple | None
+
+
+def _chave(item, colunas):
+    return tuple(getattr(item, coluna.key) for coluna in colunas)
+
+
+async def paginar(
+    session,
+    consulta,
+    colunas,
+    depois=None,
+    limite=None,
+    decrescente=False,
+):
+    """Executa consulta ordenada por colunas, a partir da chave depois.
+
+    As colunas juntas precisam identificar a linha: uma coluna única ou
+    terminar no id. Sem limite devolve tudo, na mesma ordem.
+    """
+    if depois is not None:
+        # Com o tipo de cada coluna, para um horário ser comparado no mesmo
+        # formato em que foi gravado
+        chave = tuple_(*colunas)
+        valores = tuple_(
+            *(literal(v, c.type) for c, v in zip(colunas, depois))
+        )
+        consulta = consulta.where(
+            chave < valores if decrescente else chave > valores
+        )
+    ordem = [c.desc() for c in colunas] if decrescente else list(colunas)
+    consulta = consulta.order_by(*ordem)
+    if limite is None:
+        result = await session.execute(consulta)
+        return Pagina(list(result.scalars()), None)
+
+    # Uma linha a mais só para saber se existe página seguinte
+    result = await session.execute(consulta.limit(limite + 1))
+    itens = list(result.scalars())
+    if len(itens) <= limite:
+        return Pagina(itens, None)
+    itens = itens[:limite]
+    return Pagina(itens, _chave(itens[-1], colunas))
+
+
+def prefixo(coluna, texto):
+    # Intervalo em vez de LIKE: no SQLite o LIKE ignora maiúsculas e não
+    # usa o índice da coluna
+    return (coluna >= texto) & (coluna < texto + "\U0010ffff")
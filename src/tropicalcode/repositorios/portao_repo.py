@@ -0,0 +1,81 @@
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from tropicalcode.models import Portao
+from tropicalcode.repositorios import em_massa
+from tropicalcode.repositorios.transacao import (
+    confirmar,
+    depois_do_commit,
+)
+from tropicalcode.roteamento.cache import invalidar_grafo, mapa_alterado
+
+
+async def create_portao(session: AsyncSession, data: dict):
+    portao = Portao(**data)
+    session.add(portao)
+    await mapa_alterado(session)
+    await confirmar(session)
+    await session.refresh(portao)
+    await depois_do_commit(session, invalidar_grafo)
+    return portao
+
+
+async def get_portao(session: AsyncSession, portao_id: int):
+    result = await session.execute(
+        select(Portao).where(Portao.id == portao_id)
+    )
+    return result.scalar_one_or_none()
+
+
+async def get_portoes(session: AsyncSession):
+    result = await session.execute(select(Portao).order_by(Portao.id))
+    return result.scalars().all()
+
+
+async def update_portao(session: AsyncSession, portao_id: int, data: dict):
+    portao = await get_portao(session, portao_id)
+    if not portao:
+        return None
+    for k, v in data.items():
+        setattr(portao, k, v)
+    await mapa_alterado(session)
+    await confirmar(session)
+    await session.refresh(portao)
+    await depois_do_commit(session, invalidar_grafo)
+    return portao
+
+
+async def delete_portao(session: AsyncSession, portao_id: int):
+    portao = await get_portao(session, portao_id)
+    if not portao:
+        return False
+    await session.delete(portao)
+    await mapa_alterado(session)
+    await confirmar(session)
+    await depois_do_commit(session, invalidar_grafo)
+    return True
+
+
+async def create_portoes(session: AsyncSession, dados: list[dict]):
+    ids = await em_massa.inserir(session, Portao, dados)
+    await mapa_alterado(session)
+    await confirmar(session)
+    await depois_do_commit(session, invalidar_grafo)
+    return ids
+
+
+async def upsert_portoes(session: AsyncSession, dados: list[dict]):
+    # Portão já cadastrado com o mesmo nome é atualizado
+    ids = await em_massa.upsert(session, Portao, dados, chave=("nome",))
+    await mapa_alterado(session)
+    await confirmar(session)
+    await depois_do_commit(session, invalidar_grafo)
+    return ids
+
+
+async def delete_portoes(session: AsyncSession, portao_ids):
+    apagados = await em_massa.apagar(session, Portao, portao_ids)
+    await mapa_alterado(session)
+    await confirmar(session)
+    await depois_do_commit(session, invalidar_grafo)
+    return apagados
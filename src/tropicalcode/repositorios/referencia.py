@@ -0,0 +1,151 @@
+"""Cache de leitura dos dados de referência: locais de trabalho, vagas e
+usuários por nome, relidos a cada página.
+
+Cada cache é um LRU limitado, com validade, na frente da consulta do
+repositório. Guarda só os valores das colunas e devolve instâncias novas,
+fora de qualquer sessão, para que nenhuma página altere ou recarregue o
+objeto de outra. A chave leva a versão gravada no banco (versoes) do que
+o cache guarda: escrita de outro processo muda a chave em vez de esperar
+a validade.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import inspect
+from sqlalchemy.orm.attributes import set_committed_value
+
+from tropicalcode.repositorios import versoes
+from tropicalcode.repositorios.transacao import ao_terminar
+from tropicalcode.roteamento.cache import ao_editar, ao_invalidar
+from tropicalcode.settings import Settings
+
+
+def _congelar(resultado):
+    if isinstance(resultado, list | tuple):
+        return [_congelar(item) for item in resultado]
+    mapper = inspect(resultado).mapper
+    valores = {
+        attr.key: getattr(resultado, attr.key) for attr in mapper.column_attrs
+    }
+    return mapper, valores
+
+
+def _descongelar(guardado):
+    if isinstance(guardado, list):
+        return [_descongelar(item) for item in guardado]
+    mapper, valores = guardado
+    instancia = mapper.class_manager.new_instance()
+    for chave, valor in valores.items():
+        set_committed_value(instancia, chave, valor)
+    return instancia
+
+
+class CacheLRU:
+    def __init__(self, nome, versao, tamanho, validade):
+        self.nome = nome
+        # Nome em versoes que quem escreve nessas tabelas sobe
+        self.versao = versao
+        self.tamanho = tamanho
+        self.validade = validade
+        self.acertos = 0
+        self.faltas = 0
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+        # Muda a cada limpeza: carga começada antes dela não é guardada
+        self._geracao = 0
+
+    def _consultar(self, chave):
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is not None and item[0] > time.monotonic():
+                self._itens.move_to_end(chave)
+                self.acertos += 1
+                return item[1], self._geracao
+            self._itens.pop(chave, None)
+            self.faltas += 1
+            return None, self._geracao
+
+    def _guardar(self, chave, guardado, geracao):
+        with self._lock:
+            if geracao != self._geracao:
+                return
+            self._itens[chave] = (time.monotonic() + self.validade, guardado)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.tamanho:
+                self._itens.popitem(last=False)
+
+    async def ler(self, session, chave, carregar, *args):
+        """Instâncias guardadas para chave ou carregar(session, *args).
+
+        None não é guardado: um cadastro novo aparece na próxima leitura.
+        """
+        chave = (await versoes.ler(session, self.versao), chave)
+        guardado, geracao = self._consultar(chave)
+        if guardado is None:
+            resultado = await carregar(session, *args)
+            if resultado is None:
+                return None
+            guardado = _congelar(resultado)
+            self._guardar(chave, guardado, geracao)
+        return _descongelar(guardado)
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+            self._geracao += 1
+
+    def estatisticas(self):
+        with self._lock:
+            return {
+                "acertos": self.acertos,
+                "faltas": self.faltas,
+                "itens": len(self._itens),
+            }
+
+
+def _novo(nome, versao):
+    settings = Settings()
+    return CacheLRU(
+        nome,
+        versao,
+        settings.CACHE_REFERENCIA_TAMANHO,
+        settings.CACHE_REFERENCIA_VALIDADE,
+    )
+
+
+locais = _novo("locais_trabalho", versoes.MAPA)
+estacionamentos = _novo("estacionamentos", versoes.MAPA)
+usuarios = _novo("usuarios", versoes.USUARIOS)
+CACHES = (locais, estacionamentos, usuarios)
+
+
+async def invalidar(session, cache):
+    # Já, para a própria transação não ler o valor antigo, e de novo no
+    # fim dela: outra página pode ter guardado o de antes do commit, e a
+    # própria transação o que um rollback desfez
+    cache.limpar()
+    await ao_terminar(session, cache.limpar)
+
+
+def limpar_tudo():
+    for cache in CACHES:
+        cache.limpar()
+
+
+def estatisticas():
+    return {cache.nome: cache.estatisticas() for cache in CACHES}
+
+
+# Vagas e locais também mudam fora dos repositórios, pelo editor do mapa,
+# que sempre avisa o grafo de rotas
+@ao_invalidar
+def _mapa_invalidado():
+    locais.limpar()
+    estacionamentos.limpar()
+
+
+@ao_editar
+def _mapa_editado(antigo, novo, mudadas):
+    estacionamentos.limpar()
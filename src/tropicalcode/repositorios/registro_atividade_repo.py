@@ -1,22 +1,513 @@
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 
-from sqlalchemy import select
+from sqlalchemy import (
+    Integer,
+    case,
+    cast,
+    delete,
+    func,
+    insert,
+    or_,
+    select,
+    union,
+)
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
 
-from tropicalcode.models import RegistroAtividade
+from tropicalcode.models import (
+    TIPOS_MOVIMENTO,
+    EstadiaAberta,
+    Ocupacao,
+    Permanencia,
+    RegistroArquivado,
+    RegistroAtividade,
+)
+from tropicalcode.repositorios import em_massa, versoes
+from tropicalcode.repositorios.estacionamento_repo import (
+    alocar_lote,
+    find_best_for_user,
+)
+from tropicalcode.repositorios.paginacao import paginar
+from tropicalcode.repositorios.portao_repo import get_portao
+from tropicalcode.repositorios.snapshot_repo import (
+    invalidar_snapshots,
+    ocupacoes_em,
+    snapshot_se_preciso,
+)
+from tropicalcode.repositorios.transacao import (
+    confirmar,
+    depois_do_commit,
+    unidade_de_trabalho,
+)
+from tropicalcode.roteamento import alocador
+from tropicalcode.settings import Settings
 
+ENTRADA_ATIVA = "Você já possui uma entrada ativa."
+PORTAO_DESCONHECIDO = "Portão não cadastrado; leia de novo o QR code."
 
-async def create_registro(session: AsyncSession, data: dict):
+# Mais recente primeiro; no empate de horário vale o maior id
+_MAIS_RECENTE = (RegistroAtividade.horario.desc(), RegistroAtividade.id.desc())
+
+
+def ultimos_registros(coluna, ids=None):
+    """Consulta do último registro de cada vaga ou usuário.
+
+    coluna é RegistroAtividade.estacionamento_id ou .usuario_id; os
+    índices (coluna, horario) mantêm a consulta longe da tabela inteira
+    quando ids é informado.
+    """
+    numerados = select(
+        RegistroAtividade,
+        func
+        .row_number()
+        .over(partition_by=coluna, order_by=_MAIS_RECENTE)
+        .label("ordem"),
+    )
+    if ids is not None:
+        numerados = numerados.where(coluna.in_(set(ids)))
+    numerados = numerados.subquery()
+    registro = aliased(RegistroAtividade, numerados)
+    return select(registro).where(numerados.c.ordem == 1)
+
+
+def _estado(modelo, registro: RegistroAtividade):
+    return modelo(
+        estacionamento_id=registro.estacionamento_id,
+        usuario_id=registro.usuario_id,
+        registro_id=registro.id,
+    )
+
+
+def _sem_fuso(horario):
+    # Horários do banco voltam sem fuso; todos são UTC
+    return horario.replace(tzinfo=None)
+
+
+def _segundos(inicio, fim):
+    return round((_sem_fuso(fim) - _sem_fuso(inicio)).total_seconds())
+
+
+async def _fechar_permanencia(session: AsyncSession, registro, saida_id):
+    result = await session.execute(
+        select(Permanencia).where(
+            Permanencia.usuario_id == registro.usuario_id,
+            Permanencia.saida_em.is_(None),
+        )
+    )
+    for permanencia in result.scalars():
+        permanencia.saida_id = saida_id
+        permanencia.saida_em = registro.horario
+        permanencia.duracao = _segundos(
+            permanencia.entrada_em, registro.horario
+        )
+
+
+async def _abrir_permanencia(session: AsyncSession, registro, automovel_id):
+    # Entrada sem saída antes dela: a estadia anterior termina na nova
+    await _fechar_permanencia(session, registro, None)
+    session.add(
+        Permanencia(
+            usuario_id=registro.usuario_id,
+            estacionamento_id=registro.estacionamento_id,
+            automovel_id=automovel_id,
+            entrada_id=registro.id,
+            entrada_em=registro.horario,
+        )
+    )
+
+
+async def _aplicar_registro(session: AsyncSession, registro, automovel_id):
+    # Entrada ocupa a vaga e abre a estadia e a permanência do usuário,
+    # saída fecha tudo; vai no mesmo commit do registro
+    if registro.tipo == "ENTRADA":
+        await session.merge(_estado(Ocupacao, registro))
+        await session.merge(_estado(EstadiaAberta, registro))
+        await _abrir_permanencia(session, registro, automovel_id)
+    else:
+        await _fechar_permanencia(session, registro, registro.id)
+        await session.execute(
+            delete(Ocupacao).where(
+                Ocupacao.estacionamento_id == registro.estacionamento_id
+            )
+        )
+        await session.execute(
+            delete(EstadiaAberta).where(
+                EstadiaAberta.usuario_id == registro.usuario_id
+            )
+        )
+
+
+async def _reivindicar(session: AsyncSession, modelo, registro):
+    # Só grava se a chave estiver livre: a chave primária de ocupacoes
+    # (vaga) e de estadias_abertas (usuário) garante um dono por vaga e
+    # uma entrada por usuário mesmo com entradas simultâneas, sem trava no
+    # processo
+    result = await session.execute(
+        sqlite_insert(modelo)
+        .values(
+            estacionamento_id=registro.estacionamento_id,
+            usuario_id=registro.usuario_id,
+            registro_id=registro.id,
+        )
+        .on_conflict_do_nothing()
+    )
+    return result.rowcount == 1
+
+
+async def _desistir(session: AsyncSession, registro: RegistroAtividade):
+    # Vaga tomada por outra entrada: o registro sai e a vaga deixa de ser
+    # oferecida por este processo
+    await session.delete(registro)
+    await session.flush()
+    alocador.ocupar(registro.estacionamento_id)
+
+
+async def _devolver(session: AsyncSession, registro: RegistroAtividade):
+    # O usuário entrou por outra sessão no meio do caminho: a vaga que
+    # este registro acabou de ocupar volta a ficar livre
+    await session.execute(
+        delete(Ocupacao).where(
+            Ocupacao.estacionamento_id == registro.estacionamento_id,
+            Ocupacao.registro_id == registro.id,
+        )
+    )
+    await session.delete(registro)
+    await session.flush()
+
+
+async def _entrar(session: AsyncSession, registro, automovel_id):
+    # None quando a entrada ficou com a vaga; senão o motivo da desistência
+    await session.flush()
+    if not await _reivindicar(session, Ocupacao, registro):
+        await _desistir(session, registro)
+        return "vaga"
+    if not await _reivindicar(session, EstadiaAberta, registro):
+        await _devolver(session, registro)
+        return "usuario"
+    await _abrir_permanencia(session, registro, automovel_id)
+    return None
+
+
+def _avisar_alocador(registros):
+    # Depois do commit: as filas em memória seguem o que foi gravado
+    for registro in registros:
+        if registro.tipo == "ENTRADA":
+            alocador.ocupar(registro.estacionamento_id)
+        else:
+            alocador.liberar(registro.estacionamento_id)
+    alocador.avancar([registro.id for registro in registros])
+
+
+async def _depois_de_registrar(session: AsyncSession, registros):
+    if not registros:
+        return
+    await depois_do_commit(session, _avisar_alocador, registros)
+    await depois_do_commit(
+        session, snapshot_se_preciso, session, max(r.id for r in registros)
+    )
+
+
+async def _reconstruir(session: AsyncSession, modelo, coluna, ids):
+    # Linhas de modelo para as chaves (vagas ou usuários) cujo último
+    # registro é uma entrada, de todas ou só das indicadas
+    ultimos = ultimos_registros(
+        getattr(RegistroAtividade, coluna), ids
+    ).subquery()
+    entradas = select(
+        ultimos.c.estacionamento_id, ultimos.c.usuario_id, ultimos.c.id
+    ).where(ultimos.c.tipo == "ENTRADA")
+    limpar = delete(modelo)
+    if ids is not None:
+        limpar = limpar.where(getattr(modelo, coluna).in_(set(ids)))
+
+    await session.execute(limpar)
+    await session.execute(
+        insert(modelo).from_select(
+            ["estacionamento_id", "usuario_id", "registro_id"], entradas
+        )
+    )
+
+
+async def reconstruir_ocupacoes(
+    session: AsyncSession, estacionamento_ids=None
+):
+    # Refaz a ocupação a partir do histórico: fica ocupada a vaga cujo
+    # último registro é uma entrada. O lote inteiro parte do último
+    # snapshot em vez de percorrer o histórico todo
+    if estacionamento_ids is not None:
+        await _reconstruir(
+            session, Ocupacao, "estacionamento_id", estacionamento_ids
+        )
+    else:
+        ocupadas = await ocupacoes_em(session)
+        await session.execute(delete(Ocupacao))
+        if ocupadas:
+            await session.execute(
+                insert(Ocupacao),
+                [
+                    {
+                        "estacionamento_id": vaga,
+                        "usuario_id": usuario_id,
+                        "registro_id": registro_id,
+                    }
+                    for vaga, (usuario_id, registro_id) in ocupadas.items()
+                ],
+            )
+    await versoes.subir(session, versoes.HISTORICO)
+    await confirmar(session)
+    await depois_do_commit(session, alocador.invalidar)
+
+
+async def reconstruir_estadias(session: AsyncSession, usuario_ids=None):
+    # Idem para as estadias: está dentro quem tem uma entrada como último
+    # registro
+    await _reconstruir(session, EstadiaAberta, "usuario_id", usuario_ids)
+    await confirmar(session)
+
+
+def pares_entrada_saida(usuario_ids=None):
+    """Consulta que pareia cada entrada com o registro seguinte do usuário.
+
+    O seguinte pode ser a saída que fecha a estadia, outra entrada (a
+    estadia termina nela, sem saída registrada) ou nada (ainda aberta).
+    """
+    registro = RegistroAtividade
+    janela = {
+        "partition_by": registro.usuario_id,
+        "order_by": (registro.horario, registro.id),
+    }
+    eventos = select(
+        registro.id,
+        registro.usuario_id,
+        registro.estacionamento_id,
+        registro.tipo,
+        registro.horario,
+        func.lead(registro.id).over(**janela).label("proximo_id"),
+        func.lead(registro.tipo).over(**janela).label("proximo_tipo"),
+        func.lead(registro.horario).over(**janela).label("proximo_em"),
+    )
+    if usuario_ids is not None:
+        eventos = eventos.where(registro.usuario_id.in_(set(usuario_ids)))
+    e = eventos.subquery()
+
+    duracao = (
+        func.julianday(e.c.proximo_em) - func.julianday(e.c.horario)
+    ) * 86400
+    return select(
+        e.c.usuario_id,
+        e.c.estacionamento_id,
+        e.c.id,
+        e.c.horario,
+        case((e.c.proximo_tipo == "SAIDA", e.c.proximo_id)),
+        e.c.proximo_em,
+        cast(func.round(duracao), Integer),
+    ).where(e.c.tipo == "ENTRADA")
+
+
+async def _reconstruir_permanencias(session: AsyncSession, usuario_ids):
+    # Refaz as permanências a partir do histórico, em massa. As que já
+    # existiam são atualizadas no lugar, guardando o automóvel (o
+    # histórico não o registra). As permanências já arquivadas ficam como
+    # estão
+    filtro = [Permanencia.entrada_id.not_in(select(RegistroArquivado.id))]
+    if usuario_ids is not None:
+        filtro.append(Permanencia.usuario_id.in_(set(usuario_ids)))
+
+    # Some a permanência cuja entrada deixou de existir ou de ser entrada
+    # do mesmo usuário
+    entrada = (
+        select(RegistroAtividade.id)
+        .where(
+            RegistroAtividade.id == Permanencia.entrada_id,
+            RegistroAtividade.usuario_id == Permanencia.usuario_id,
+            RegistroAtividade.tipo == "ENTRADA",
+        )
+        .exists()
+    )
+    await session.execute(delete(Permanencia).where(*filtro, ~entrada))
+
+    colunas = [
+        "usuario_id",
+        "estacionamento_id",
+        "entrada_id",
+        "entrada_em",
+        "saida_id",
+        "saida_em",
+        "duracao",
+    ]
+    stmt = sqlite_insert(Permanencia).from_select(
+        colunas, pares_entrada_saida(usuario_ids)
+    )
+    await session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[Permanencia.entrada_id],
+            set_={c: stmt.excluded[c] for c in colunas if c != "entrada_id"},
+        )
+    )
+
+
+async def reconstruir_permanencias(session: AsyncSession, usuario_ids=None):
+    await _reconstruir_permanencias(session, usuario_ids)
+    await confirmar(session)
+
+
+def _presos(registros, usados, usuarios, vagas):
+    # Registros anteriores ao corte que ficam na tabela quente: os em uso e
+    # tudo o que vem depois deles na mesma vaga ou do mesmo usuário, já que
+    # as reconstruções só leem a tabela quente e perderiam a saída que fecha
+    # a estadia ou o registro que libera a vaga. usuarios e vagas são os já
+    # presos nos lotes anteriores, em ordem de horário, e crescem aqui
+    presos = set()
+    for registro in registros:
+        if (
+            registro.id in usados
+            or registro.usuario_id in usuarios
+            or registro.estacionamento_id in vagas
+        ):
+            presos.add(registro.id)
+            usuarios.add(registro.usuario_id)
+            vagas.add(registro.estacionamento_id)
+    return presos
+
+
+async def arquivar_registros(
+    session: AsyncSession, horizonte_dias=None, lote=None
+):
+    """Move para o arquivo os registros mais antigos que o horizonte cujas
+    estadias já fecharam antes dele; devolve quantos foram movidos.
+
+    Cada lote sai de registro_atividade e entra no arquivo no mesmo commit.
+    """
+    settings = Settings()
+    if horizonte_dias is None:
+        horizonte_dias = settings.ARQUIVO_HORIZONTE_DIAS
+    lote = lote or settings.ARQUIVO_LOTE
+    corte = datetime.now(timezone.utc) - timedelta(days=horizonte_dias)
+
+    # Entradas de estadias ainda abertas ou fechadas depois do corte, e as
+    # que o estado atual ainda aponta
+    em_uso = union(
+        select(Permanencia.entrada_id).where(
+            or_(Permanencia.saida_em.is_(None), Permanencia.saida_em >= corte)
+        ),
+        select(Ocupacao.registro_id),
+        select(EstadiaAberta.registro_id),
+    )
+    codigos = {tipo: i for i, tipo in enumerate(TIPOS_MOVIMENTO)}
+    compactado = select(
+        RegistroAtividade.id,
+        RegistroAtividade.estacionamento_id,
+        RegistroAtividade.usuario_id,
+        case(codigos, value=RegistroAtividade.tipo),
+        cast(func.strftime("%s", RegistroAtividade.horario), Integer),
+        RegistroAtividade.caminho,
+    )
+
+    # Em ordem de horário, um lote por vez: da história antiga só ficam em
+    # memória o lote e os usuários e vagas já presos
+    antigos = select(RegistroAtividade).where(
+        RegistroAtividade.horario < corte
+    )
+    ordem = (RegistroAtividade.horario, RegistroAtividade.id)
+    usuarios, vagas = set(), set()
+    movidos, depois = 0, None
+    while True:
+        pagina = await paginar(session, antigos, ordem, depois, lote)
+        lidos = [r.id for r in pagina.itens]
+        result = await session.execute(
+            select(RegistroAtividade.id).where(
+                RegistroAtividade.id.in_(lidos),
+                RegistroAtividade.id.in_(em_uso),
+            )
+        )
+        presos = _presos(pagina.itens, set(result.scalars()), usuarios, vagas)
+        ids = [i for i in lidos if i not in presos]
+        if ids:
+            await session.execute(
+                insert(RegistroArquivado).from_select(
+                    [
+                        "id",
+                        "estacionamento_id",
+                        "usuario_id",
+                        "tipo",
+                        "horario",
+                        "caminho",
+                    ],
+                    compactado.where(RegistroAtividade.id.in_(ids)),
+                )
+            )
+            await session.execute(
+                delete(RegistroAtividade).where(RegistroAtividade.id.in_(ids))
+            )
+            await confirmar(session)
+            movidos += len(ids)
+        if pagina.proxima is None:
+            return movidos
+        depois = pagina.proxima
+
+
+async def create_registro(
+    session: AsyncSession, data: dict, automovel_id=None
+):
     registro = RegistroAtividade(
         **data,
         horario=datetime.now(timezone.utc),
     )
     session.add(registro)
-    await session.commit()
+    await session.flush()
+    await _aplicar_registro(session, registro, automovel_id)
+    await confirmar(session)
+    await _depois_de_registrar(session, [registro])
     await session.refresh(registro)
     return registro
 
 
+async def reservar_vaga(
+    session: AsyncSession,
+    usuario,
+    tipo_veiculo: str,
+    portao_id=None,
+    caminho="/entrada",
+    automovel_id=None,
+):
+    if portao_id is not None and await get_portao(session, portao_id) is None:
+        await confirmar(session)
+        return {"error": PORTAO_DESCONHECIDO}
+
+    # Escolhe, registra e ocupa a vaga numa transação; se outra entrada
+    # levou a vaga no meio do caminho, tenta a próxima melhor
+    while True:
+        estacionamento = await find_best_for_user(
+            session, usuario, tipo_veiculo, portao_id
+        )
+        if estacionamento is None:
+            await confirmar(session)
+            return {
+                "error": f"Nenhuma vaga do tipo '{tipo_veiculo}' "
+                "está disponível no momento."
+            }
+
+        registro = RegistroAtividade(
+            estacionamento_id=estacionamento.id,
+            usuario_id=usuario.id,
+            tipo="ENTRADA",
+            horario=datetime.now(timezone.utc),
+            caminho=caminho,
+        )
+        session.add(registro)
+        motivo = await _entrar(session, registro, automovel_id)
+        if motivo != "vaga":
+            break
+
+    await confirmar(session)
+    if motivo == "usuario":
+        return {"error": ENTRADA_ATIVA}
+    await _depois_de_registrar(session, [registro])
+    await session.refresh(registro)
+    return {"estacionamento": estacionamento, "registro": registro}
+
+
 async def get_registro(session: AsyncSession, registro_id: int):
     result = await session.execute(
         select(RegistroAtividade).where(RegistroAtividade.id == registro_id)
@@ -24,42 +515,243 @@ async def get_registro(session: AsyncSession, registro_id: int):
     return result.scalar_one_or_none()
 
 
-async def get_registros(session: AsyncSession):
-    result = await session.execute(select(RegistroAtividade))
-    return result.scalars().all()
+async def get_registros(
+    session: AsyncSession,
+    depois=None,
+    limite=None,
+    usuario_id=None,
+    estacionamento_id=None,
+    tipo=None,
+    desde=None,
+    ate=None,
+):
+    # Mais recentes primeiro; filtrando por usuário ou por vaga a ordem sai
+    # dos índices (usuario_id, horario) e (estacionamento_id, horario), que
+    # no SQLite já terminam no id
+    consulta = select(RegistroAtividade)
+    if usuario_id is not None:
+        consulta = consulta.where(RegistroAtividade.usuario_id == usuario_id)
+    if estacionamento_id is not None:
+        consulta = consulta.where(
+            RegistroAtividade.estacionamento_id == estacionamento_id
+        )
+    if tipo:
+        consulta = consulta.where(RegistroAtividade.tipo == tipo)
+    if desde is not None:
+        consulta = consulta.where(RegistroAtividade.horario >= desde)
+    if ate is not None:
+        consulta = consulta.where(RegistroAtividade.horario < ate)
+    return await paginar(
+        session,
+        consulta,
+        (RegistroAtividade.horario, RegistroAtividade.id),
+        depois,
+        limite,
+        decrescente=True,
+    )
 
 
 async def update_registro(session: AsyncSession, registro_id: int, data: dict):
-    registro = await get_registro(session, registro_id)
-    if not registro:
-        return None
-    for k, v in data.items():
-        setattr(registro, k, v)
-    await session.commit()
+    # A edição e as reconstruções num commit só: uma falha no meio não
+    # deixa o registro editado com a ocupação de antes
+    async with unidade_de_trabalho(session):
+        registro = await get_registro(session, registro_id)
+        if not registro:
+            return None
+        vaga_antes = registro.estacionamento_id
+        usuario_antes = registro.usuario_id
+        horario_antes = registro.horario
+        for k, v in data.items():
+            setattr(registro, k, v)
+        await confirmar(session)
+        await invalidar_snapshots(
+            session,
+            registro.id,
+            min(_sem_fuso(horario_antes), _sem_fuso(registro.horario)),
+        )
+        # Editar o histórico pode mudar o último registro das vagas e dos
+        # usuários de antes e de depois
+        await reconstruir_ocupacoes(
+            session, {vaga_antes, registro.estacionamento_id}
+        )
+        usuarios = {usuario_antes, registro.usuario_id}
+        await reconstruir_estadias(session, usuarios)
+        await reconstruir_permanencias(session, usuarios)
     await session.refresh(registro)
     return registro
 
 
 async def delete_registro(session: AsyncSession, registro_id: int):
-    registro = await get_registro(session, registro_id)
-    if not registro:
-        return False
-    await session.delete(registro)
-    await session.commit()
+    async with unidade_de_trabalho(session):
+        registro = await get_registro(session, registro_id)
+        if not registro:
+            return False
+        # Ocupação e estadia apontam para o registro; são refeitas abaixo
+        for modelo in (Ocupacao, EstadiaAberta):
+            await session.execute(
+                delete(modelo).where(modelo.registro_id == registro.id)
+            )
+        await session.delete(registro)
+        await confirmar(session)
+        await invalidar_snapshots(session, registro.id, registro.horario)
+        await reconstruir_ocupacoes(session, {registro.estacionamento_id})
+        await reconstruir_estadias(session, {registro.usuario_id})
+        await reconstruir_permanencias(session, {registro.usuario_id})
     return True
 
 
+async def get_estadia_aberta(session: AsyncSession, usuario_id: int):
+    result = await session.execute(
+        select(EstadiaAberta).where(EstadiaAberta.usuario_id == usuario_id)
+    )
+    return result.scalar_one_or_none()
+
+
 async def usuario_tem_entrada_ativa(session: AsyncSession, usuario_id: int):
-    result = await session.execute(select(RegistroAtividade))
-    registros = result.scalars().all()
+    return await get_estadia_aberta(session, usuario_id) is not None
+
+
+async def usuarios_com_entrada_ativa(session: AsyncSession, usuario_ids):
+    result = await session.execute(
+        select(EstadiaAberta.usuario_id).where(
+            EstadiaAberta.usuario_id.in_(set(usuario_ids))
+        )
+    )
+    return set(result.scalars())
+
+
+async def registrar_entradas(
+    session: AsyncSession, pedidos, portao_id=None, caminho="/entrada"
+):
+    # Uma onda de chegadas: uma leitura das vagas livres, uma alocação
+    # sobre as distâncias compartilhadas e um commit só para todos
+    if portao_id is not None and await get_portao(session, portao_id) is None:
+        await confirmar(session)
+        return [{"error": PORTAO_DESCONHECIDO} for _ in pedidos]
+
+    ativos = await usuarios_com_entrada_ativa(
+        session, [usuario.id for usuario, _ in pedidos]
+    )
+
+    # Quem já está estacionado (ou repetido na onda) não disputa vaga
+    resultados = {}
+    pendentes = []
+    for i, (usuario, _) in enumerate(pedidos):
+        if usuario.id in ativos:
+            resultados[i] = {"error": ENTRADA_ATIVA}
+        else:
+            ativos.add(usuario.id)
+            pendentes.append(i)
+
+    # Vagas levadas por entradas simultâneas voltam a ser distribuídas
+    # entre quem ficou sem; a releitura das livres já não as inclui
+    horario = datetime.now(timezone.utc)
+    registros = []
+    while pendentes:
+        vagas = await alocar_lote(
+            session, [pedidos[i] for i in pendentes], portao_id
+        )
+        tentativas = []
+        for i, vaga in zip(pendentes, vagas):
+            usuario, automovel = pedidos[i]
+            if vaga is None:
+                resultados[i] = {
+                    "error": f"Nenhuma vaga do tipo '{automovel.tipo}' "
+                    "está disponível no momento."
+                }
+                continue
+            registro = RegistroAtividade(
+                estacionamento_id=vaga.id,
+                usuario_id=usuario.id,
+                tipo="ENTRADA",
+                horario=horario,
+                caminho=caminho,
+            )
+            session.add(registro)
+            tentativas.append((i, vaga, registro, automovel.id))
+        await session.flush()
+
+        pendentes = []
+        for i, vaga, registro, automovel_id in tentativas:
+            motivo = await _entrar(session, registro, automovel_id)
+            if motivo is None:
+                resultados[i] = {"estacionamento": vaga, "registro": registro}
+                registros.append(registro)
+            elif motivo == "vaga":
+                pendentes.append(i)
+            else:
+                resultados[i] = {"error": ENTRADA_ATIVA}
 
-    latest = None
-    for r in registros:
-        if r.usuario_id == usuario_id:
-            if latest is None or r.horario > latest.horario:
-                latest = r
+    await confirmar(session)
+    await _depois_de_registrar(session, registros)
+    return [resultados[i] for i in range(len(pedidos))]
+
+
+async def _fechar_lote(session: AsyncSession, ids, afetados):
+    # Estado derivado das vagas e usuários tocados pelo lote no mesmo
+    # commit dos registros; afetados são (vaga, usuário, horário)
+    vagas = {vaga for vaga, _, _ in afetados}
+    usuarios = {usuario for _, usuario, _ in afetados}
+    await _reconstruir(session, Ocupacao, "estacionamento_id", vagas)
+    await _reconstruir(session, EstadiaAberta, "usuario_id", usuarios)
+    await _reconstruir_permanencias(session, usuarios)
+    await versoes.subir(session, versoes.HISTORICO)
+    await confirmar(session)
+    await depois_do_commit(session, alocador.invalidar)
+    horarios = [_sem_fuso(h) for _, _, h in afetados if h is not None]
+    if ids and horarios:
+        await invalidar_snapshots(session, min(ids), min(horarios))
+
+
+def _afetados(dados):
+    return [
+        (linha["estacionamento_id"], linha["usuario_id"], linha.get("horario"))
+        for linha in dados
+    ]
+
+
+async def _afetados_por_id(session: AsyncSession, registro_ids):
+    result = await session.execute(
+        select(
+            RegistroAtividade.estacionamento_id,
+            RegistroAtividade.usuario_id,
+            RegistroAtividade.horario,
+        ).where(RegistroAtividade.id.in_(set(registro_ids)))
+    )
+    return result.all()
+
+
+async def create_registros(session: AsyncSession, dados: list[dict]):
+    """Grava um lote de registros, um histórico importado por exemplo, e
+    devolve os ids; sem horario a linha fica com o de agora."""
+    agora = datetime.now(timezone.utc)
+    dados = [{"horario": agora, **linha} for linha in dados]
+    ids = await em_massa.inserir(session, RegistroAtividade, dados)
+    await _fechar_lote(session, ids, _afetados(dados))
+    return ids
+
+
+async def upsert_registros(session: AsyncSession, dados: list[dict]):
+    # Linhas com id corrigem o registro, sem id criam um novo
+    agora = datetime.now(timezone.utc)
+    dados = [
+        linha if "id" in linha else {"horario": agora, **linha}
+        for linha in dados
+    ]
+    antes = await _afetados_por_id(
+        session, [linha["id"] for linha in dados if "id" in linha]
+    )
+    ids = await em_massa.upsert(session, RegistroAtividade, dados)
+    await _fechar_lote(session, ids, [*antes, *_afetados(dados)])
+    return ids
 
-    if latest and latest.tipo == "ENTRADA":
-        return True
 
-    return False
+async def delete_registros(session: AsyncSession, registro_ids):
+    afetados = await _afetados_por_id(session, registro_ids)
+    for modelo in (Ocupacao, EstadiaAberta):
+        await session.execute(
+            delete(modelo).where(modelo.registro_id.in_(set(registro_ids)))
+        )
+    apagados = await em_massa.apagar(session, RegistroAtividade, registro_ids)
+    await _fechar_lote(session, list(registro_ids), afetados)
+    return apagados
@@ -0,0 +1,167 @@
+"""Snapshots periódicos da ocupação das vagas.
+
+Cada snapshot guarda as vagas ocupadas depois de todos os registros até
+um id. Para saber a ocupação de agora ou de um horário passado basta
+partir do snapshot mais próximo e aplicar só os registros depois dele,
+em vez de percorrer o histórico inteiro.
+"""
+
+from sqlalchemy import delete, func, insert, literal, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from tropicalcode.models import (
+    Ocupacao,
+    Snapshot,
+    SnapshotOcupacao,
+    registro_historico,
+)
+from tropicalcode.repositorios.transacao import confirmar
+from tropicalcode.settings import Settings
+
+# id de registro a partir do qual o próximo snapshot é tirado; None até
+# a primeira consulta ao banco
+_proximo = None
+
+
+async def _mais_recente(session: AsyncSession, horario=None):
+    busca = select(Snapshot).order_by(Snapshot.ultimo_registro_id.desc())
+    if horario is not None:
+        busca = busca.where(Snapshot.horario <= horario)
+    return await session.scalar(busca.limit(1))
+
+
+async def _apagar(session: AsyncSession, snapshot_ids):
+    await session.execute(
+        delete(SnapshotOcupacao).where(
+            SnapshotOcupacao.snapshot_id.in_(snapshot_ids)
+        )
+    )
+    await session.execute(
+        delete(Snapshot).where(Snapshot.id.in_(snapshot_ids))
+    )
+
+
+async def tirar_snapshot(session: AsyncSession):
+    """Copia a ocupação atual num snapshot novo e o devolve.
+
+    Sem registros novos desde o último snapshot devolve o último.
+    """
+    global _proximo
+    settings = Settings()
+    anterior = await _mais_recente(session)
+    desde = anterior.ultimo_registro_id if anterior else 0
+
+    # O horário do snapshot é o maior dos registros que ele cobre; os de
+    # antes já estão no horário do anterior
+    registro = registro_historico.c
+    horario = func.max(registro.horario)
+    if anterior is not None:
+        horario = func.max(horario, anterior.horario)
+    novos = select(func.max(registro.id), horario).where(registro.id > desde)
+    if (await session.execute(novos)).first()[0] is None:
+        return anterior
+
+    # O insert abre a transação de escrita antes de ler ocupacoes, então
+    # nenhum registro entra entre o id lido e a cópia
+    result = await session.execute(
+        insert(Snapshot)
+        .from_select(["ultimo_registro_id", "horario"], novos)
+        .returning(Snapshot.id)
+    )
+    snapshot_id = result.scalar_one()
+    await session.execute(
+        insert(SnapshotOcupacao).from_select(
+            ["snapshot_id", "estacionamento_id", "usuario_id", "registro_id"],
+            select(
+                literal(snapshot_id),
+                Ocupacao.estacionamento_id,
+                Ocupacao.usuario_id,
+                Ocupacao.registro_id,
+            ),
+        )
+    )
+
+    result = await session.execute(
+        select(Snapshot.id)
+        .order_by(Snapshot.ultimo_registro_id.desc())
+        .offset(settings.SNAPSHOT_MANTER)
+    )
+    antigos = result.scalars().all()
+    if antigos:
+        await _apagar(session, antigos)
+    await confirmar(session)
+
+    snapshot = await session.get(Snapshot, snapshot_id)
+    _proximo = snapshot.ultimo_registro_id + settings.SNAPSHOT_INTERVALO
+    return snapshot
+
+
+async def snapshot_se_preciso(session: AsyncSession, registro_id: int):
+    # Chamado depois do commit de registros novos
+    global _proximo
+    if _proximo is None:
+        anterior = await _mais_recente(session)
+        desde = anterior.ultimo_registro_id if anterior else 0
+        _proximo = desde + Settings().SNAPSHOT_INTERVALO
+    if registro_id >= _proximo:
+        await tirar_snapshot(session)
+
+
+async def invalidar_snapshots(session: AsyncSession, registro_id, horario):
+    """Apaga os snapshots que uma edição do histórico deixou errados.
+
+    São os que já incluem o registro editado e os tirados depois do
+    horário dele, onde aplicar o registro por cima daria a ordem errada.
+    """
+    global _proximo
+    result = await session.execute(
+        select(Snapshot.id).where(
+            or_(
+                Snapshot.ultimo_registro_id >= registro_id,
+                Snapshot.horario > horario,
+            )
+        )
+    )
+    await _apagar(session, result.scalars().all())
+    await confirmar(session)
+    _proximo = None
+
+
+async def ocupacoes_em(session: AsyncSession, horario=None):
+    """Vagas ocupadas -> (usuario_id, registro_id) agora ou no horário dado.
+
+    Parte do snapshot mais recente até o horário e aplica, na ordem, só
+    os registros depois dele, arquivados inclusive.
+    """
+    ocupadas, desde = {}, 0
+    snapshot = await _mais_recente(session, horario)
+    if snapshot is not None:
+        desde = snapshot.ultimo_registro_id
+        result = await session.execute(
+            select(
+                SnapshotOcupacao.estacionamento_id,
+                SnapshotOcupacao.usuario_id,
+                SnapshotOcupacao.registro_id,
+            ).where(SnapshotOcupacao.snapshot_id == snapshot.id)
+        )
+        ocupadas = {vaga: (usuario, id_) for vaga, usuario, id_ in result}
+
+    registro = registro_historico.c
+    eventos = (
+        select(
+            registro.id,
+            registro.estacionamento_id,
+            registro.usuario_id,
+            registro.tipo,
+        )
+        .where(registro.id > desde)
+        .order_by(registro.horario, registro.id)
+    )
+    if horario is not None:
+        eventos = eventos.where(registro.horario <= horario)
+    for id_, vaga, usuario, tipo in await session.execute(eventos):
+        if tipo == "ENTRADA":
+            ocupadas[vaga] = (usuario, id_)
+        else:
+            ocupadas.pop(vaga, None)
+    return ocupadas
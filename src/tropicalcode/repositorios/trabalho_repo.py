@@ -1,46 +1,109 @@
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from tropicalcode.models import LocalTrabalho
+from tropicalcode.models import LocalTrabalho, Usuario
+from tropicalcode.repositorios import em_massa, referencia, versoes
+from tropicalcode.repositorios.transacao import (
+    confirmar,
+    depois_do_commit,
+)
+from tropicalcode.roteamento.cache import invalidar_grafo, mapa_alterado
 
 
 async def create_local_trabalho(session: AsyncSession, data: dict):
     local = LocalTrabalho(**data)
     session.add(local)
-    await session.commit()
+    await mapa_alterado(session)
+    await confirmar(session)
+    await referencia.invalidar(session, referencia.locais)
     await session.refresh(local)
+    await depois_do_commit(session, invalidar_grafo)
     return local
 
 
-async def get_local_trabalho(session: AsyncSession, local_id: int):
+async def _ler_local_trabalho(session: AsyncSession, local_id: int):
     result = await session.execute(
         select(LocalTrabalho).where(LocalTrabalho.id == local_id)
     )
     return result.scalar_one_or_none()
 
 
-async def get_locais_trabalho(session: AsyncSession):
+async def _ler_locais_trabalho(session: AsyncSession):
     result = await session.execute(select(LocalTrabalho))
     return result.scalars().all()
 
 
+async def get_local_trabalho(session: AsyncSession, local_id: int):
+    return await referencia.locais.ler(
+        session, local_id, _ler_local_trabalho, local_id
+    )
+
+
+async def get_locais_trabalho(session: AsyncSession):
+    return await referencia.locais.ler(session, "todos", _ler_locais_trabalho)
+
+
 async def update_local_trabalho(
     session: AsyncSession, local_id: int, data: dict
 ):
-    local = await get_local_trabalho(session, local_id)
+    local = await _ler_local_trabalho(session, local_id)
     if not local:
         return None
     for k, v in data.items():
         setattr(local, k, v)
-    await session.commit()
+    await mapa_alterado(session)
+    await confirmar(session)
+    await referencia.invalidar(session, referencia.locais)
     await session.refresh(local)
+    await depois_do_commit(session, invalidar_grafo)
     return local
 
 
+async def _soltar_usuarios(session: AsyncSession, local_ids):
+    # Quem trabalhava no local apagado fica sem local de trabalho
+    await em_massa.soltar(session, Usuario.local_trabalho, local_ids)
+    await versoes.subir(session, versoes.USUARIOS)
+
+
 async def delete_local_trabalho(session: AsyncSession, local_id: int):
-    local = await get_local_trabalho(session, local_id)
+    local = await _ler_local_trabalho(session, local_id)
     if not local:
         return False
+    await _soltar_usuarios(session, [local.id])
     await session.delete(local)
-    await session.commit()
+    await mapa_alterado(session)
+    await confirmar(session)
+    await referencia.invalidar(session, referencia.locais)
+    await referencia.invalidar(session, referencia.usuarios)
+    await depois_do_commit(session, invalidar_grafo)
     return True
+
+
+async def create_locais_trabalho(session: AsyncSession, dados: list[dict]):
+    ids = await em_massa.inserir(session, LocalTrabalho, dados)
+    await mapa_alterado(session)
+    await confirmar(session)
+    await referencia.invalidar(session, referencia.locais)
+    await depois_do_commit(session, invalidar_grafo)
+    return ids
+
+
+async def upsert_locais_trabalho(session: AsyncSession, dados: list[dict]):
+    # Local já cadastrado com o mesmo nome é atualizado
+    ids = await em_massa.upsert(session, LocalTrabalho, dados, chave=("nome",))
+    await mapa_alterado(session)
+    await confirmar(session)
+    await referencia.invalidar(session, referencia.locais)
+    await depois_do_commit(session, invalidar_grafo)
+    return ids
+
+
+async def delete_locais_trabalho(session: AsyncSession, local_ids):
+    await _soltar_usuarios(session, local_ids)
+    apagados = await em_massa.apagar(session, LocalTrabalho, local_ids)
+    await mapa_alterado(session)
+    await confirmar(session)
+    await referencia.invalidar(session, referencia.locais)
+    await referencia.invalidar(session, referencia.usuarios)
+    await depois_do_commit(session, invalidar_grafo)
+    return apagados
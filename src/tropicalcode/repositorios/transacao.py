@@ -0,0 +1,72 @@
+"""Unidade de trabalho: várias chamadas aos repositórios, um commit só.
+
+Fora de uma unidade cada função de escrita dos repositórios faz o próprio
+commit, como sempre. Dentro dela as funções só fazem flush, e o que elas
+fariam depois do commit (avisar o alocador, editar o grafo, tirar um
+snapshot) fica para depois do commit do fim da unidade.
+"""
+
+import inspect
+from contextlib import asynccontextmanager
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Chave em session.info com as ações que esperam o commit da unidade
+_PENDENTES = "transacao_pendentes"
+
+
+@asynccontextmanager
+async def unidade_de_trabalho(session: AsyncSession):
+    # Unidade dentro de unidade é a mesma transação: quem abriu primeiro
+    # faz o commit
+    if _PENDENTES in session.info:
+        yield session
+        return
+
+    pendentes = session.info[_PENDENTES] = []
+    try:
+        yield session
+        await session.commit()
+    except BaseException:
+        await session.rollback()
+        del session.info[_PENDENTES]
+        for funcao, args, sempre in pendentes:
+            if sempre:
+                await _rodar(funcao, *args)
+        raise
+    del session.info[_PENDENTES]
+
+    for funcao, args, _ in pendentes:
+        await _rodar(funcao, *args)
+
+
+async def _rodar(funcao, *args):
+    resultado = funcao(*args)
+    if inspect.isawaitable(resultado):
+        await resultado
+
+
+async def confirmar(session: AsyncSession):
+    # Commit, ou só flush dentro de uma unidade de trabalho
+    if _PENDENTES in session.info:
+        await session.flush()
+    else:
+        await session.commit()
+
+
+async def depois_do_commit(session: AsyncSession, funcao, *args):
+    # Roda agora ou, dentro de uma unidade de trabalho, depois do commit;
+    # num rollback a ação é descartada
+    await _adiar(session, funcao, args, False)
+
+
+async def ao_terminar(session: AsyncSession, funcao, *args):
+    # Idem, mas roda também depois de um rollback
+    await _adiar(session, funcao, args, True)
+
+
+async def _adiar(session: AsyncSession, funcao, args, sempre):
+    if _PENDENTES in session.info:
+        session.info[_PENDENTES].append((funcao, args, sempre))
+    else:
+        await _rodar(funcao, *args)
@@ -1,20 +1,31 @@
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from tropicalcode.models import LocalTrabalho, RegistroAtividade, Usuario
+from tropicalcode.models import EstadiaAberta, LocalTrabalho, Usuario
+from tropicalcode.repositorios import em_massa, referencia, versoes
+from tropicalcode.repositorios.paginacao import paginar, prefixo
+from tropicalcode.repositorios.transacao import confirmar
 
 
-async def get_usuario_por_nome(session: AsyncSession, nome: str):
+async def _ler_usuario_por_nome(session: AsyncSession, nome: str):
     result = await session.execute(
         select(Usuario).where(Usuario.nome_usuario == nome)
     )
     return result.scalar_one_or_none()
 
 
+async def get_usuario_por_nome(session: AsyncSession, nome: str):
+    return await referencia.usuarios.ler(
+        session, nome, _ler_usuario_por_nome, nome
+    )
+
+
 async def create_usuario(session: AsyncSession, data: dict):
     usuario = Usuario(**data)
     session.add(usuario)
-    await session.commit()
+    await versoes.subir(session, versoes.USUARIOS)
+    await confirmar(session)
+    await referencia.invalidar(session, referencia.usuarios)
     await session.refresh(usuario)
     return usuario
 
@@ -26,9 +37,23 @@ async def get_usuario(session: AsyncSession, usuario_id: int):
     return result.scalar_one_or_none()
 
 
-async def get_usuarios(session: AsyncSession):
-    result = await session.execute(select(Usuario))
-    return result.scalars().all()
+async def get_usuarios(
+    session: AsyncSession,
+    depois=None,
+    limite=None,
+    nome=None,
+    local_trabalho=None,
+):
+    # Em ordem de nome, que é único: a busca por prefixo e a página usam o
+    # mesmo índice
+    consulta = select(Usuario)
+    if nome:
+        consulta = consulta.where(prefixo(Usuario.nome_usuario, nome))
+    if local_trabalho is not None:
+        consulta = consulta.where(Usuario.local_trabalho == local_trabalho)
+    return await paginar(
+        session, consulta, (Usuario.nome_usuario,), depois, limite
+    )
 
 
 async def update_usuario(session: AsyncSession, usuario_id: int, data: dict):
@@ -37,7 +62,9 @@ async def update_usuario(session: AsyncSession, usuario_id: int, data: dict):
         return None
     for k, v in data.items():
         setattr(usuario, k, v)
-    await session.commit()
+    await versoes.subir(session, versoes.USUARIOS)
+    await confirmar(session)
+    await referencia.invalidar(session, referencia.usuarios)
     await session.refresh(usuario)
     return usuario
 
@@ -46,24 +73,50 @@ async def delete_usuario(session: AsyncSession, usuario_id: int):
     usuario = await get_usuario(session, usuario_id)
     if not usuario:
         return False
+    # Usuário com automóveis ou histórico fica
+    await em_massa.recusar_em_uso(session, Usuario, [usuario.id])
     await session.delete(usuario)
-    await session.commit()
+    await versoes.subir(session, versoes.USUARIOS)
+    await confirmar(session)
+    await referencia.invalidar(session, referencia.usuarios)
     return True
 
 
+async def create_usuarios(session: AsyncSession, dados: list[dict]):
+    ids = await em_massa.inserir(session, Usuario, dados)
+    await versoes.subir(session, versoes.USUARIOS)
+    await confirmar(session)
+    await referencia.invalidar(session, referencia.usuarios)
+    return ids
+
+
+async def upsert_usuarios(session: AsyncSession, dados: list[dict]):
+    # Usuário já cadastrado com o mesmo nome é atualizado
+    ids = await em_massa.upsert(
+        session, Usuario, dados, chave=("nome_usuario",)
+    )
+    await versoes.subir(session, versoes.USUARIOS)
+    await confirmar(session)
+    await referencia.invalidar(session, referencia.usuarios)
+    return ids
+
+
+async def delete_usuarios(session: AsyncSession, usuario_ids):
+    await em_massa.recusar_em_uso(session, Usuario, usuario_ids)
+    apagados = await em_massa.apagar(session, Usuario, usuario_ids)
+    await versoes.subir(session, versoes.USUARIOS)
+    await confirmar(session)
+    await referencia.invalidar(session, referencia.usuarios)
+    return apagados
+
+
 async def usuario_tem_entrada_ativa(session: AsyncSession, usuario_id: int):
     result = await session.execute(
-        select(RegistroAtividade).where(
-            RegistroAtividade.usuario_id == usuario_id
+        select(EstadiaAberta.usuario_id).where(
+            EstadiaAberta.usuario_id == usuario_id
         )
     )
-    registros = result.scalars().all()
-
-    if not registros:
-        return False
-
-    latest = max(registros, key=lambda r: r.horario)
-    return latest.tipo == "ENTRADA"
+    return result.scalar_one_or_none() is not None
 
 
 async def get_usuario_com_local(session: AsyncSession, usuario_id: int):
@@ -0,0 +1,51 @@
+"""Versões gravadas no banco do que cada processo guarda em memória.
+
+Cada página do Streamlit roda no seu próprio processo, então avisar só o
+processo que escreveu não basta. Quem altera o mapa sobe a versão dele na
+mesma transação da escrita, e os outros processos comparam a versão do
+banco com a do grafo e da tabela que têm em memória antes de usá-los.
+"""
+
+from sqlalchemy import event, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from tropicalcode.models import Versao
+
+MAPA = "mapa"
+# Sobe quando o histórico é editado: ocupacoes muda sem registro novo
+HISTORICO = "historico"
+USUARIOS = "usuarios"
+
+# Chave em session.info com as versões já lidas na transação atual
+_LIDAS = "versoes_lidas"
+
+
+async def ler(session, nome):
+    # Uma leitura por transação: as consultas seguintes da mesma página
+    # reaproveitam o valor
+    lidas = session.info.setdefault(_LIDAS, {})
+    if nome not in lidas:
+        result = await session.execute(
+            select(Versao.valor).where(Versao.nome == nome)
+        )
+        lidas[nome] = result.scalar_one_or_none() or 0
+    return lidas[nome]
+
+
+async def subir(session, nome):
+    """Sobe a versão na transação da sessão e devolve o valor novo."""
+    stmt = sqlite_insert(Versao).values(nome=nome, valor=1)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Versao.nome], set_={"valor": Versao.valor + 1}
+    )
+    result = await session.execute(stmt.returning(Versao.valor))
+    valor = result.scalar_one()
+    session.info.setdefault(_LIDAS, {})[nome] = valor
+    return valor
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _esquecer(session, transaction):
+    if transaction.parent is None:
+        session.info.pop(_LIDAS, None)
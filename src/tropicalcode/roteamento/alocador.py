@@ -0,0 +1,215 @@
+"""Vagas livres em memória para a escolha de vaga não varrer o lote.
+
+Uma fila de prioridade por (portão, local de trabalho, tipo_vaga), tirada
+da tabela de distâncias. Vagas ocupadas saem das filas só quando chegam
+ao topo; vagas liberadas voltam com um push, se já não estiverem lá.
+
+Entradas e saídas gravadas por outros processos (a página de saída roda
+em outro) chegam pela marca d'água: o maior id de registro_atividade já
+visto. No máximo a cada ALOCADOR_SINCRONIA_SEGUNDOS só as vagas dos
+registros depois da marca são relidas de ocupacoes; entre uma conferência
+e outra a escolha não consulta o banco. Uma edição no histórico sobe
+versoes.HISTORICO e força a releitura inteira. Uma vaga que outro
+processo acabou de ocupar e ainda aparece livre aqui perde na chave
+primária de ocupacoes, e a entrada tenta a próxima.
+"""
+
+import heapq
+import threading
+import time
+
+from sqlalchemy import func, select
+
+from tropicalcode.models import Ocupacao, RegistroAtividade
+from tropicalcode.repositorios import versoes
+from tropicalcode.roteamento.tabela import pontuar
+from tropicalcode.settings import Settings
+
+SETTINGS = Settings()
+
+_lock = threading.Lock()
+# ids das vagas ocupadas; None até a primeira carga do banco
+_ocupadas = None
+# (versão do histórico, maior id de registro) de quando _ocupadas foi lida
+_marca = None
+# time.monotonic() da última conferência da marca com o banco
+_conferida = 0.0
+# Tabela de onde as filas saíram, tipo de cada vaga e as filas: chave ->
+# (heap de (pontuação, id da vaga), ids que estão no heap)
+_tabela = None
+_tipos = {}
+_filas = {}
+
+
+async def _ler_marca(session):
+    historico = await versoes.ler(session, versoes.HISTORICO)
+    result = await session.execute(select(func.max(RegistroAtividade.id)))
+    return historico, result.scalar() or 0
+
+
+def _atrasada():
+    decorrido = time.monotonic() - _conferida
+    return decorrido >= SETTINGS.ALOCADOR_SINCRONIA_SEGUNDOS
+
+
+async def reconciliar(session):
+    # O banco manda: na subida do processo, depois de uma queda ou de uma
+    # edição no histórico as vagas ocupadas são relidas de ocupacoes, que
+    # é gravada na mesma transação que registro_atividade.
+    global _ocupadas, _marca, _conferida
+    marca = await _ler_marca(session)
+    result = await session.execute(select(Ocupacao.estacionamento_id))
+    ocupadas = set(result.scalars())
+    with _lock:
+        _ocupadas = ocupadas
+        _marca = marca
+        _conferida = time.monotonic()
+        _filas.clear()
+
+
+async def _acompanhar(session):
+    # Relê só as vagas com registros novos desde a marca; ids de
+    # registro_atividade nunca são reaproveitados (AUTOINCREMENT)
+    global _marca, _conferida
+    marca = await _ler_marca(session)
+    with _lock:
+        anterior = _marca
+    if anterior is None or marca[0] != anterior[0] or marca[1] < anterior[1]:
+        await reconciliar(session)
+        return
+    if marca == anterior:
+        with _lock:
+            _conferida = time.monotonic()
+        return
+
+    result = await session.execute(
+        select(RegistroAtividade.estacionamento_id)
+        .where(RegistroAtividade.id > anterior[1])
+        .distinct()
+    )
+    vagas = set(result.scalars())
+    result = await session.execute(
+        select(Ocupacao.estacionamento_id).where(
+            Ocupacao.estacionamento_id.in_(vagas)
+        )
+    )
+    ocupadas = set(result.scalars())
+    with _lock:
+        if _marca != anterior:
+            return
+        for vaga_id in vagas - ocupadas:
+            _liberar(vaga_id)
+        _ocupadas.update(ocupadas)
+        _marca = marca
+        _conferida = time.monotonic()
+
+
+def avancar(registro_ids):
+    # Depois do commit, com os ids dos registros deste processo já
+    # aplicados às filas: a marca anda enquanto os ids forem seguidos,
+    # para a próxima conferência não reler o que este processo gravou.
+    # Um buraco (registro de outro processo ou apagado) para a marca ali.
+    global _marca
+    with _lock:
+        if _marca is None:
+            return
+        historico, maior = _marca
+        for registro_id in sorted(registro_ids):
+            if registro_id == maior + 1:
+                maior = registro_id
+            elif registro_id > maior:
+                break
+        _marca = historico, maior
+
+
+def invalidar():
+    global _ocupadas, _marca
+    with _lock:
+        _ocupadas = None
+        _marca = None
+        _filas.clear()
+
+
+def _chave(tabela, portao, local, tipo):
+    if (portao, local) not in tabela.por_local:
+        local = None
+    return portao, local, tipo
+
+
+def _pontuacao(chave, vaga_id):
+    portao, local, _ = chave
+    conducao = _tabela.portoes[portao].get(vaga_id)
+    if conducao is None or local is None:
+        return conducao
+    return pontuar(conducao, _tabela.locais[local].get(vaga_id))
+
+
+def _trocar_tabela(tabela):
+    global _tabela, _tipos
+    _tabela = tabela
+    _tipos = {
+        vaga_id: tipo
+        for ordenadas in tabela.ordenadas.values()
+        for tipo, lista in ordenadas.items()
+        for _, vaga_id in lista
+    }
+    _filas.clear()
+
+
+def _fila(chave):
+    if chave not in _filas:
+        portao, local, tipo = chave
+        if local is None:
+            lista = _tabela.ordenadas[portao].get(tipo, [])
+        else:
+            lista = _tabela.por_local[portao, local].get(tipo, [])
+        # Lista em ordem crescente já é um heap
+        fila = [e for e in lista if e[1] not in _ocupadas]
+        _filas[chave] = fila, {vaga_id for _, vaga_id in fila}
+    return _filas[chave]
+
+
+async def melhor_vaga(session, tabela, portao, local, tipo):
+    """id da vaga livre mais bem colocada, ou None; não reserva a vaga."""
+    if _ocupadas is None:
+        await reconciliar(session)
+    elif _atrasada():
+        await _acompanhar(session)
+
+    with _lock:
+        if _tabela is not tabela:
+            _trocar_tabela(tabela)
+        fila, presentes = _fila(_chave(tabela, portao, local, tipo))
+        while fila and fila[0][1] in _ocupadas:
+            presentes.discard(heapq.heappop(fila)[1])
+        return fila[0][1] if fila else None
+
+
+def ocupar(vaga_id):
+    # Chamado depois do commit da entrada
+    with _lock:
+        if _ocupadas is not None:
+            _ocupadas.add(vaga_id)
+
+
+def liberar(vaga_id):
+    # Chamado depois do commit da saída
+    with _lock:
+        if _ocupadas is not None:
+            _liberar(vaga_id)
+
+
+def _liberar(vaga_id):
+    if vaga_id not in _ocupadas:
+        return
+    _ocupadas.discard(vaga_id)
+    tipo = _tipos.get(vaga_id)
+    for chave, (fila, presentes) in _filas.items():
+        # Ocupada fora do topo a vaga nunca saiu do heap: volta a valer
+        # como está, sem uma segunda entrada
+        if chave[2] != tipo or vaga_id in presentes:
+            continue
+        pontuacao = _pontuacao(chave, vaga_id)
+        if pontuacao is not None:
+            heapq.heappush(fila, (pontuacao, vaga_id))
+            presentes.add(vaga_id)
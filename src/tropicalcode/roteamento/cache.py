@@ -0,0 +1,396 @@
+import math
+import threading
+from dataclasses import dataclass, field
+from functools import cached_property
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from tropicalcode.models import (
+    Caminho,
+    Estacionamento,
+    LocalTrabalho,
+    Portao,
+)
+from tropicalcode.repositorios import versoes
+from tropicalcode.roteamento.csr import GrafoCSR, contar_celulas
+from tropicalcode.roteamento.delta import (
+    Expansao,
+    Trecho,
+    com_caminho,
+    com_vaga,
+)
+from tropicalcode.roteamento.grafo import (
+    IndiceEspacial,
+    contrair,
+    dijkstra,
+    dijkstra_distancias,
+    dijkstra_mais_proximos,
+    dijkstra_multiplas_fontes,
+    expandir_caminhos,
+)
+from tropicalcode.settings import Settings
+
+# Entrada usada enquanto nenhum portão estiver cadastrado
+ORIGEM_X = 0
+ORIGEM_Y = 0
+
+_lock = threading.Lock()
+# Versão do mapa no banco (versoes.MAPA) a que o grafo e a tabela em
+# memória correspondem; None antes da primeira leitura e depois de uma
+# invalidação
+_versao = None
+_grafo = None
+_ouvintes = []
+_ouvintes_edicao = []
+_lock_edicao = threading.Lock()
+
+
+@dataclass(frozen=True)
+class GrafoCompilado:
+    versao: int
+    # Grafo dos caminhos, sem vagas nem locais de trabalho, com cada
+    # trecho reto contraído numa aresta com peso: nó -> {vizinho: peso}
+    adjacencia: dict
+    # id -> posição (x, y) de cada vaga e de cada local de trabalho
+    vagas: dict
+    locais: dict
+    # id da vaga -> tipo_vaga
+    tipos_vaga: dict
+    # Ligações pré-calculadas dos nós especiais (vagas + locais):
+    # especial -> nós do caminho, nó do caminho -> especiais e
+    # especial -> outros especiais ao alcance
+    ligacoes: dict
+    proximos: dict
+    especiais_proximos: dict
+    # id do portão -> posição; {None: origem} quando não há portões
+    portoes: dict
+    # Caminhos de onde o grafo saiu, para as edições pontuais
+    caminhos: tuple = ()
+    # Árvores já calculadas, por ("portao", id) ou ("local", id):
+    # distância de cada nó e distância de cada vaga
+    arvores: dict = field(default_factory=dict, compare=False)
+    medidas: dict = field(default_factory=dict, compare=False)
+
+    @cached_property
+    def expansao(self):
+        # Só as edições pontuais precisam do grafo célula a célula
+        return Expansao.de_caminhos(self.caminhos)
+
+    @cached_property
+    def reverso(self):
+        reverso = {node: {} for node in self.adjacencia}
+        for node, arestas in self.adjacencia.items():
+            for neigh, peso in arestas.items():
+                reverso[neigh][node] = peso
+        return reverso
+
+    @cached_property
+    def especiais(self):
+        return set(self.vagas.values()) | set(self.locais.values())
+
+    @cached_property
+    def indice_especiais(self):
+        return IndiceEspacial(self.especiais)
+
+    @cached_property
+    def adjacencia_a_pe(self):
+        # A pé o sentido dos caminhos não importa
+        a_pe = {
+            node: dict(arestas) for node, arestas in self.adjacencia.items()
+        }
+        for node, arestas in self.adjacencia.items():
+            for neigh, peso in arestas.items():
+                if peso < a_pe[neigh].get(node, math.inf):
+                    a_pe[neigh][node] = peso
+        return a_pe
+
+    def vizinhos(self, node, ativos):
+        yield from self.adjacencia.get(node, {}).items()
+        for pos in self.proximos.get(node, ()):
+            if pos in ativos:
+                yield pos, 1
+        if node in ativos:
+            for pos in self.ligacoes[node]:
+                yield pos, 1
+            for pos in self.especiais_proximos[node]:
+                if pos in ativos:
+                    yield pos, 1
+
+    def com_ativos(self, ativos):
+        return _Visao(self, frozenset(ativos))
+
+    def _partida(self, inicio, especial):
+        partida = {}
+        if especial:
+            partida = dict.fromkeys(self.ligacoes[inicio], 1)
+        if inicio in self.adjacencia:
+            partida[inicio] = 0
+        return partida
+
+    def _medir_vaga(self, dist, pos, inicio, especial):
+        # Distância da vaga com apenas ela (e o início, se for um local de
+        # trabalho) ligada ao grafo, a mesma que calcular_distancia obtém
+        # montando o grafo só com essa vaga.
+        if pos == inicio:
+            return 0
+        if especial and pos in self.especiais_proximos[inicio]:
+            return 1
+        candidatas = [dist[n] + 1 for n in self.ligacoes[pos] if n in dist]
+        if pos in dist:
+            candidatas.append(dist[pos])
+        return min(candidatas, default=None)
+
+    def _medir(self, dist, inicio, especial):
+        distancias = {}
+        for vaga_id, pos in self.vagas.items():
+            d = self._medir_vaga(dist, pos, inicio, especial)
+            if d is not None:
+                distancias[vaga_id] = d
+        return distancias
+
+    def _fontes(self, chave):
+        # Grafo, arestas de chegada, partida e início de cada árvore
+        tipo, id_ = chave
+        if tipo == "portao":
+            pos = self.portoes[id_]
+            graph, reverso = self.adjacencia, self.reverso
+        else:
+            pos = self.locais[id_]
+            graph = reverso = self.adjacencia_a_pe
+        especial = tipo == "local"
+        return graph, reverso, self._partida(pos, especial), pos, especial
+
+    def distancias_vagas(self, inicio, especial=False, a_pe=False):
+        graph = self.adjacencia_a_pe if a_pe else self.adjacencia
+        dist = dijkstra_distancias(graph, self._partida(inicio, especial))
+        return self._medir(dist, inicio, especial)
+
+    def distancias_portoes(self):
+        # Todos os portões que faltam numa só busca com rótulos
+        faltando = {
+            ("portao", portao_id): self._partida(pos, False)
+            for portao_id, pos in self.portoes.items()
+            if ("portao", portao_id) not in self.medidas
+        }
+        if faltando:
+            dist = dijkstra_multiplas_fontes(self.adjacencia, faltando)
+            for chave, arvore in dist.items():
+                pos = self.portoes[chave[1]]
+                self.arvores[chave] = arvore
+                self.medidas[chave] = self._medir(arvore, pos, False)
+        return {
+            portao_id: self.medidas["portao", portao_id]
+            for portao_id in self.portoes
+        }
+
+    def distancias_a_pe(self, local_id):
+        # Uma árvore por local de trabalho, guardada junto com a versão
+        chave = ("local", local_id)
+        if chave not in self.medidas:
+            graph, _, partida, pos, _ = self._fontes(chave)
+            arvore = dijkstra_distancias(graph, partida)
+            self.arvores[chave] = arvore
+            self.medidas[chave] = self._medir(arvore, pos, True)
+        return self.medidas[chave]
+
+    def distancia(self, origem, destino):
+        graph = self.com_ativos([destino])
+        if origem not in graph or destino not in graph:
+            return float("inf")
+        return dijkstra(graph, origem, destino)
+
+    def mais_proximos(self, origem, destinos, ativos):
+        graph = self.com_ativos(ativos)
+        if origem not in graph:
+            return set()
+        return dijkstra_mais_proximos(graph, origem, destinos)[1]
+
+
+class _Visao:
+    """Grafo como o build_graph o montaria só com os especiais ativos."""
+
+    def __init__(self, grafo, ativos):
+        self.grafo = grafo
+        self.ativos = ativos
+
+    def __contains__(self, node):
+        return node in self.grafo.adjacencia or node in self.ativos
+
+    def get(self, node, default=None):
+        arestas = {}
+        for neigh, peso in self.grafo.vizinhos(node, self.ativos):
+            if peso < arestas.get(neigh, float("inf")):
+                arestas[neigh] = peso
+        return arestas
+
+
+def escolher_portao(portoes, portao_id):
+    # Sem portão na URL: o primeiro cadastrado. Um id desconhecido levanta
+    # KeyError em vez de medir a partir de outro portão; quem recebe o id
+    # de fora confere antes com portao_repo.get_portao
+    if portao_id is None:
+        return next(iter(portoes))
+    if portao_id not in portoes:
+        raise KeyError(portao_id)
+    return portao_id
+
+
+def versao_mapa():
+    return _versao
+
+
+def ao_invalidar(funcao):
+    _ouvintes.append(funcao)
+    return funcao
+
+
+def ao_editar(funcao):
+    _ouvintes_edicao.append(funcao)
+    return funcao
+
+
+def invalidar_grafo():
+    global _versao, _grafo
+    with _lock:
+        _versao = None
+        _grafo = None
+    for funcao in _ouvintes:
+        funcao()
+
+
+async def mapa_alterado(session: AsyncSession):
+    # Na transação de toda escrita em caminhos, vagas, locais e portões
+    return await versoes.subir(session, versoes.MAPA)
+
+
+async def sincronizar(session: AsyncSession):
+    """Versão do mapa no banco; se outro processo mudou o mapa, descarta o
+    grafo e avisa quem guarda algo derivado dele."""
+    global _versao, _grafo
+    versao = await versoes.ler(session, versoes.MAPA)
+    with _lock:
+        anterior = _versao
+        _versao = versao
+        if _grafo is not None and _grafo.versao != versao:
+            _grafo = None
+    if anterior is not None and anterior != versao:
+        for funcao in _ouvintes:
+            funcao()
+    return versao
+
+
+def _editar(versao, aplicar):
+    # Aplica a edição na cópia publicada do grafo em vez de descartá-la.
+    # versao é a que a escrita gravou no banco: só o grafo da versão logo
+    # anterior recebe a edição. Se outro processo mexeu no mapa no meio,
+    # ou sem grafo em memória ou em CSR, cai na invalidação de sempre.
+    global _versao, _grafo
+    with _lock_edicao:
+        with _lock:
+            grafo = _grafo
+        editado = None
+        if isinstance(grafo, GrafoCompilado) and grafo.versao == versao - 1:
+            editado = aplicar(grafo, versao)
+        if editado is None:
+            invalidar_grafo()
+            return
+        novo, mudadas = editado
+
+        with _lock:
+            publicado = _grafo is grafo
+            if publicado:
+                _versao, _grafo = versao, novo
+        if not publicado:
+            invalidar_grafo()
+            return
+        for funcao in _ouvintes_edicao:
+            funcao(grafo, novo, mudadas)
+
+
+def vaga_no_mapa(vaga):
+    return (vaga.posicao_x, vaga.posicao_y), vaga.tipo_vaga
+
+
+def atualizar_caminho(versao, antigo, novo):
+    _editar(versao, lambda grafo, v: com_caminho(grafo, v, antigo, novo))
+
+
+def atualizar_vaga(versao, vaga_id, antes, depois):
+    _editar(
+        versao, lambda grafo, v: com_vaga(grafo, v, vaga_id, antes, depois)
+    )
+
+
+async def compilar_grafo(session: AsyncSession, versao: int):
+    result = await session.execute(select(Caminho))
+    caminhos = result.scalars().all()
+
+    result = await session.execute(select(Estacionamento))
+    estacionamentos = result.scalars().all()
+    vagas = {v.id: (v.posicao_x, v.posicao_y) for v in estacionamentos}
+    tipos_vaga = {v.id: v.tipo_vaga for v in estacionamentos}
+    result = await session.execute(select(LocalTrabalho))
+    locais = {lt.id: (lt.posicao_x, lt.posicao_y) for lt in result.scalars()}
+    result = await session.execute(select(Portao).order_by(Portao.id))
+    portoes = {p.id: (p.posicao_x, p.posicao_y) for p in result.scalars()}
+    if not portoes:
+        portoes = {None: (ORIGEM_X, ORIGEM_Y)}
+
+    return montar_grafo(versao, caminhos, vagas, locais, tipos_vaga, portoes)
+
+
+def montar_grafo(versao, caminhos, vagas, locais, tipos_vaga, portoes):
+    # Mapas grandes ficam em arrays em vez de um dicionário por célula
+    if contar_celulas(caminhos) > Settings().GRAFO_CSR_CELULAS:
+        return GrafoCSR.de_caminhos(
+            versao, caminhos, vagas, locais, tipos_vaga, portoes
+        )
+
+    expandido = expandir_caminhos(caminhos)
+    especiais = set(vagas.values()) | set(locais.values())
+    indice = IndiceEspacial(expandido)
+    ligacoes = {}
+    proximos = {}
+    for pos in especiais:
+        ligacoes[pos] = indice.proximos(pos)
+        for node in ligacoes[pos]:
+            proximos.setdefault(node, []).append(pos)
+    indice = IndiceEspacial(especiais)
+    especiais_proximos = {pos: indice.proximos(pos) for pos in especiais}
+
+    # Só os pontos onde as buscas começam ou terminam precisam sobreviver
+    # à contração; o resto dos trechos vira peso nas arestas.
+    fixos = set(proximos) | (especiais & expandido.keys())
+    fixos.update(portoes.values())
+    adjacencia = contrair(expandido, fixos)
+
+    return GrafoCompilado(
+        versao,
+        adjacencia,
+        vagas,
+        locais,
+        tipos_vaga,
+        ligacoes,
+        proximos,
+        especiais_proximos,
+        portoes,
+        tuple(map(Trecho.de, caminhos)),
+    )
+
+
+async def get_grafo(session: AsyncSession):
+    global _grafo
+    versao = await sincronizar(session)
+    with _lock:
+        grafo = _grafo
+    if grafo is not None and grafo.versao == versao:
+        return grafo
+
+    grafo = await compilar_grafo(session, versao)
+
+    # Só publica se o mapa não mudou enquanto o grafo era montado
+    with _lock:
+        if _versao == versao:
+            _grafo = grafo
+    return grafo
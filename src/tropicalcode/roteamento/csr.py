@@ -0,0 +1,310 @@
+from functools import cached_property
+
+import numpy as np
+
+from tropicalcode.roteamento.grafo import IndiceEspacial, vizinhanca
+
+
+def contar_celulas(caminhos):
+    return sum(
+        abs(c.destino_x - c.origem_x) + abs(c.destino_y - c.origem_y) + 1
+        for c in caminhos
+    )
+
+
+def _trechos(caminhos):
+    # Como em expandir_caminhos: anda primeiro em x e depois em y, então
+    # cada caminho vira no máximo dois trechos retos.
+    trechos = []
+    for c in caminhos:
+        ida = c.direcao in ("IDA", "AMBOS")
+        volta = c.direcao in ("VOLTA", "AMBOS")
+        if c.origem_x != c.destino_x:
+            trechos.append((
+                c.origem_x,
+                c.origem_y,
+                1 if c.destino_x > c.origem_x else -1,
+                0,
+                abs(c.destino_x - c.origem_x),
+                ida,
+                volta,
+            ))
+        if c.origem_y != c.destino_y:
+            trechos.append((
+                c.destino_x,
+                c.origem_y,
+                0,
+                1 if c.destino_y > c.origem_y else -1,
+                abs(c.destino_y - c.origem_y),
+                ida,
+                volta,
+            ))
+    if not trechos:
+        return np.zeros((7, 0), dtype=np.int64)
+    return np.array(trechos, dtype=np.int64).T
+
+
+def _unicos(valores):
+    # np.unique por ordenação: bem mais rápido que o caminho por hash
+    # para os vetores de inteiros grandes daqui
+    valores = np.sort(valores)
+    if valores.size:
+        valores = valores[
+            np.concatenate(([True], valores[1:] != valores[:-1]))
+        ]
+    return valores
+
+
+def _montar_csr(origens, destinos, n):
+    arestas = _unicos(origens * n + destinos)
+    origens, destinos = np.divmod(arestas, n)
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(origens, minlength=n), out=indptr[1:])
+    return indptr, destinos.astype(np.int32)
+
+
+class GrafoCSR:
+    """Grafo dos caminhos em CSR (indptr/indices), um id inteiro por célula.
+
+    Usado no lugar do GrafoCompilado em mapas grandes: não guarda nenhum
+    objeto Python por célula e as buscas andam por camadas inteiras com
+    operações em arrays.
+    """
+
+    def __init__(
+        self, versao, chaves, indptr, indices, vagas, locais, tipos, portoes
+    ):
+        self.versao = versao
+        self.chaves = chaves
+        self.indptr = indptr
+        self.indices = indices
+        self.vagas = vagas
+        self.locais = locais
+        self.tipos_vaga = tipos
+        self.portoes = portoes
+        self.arvores_a_pe = {}
+        self._ligar_especiais()
+
+    @classmethod
+    def de_caminhos(cls, versao, caminhos, vagas, locais, tipos, portoes):
+        ox, oy, sx, sy, tam, ida, volta = _trechos(caminhos)
+
+        # Uma aresta por passo de cada trecho: célula k -> célula k + 1
+        trecho = np.repeat(np.arange(tam.size), tam)
+        passo = np.arange(trecho.size) - np.repeat(np.cumsum(tam) - tam, tam)
+        ax = ox[trecho] + sx[trecho] * passo
+        ay = oy[trecho] + sy[trecho] * passo
+        bx = ax + sx[trecho]
+        by = ay + sy[trecho]
+
+        pontas = np.array(
+            [(c.origem_x, c.origem_y) for c in caminhos]
+            + [(c.destino_x, c.destino_y) for c in caminhos],
+            dtype=np.int64,
+        ).reshape(-1, 2)
+        xs = np.concatenate([ax, bx, pontas[:, 0]])
+        ys = np.concatenate([ay, by, pontas[:, 1]])
+        chaves = _unicos(cls._codificar(xs, ys))
+
+        a = np.searchsorted(chaves, cls._codificar(ax, ay))
+        b = np.searchsorted(chaves, cls._codificar(bx, by))
+        ida = ida[trecho].astype(bool)
+        volta = volta[trecho].astype(bool)
+        origens = np.concatenate([a[ida], b[volta]])
+        destinos = np.concatenate([b[ida], a[volta]])
+
+        indptr, indices = _montar_csr(origens, destinos, chaves.size)
+        return cls(
+            versao, chaves, indptr, indices, vagas, locais, tipos, portoes
+        )
+
+    @cached_property
+    def csr_a_pe(self):
+        # A pé o sentido dos caminhos não importa: cada aresta nos dois
+        n = self.chaves.size
+        origens = np.repeat(np.arange(n), np.diff(self.indptr))
+        destinos = self.indices.astype(np.int64)
+        return _montar_csr(
+            np.concatenate([origens, destinos]),
+            np.concatenate([destinos, origens]),
+            n,
+        )
+
+    @staticmethod
+    def _codificar(xs, ys):
+        # (x, y) -> um int64; coordenadas do mapa cabem folgadas em 32 bits
+        return (np.asarray(xs, dtype=np.int64) << 32) + (
+            np.asarray(ys, dtype=np.int64) + (1 << 31)
+        )
+
+    def _nos(self, xs, ys):
+        # Id de cada célula (x, y) ou -1 quando ela não está em nenhum caminho
+        chaves = self._codificar(xs, ys)
+        if not self.chaves.size:
+            return np.full(chaves.shape, -1, dtype=np.int64)
+        ids = np.searchsorted(self.chaves, chaves)
+        ids = np.minimum(ids, self.chaves.size - 1)
+        return np.where(self.chaves[ids] == chaves, ids, -1)
+
+    def _ligar_especiais(self):
+        # Células do caminho na mesma linha ou coluna a até 1.5 de cada
+        # vaga ou local, a mesma regra de conectar_nos, olhando só as
+        # posições inteiras possíveis.
+        self.especiais = list(
+            dict.fromkeys([*self.vagas.values(), *self.locais.values()])
+        )
+        self.ordem = {pos: i for i, pos in enumerate(self.especiais)}
+        donos, xs, ys = [], [], []
+        proprias = []
+        for i, (x, y) in enumerate(self.especiais):
+            inteira = float(x).is_integer() and float(y).is_integer()
+            proprias.append((x, y) if inteira else (0, 0))
+            for cx, cy in vizinhanca((x, y)):
+                donos.append(i)
+                xs.append(cx)
+                ys.append(cy)
+
+        nos = self._nos(np.array(xs, dtype=np.int64), np.array(ys, np.int64))
+        validos = nos >= 0
+        self.ligacoes_dono = np.array(donos, dtype=np.int64)[validos]
+        self.ligacoes_no = nos[validos]
+
+        proprias = np.array(proprias, dtype=np.int64).reshape(-1, 2)
+        self.no_especial = self._nos(proprias[:, 0], proprias[:, 1])
+        inteiras = [
+            float(x).is_integer() and float(y).is_integer()
+            for x, y in self.especiais
+        ]
+        self.no_especial[~np.array(inteiras, dtype=bool)] = -1
+
+        indice = IndiceEspacial(self.especiais)
+        self.especiais_proximos = {
+            pos: set(indice.proximos(pos)) for pos in self.especiais
+        }
+
+    def no(self, pos):
+        if pos in self.ordem:
+            return int(self.no_especial[self.ordem[pos]])
+        x, y = pos
+        if not (float(x).is_integer() and float(y).is_integer()):
+            return -1
+        return int(self._nos(np.array([int(x)]), np.array([int(y)]))[0])
+
+    def _busca_em_largura(self, inicio, inicio_um, a_pe=False, rotulos=1):
+        # Camada a camada: junta as listas de vizinhos da fronteira inteira
+        # com fatias do CSR e descarta os já visitados. Com vários rótulos
+        # cada célula existe uma vez por rótulo (rótulo * n + célula) e
+        # todas as buscas andam juntas na mesma fronteira.
+        indptr, indices = (
+            self.csr_a_pe if a_pe else (self.indptr, self.indices)
+        )
+        n = self.chaves.size
+        dist = np.full(rotulos * n, -1, dtype=np.int32)
+        fronteira = _unicos(np.asarray(inicio, dtype=np.int64))
+        dist[fronteira] = 0
+        nivel = 0
+        while fronteira.size or nivel == 0:
+            rotulo, celula = np.divmod(fronteira, max(n, 1))
+            primeiros = indptr[celula]
+            quantos = indptr[celula + 1] - primeiros
+            saltos = np.repeat(
+                primeiros - np.cumsum(quantos) + quantos, quantos
+            )
+            vizinhos = indices[saltos + np.arange(quantos.sum())]
+            vizinhos = vizinhos + np.repeat(rotulo * n, quantos)
+            nivel += 1
+            if nivel == 1:
+                vizinhos = np.concatenate([vizinhos, inicio_um])
+            vizinhos = _unicos(vizinhos)
+            fronteira = vizinhos[dist[vizinhos] < 0]
+            dist[fronteira] = nivel
+        return dist
+
+    def _distancias(self, inicio, especial, posicoes, a_pe=False):
+        no_inicio = self.no(inicio)
+        inicio_um = np.zeros(0, dtype=np.int64)
+        if especial:
+            inicio_um = self.ligacoes_no[
+                self.ligacoes_dono == self.ordem[inicio]
+            ]
+        dist = self._busca_em_largura(
+            [no_inicio] if no_inicio >= 0 else [], inicio_um, a_pe
+        )
+        return self._medir(dist, inicio, especial, posicoes)
+
+    def _medir(self, dist, inicio, especial, posicoes):
+        # Melhor distância de cada vaga/local: uma célula ligada + 1, ou a
+        # própria célula quando o especial fica em cima do caminho.
+        inf = np.iinfo(np.int64).max
+        melhor = np.full(len(self.especiais), inf, dtype=np.int64)
+        pela_ligacao = dist[self.ligacoes_no]
+        alcancadas = pela_ligacao >= 0
+        np.minimum.at(
+            melhor,
+            self.ligacoes_dono[alcancadas],
+            pela_ligacao[alcancadas].astype(np.int64) + 1,
+        )
+        sobre = np.flatnonzero(self.no_especial >= 0)
+        na_celula = dist[self.no_especial[sobre]]
+        sobre, na_celula = sobre[na_celula >= 0], na_celula[na_celula >= 0]
+        melhor[sobre] = np.minimum(melhor[sobre], na_celula)
+
+        diretos = self.especiais_proximos[inicio] if especial else ()
+        distancias = {}
+        for pos in posicoes:
+            if pos == inicio:
+                distancias[pos] = 0
+            elif pos in diretos:
+                distancias[pos] = 1
+            elif pos in self.ordem and melhor[self.ordem[pos]] != inf:
+                distancias[pos] = int(melhor[self.ordem[pos]])
+        return distancias
+
+    def _por_vaga(self, distancias):
+        return {
+            vaga_id: distancias[pos]
+            for vaga_id, pos in self.vagas.items()
+            if pos in distancias
+        }
+
+    def distancias_vagas(self, inicio, especial=False, a_pe=False):
+        return self._por_vaga(
+            self._distancias(inicio, especial, set(self.vagas.values()), a_pe)
+        )
+
+    def distancias_portoes(self):
+        # Todos os portões numa só busca em largura com rótulos
+        n = self.chaves.size
+        nos = [self.no(pos) for pos in self.portoes.values()]
+        inicio = [i * n + no for i, no in enumerate(nos) if no >= 0]
+        dist = self._busca_em_largura(
+            inicio, np.zeros(0, dtype=np.int64), rotulos=len(nos)
+        )
+        posicoes = set(self.vagas.values())
+        return {
+            portao_id: self._por_vaga(
+                self._medir(dist[i * n : (i + 1) * n], pos, False, posicoes)
+            )
+            for i, (portao_id, pos) in enumerate(self.portoes.items())
+        }
+
+    def distancias_a_pe(self, local_id):
+        # Uma árvore por local de trabalho, guardada junto com a versão
+        if local_id not in self.arvores_a_pe:
+            self.arvores_a_pe[local_id] = self.distancias_vagas(
+                self.locais[local_id], especial=True, a_pe=True
+            )
+        return self.arvores_a_pe[local_id]
+
+    def distancia(self, origem, destino):
+        return self._distancias(origem, False, [destino]).get(
+            destino, float("inf")
+        )
+
+    def mais_proximos(self, origem, destinos, ativos):
+        # Vagas como destino, nunca como passagem: mesma regra da tabela
+        distancias = self._distancias(origem, False, destinos)
+        if not distancias:
+            return set()
+        menor = min(distancias.values())
+        return {pos for pos, d in distancias.items() if d == menor}
@@ -0,0 +1,368 @@
+"""Edições pontuais no grafo compilado sem recompilar o mapa inteiro.
+
+Cada edição gera uma cópia nova do GrafoCompilado: só os nós tocados
+ganham dicionários novos, o resto é compartilhado com a versão anterior,
+que continua válida para quem ainda a estiver usando.
+"""
+
+import math
+from collections import Counter
+from dataclasses import dataclass, replace
+from typing import NamedTuple
+
+from tropicalcode.roteamento.grafo import (
+    IndiceEspacial,
+    arestas_contraidas,
+    expandir_caminhos,
+    interno,
+    passos,
+    percorrer,
+    reparar_distancias,
+    vizinhanca,
+)
+
+
+class Trecho(NamedTuple):
+    # Cópia imutável de um Caminho, guardada no grafo compilado
+    origem_x: int
+    origem_y: int
+    destino_x: int
+    destino_y: int
+    direcao: str
+
+    @classmethod
+    def de(cls, c):
+        return cls(c.origem_x, c.origem_y, c.destino_x, c.destino_y, c.direcao)
+
+
+@dataclass(frozen=True)
+class Expansao:
+    # Grafo célula a célula: nó -> [saídas] e nó -> {chegadas}
+    saidas: dict
+    entradas: dict
+    # Quantos caminhos passam por cada célula e liberam cada aresta, para
+    # que tirar um caminho não apague o que outro ainda cobre
+    cobertura: dict
+    contagem: dict
+
+    @classmethod
+    def de_caminhos(cls, caminhos):
+        saidas = expandir_caminhos(caminhos)
+        entradas = {}
+        for node, vizinhos in saidas.items():
+            for neigh in vizinhos:
+                entradas.setdefault(neigh, set()).add(node)
+        cobertura = Counter()
+        contagem = Counter()
+        for c in caminhos:
+            cobertura.update(set(percorrer(c)))
+            contagem.update(set(passos(c)))
+        return cls(saidas, entradas, dict(cobertura), dict(contagem))
+
+    def com_caminhos(self, removidos, adicionados):
+        saidas = dict(self.saidas)
+        entradas = dict(self.entradas)
+        cobertura = dict(self.cobertura)
+        contagem = dict(self.contagem)
+
+        tocadas = set()
+        for caminhos, sinal in ((removidos, -1), (adicionados, 1)):
+            for c in caminhos:
+                for celula in percorrer(c):
+                    _somar(cobertura, celula, sinal)
+                    tocadas.add(celula)
+                for aresta in set(passos(c)):
+                    _somar(contagem, aresta, sinal)
+
+        for celula in tocadas:
+            if celula not in cobertura:
+                saidas.pop(celula, None)
+                entradas.pop(celula, None)
+                continue
+            x, y = celula
+            grade = [(x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)]
+            saidas[celula] = [n for n in grade if (celula, n) in contagem]
+            entradas[celula] = {n for n in grade if (n, celula) in contagem}
+
+        return Expansao(saidas, entradas, cobertura, contagem), tocadas
+
+
+def _somar(contador, chave, sinal):
+    total = contador.get(chave, 0) + sinal
+    if total:
+        contador[chave] = total
+    else:
+        contador.pop(chave, None)
+
+
+class _Internos:
+    """Nós internos de uma expansão, decididos na hora como em contrair."""
+
+    def __init__(self, expansao, fixo):
+        self.expansao = expansao
+        self.fixo = fixo
+
+    def __contains__(self, node):
+        saidas = self.expansao.saidas.get(node)
+        if saidas is None or self.fixo(node):
+            return False
+        return interno(set(saidas), self.expansao.entradas.get(node, set()))
+
+    def __getitem__(self, node):
+        return set(self.expansao.saidas[node])
+
+
+def _fixo(proximos, especiais, expansao, portoes):
+    # Mesma regra dos fixos de compilar_grafo
+    def fixo(node):
+        return (
+            node in proximos
+            or (node in especiais and node in expansao.saidas)
+            or node in portoes
+        )
+
+    return fixo
+
+
+def _pontas(node, expansao, internos):
+    # Nós que sobrevivem à contração nas pontas do trecho que passa por node
+    if node not in expansao.saidas:
+        return set()
+    if node not in internos:
+        return {node}
+    pontas = set()
+    vizinhos = set(expansao.saidas[node]) | expansao.entradas.get(node, set())
+    for inicio in vizinhos:
+        anterior, atual = node, inicio
+        while atual in internos and atual != node:
+            lados = set(expansao.saidas[atual]) | expansao.entradas[atual]
+            anterior, atual = atual, next(n for n in lados if n != anterior)
+        if atual != node:
+            pontas.add(atual)
+    return pontas
+
+
+def com_caminho(grafo, versao, antigo, novo):
+    """Troca o caminho antigo pelo novo (qualquer um pode ser None).
+
+    Devolve None quando o caminho antigo não está no grafo ou o novo já
+    está, sinal de que ele não bate com o banco (foi compilado depois do
+    commit, por exemplo) e precisa ser recompilado.
+    """
+    removidos = [Trecho.de(antigo)] if antigo is not None else []
+    adicionados = [Trecho.de(novo)] if novo is not None else []
+
+    caminhos = list(grafo.caminhos)
+    for c in removidos:
+        if c not in caminhos:
+            return None
+        caminhos.remove(c)
+    if any(c in caminhos for c in adicionados):
+        return None
+    caminhos.extend(adicionados)
+
+    expansao, tocadas = grafo.expansao.com_caminhos(removidos, adicionados)
+
+    # Vagas e locais perto de células que surgiram ou sumiram mudam de
+    # ligação com o caminho
+    mudaram = {
+        c
+        for c in tocadas
+        if (c in grafo.expansao.saidas) != (c in expansao.saidas)
+    }
+    especiais = {
+        pos for c in mudaram for pos in grafo.indice_especiais.proximos(c)
+    }
+
+    return _remontar(
+        grafo,
+        versao,
+        expansao,
+        tuple(caminhos),
+        grafo.vagas,
+        grafo.tipos_vaga,
+        tocadas,
+        especiais,
+        set(),
+    )
+
+
+def com_vaga(grafo, versao, vaga_id, antes, depois):
+    """Cria, move, muda o tipo ou remove uma vaga: antes/depois são
+    ((x, y), tipo) ou None."""
+    vagas = dict(grafo.vagas)
+    tipos = dict(grafo.tipos_vaga)
+    vagas.pop(vaga_id, None)
+    tipos.pop(vaga_id, None)
+    if depois is not None:
+        vagas[vaga_id], tipos[vaga_id] = depois
+
+    especiais = {vaga[0] for vaga in (antes, depois) if vaga is not None}
+    return _remontar(
+        grafo,
+        versao,
+        grafo.expansao,
+        grafo.caminhos,
+        vagas,
+        tipos,
+        set(),
+        especiais,
+        {vaga_id},
+    )
+
+
+def _remontar(
+    grafo,
+    versao,
+    expansao,
+    caminhos,
+    vagas,
+    tipos,
+    tocadas,
+    especiais_tocados,
+    vagas_tocadas,
+):
+    especiais = set(vagas.values()) | set(grafo.locais.values())
+    portoes = set(grafo.portoes.values())
+
+    # 1. Ligações dos especiais tocados com as células do caminho
+    ligacoes = dict(grafo.ligacoes)
+    proximos = dict(grafo.proximos)
+    for pos in especiais_tocados:
+        velhas = grafo.ligacoes.get(pos, [])
+        novas = []
+        if pos in especiais:
+            novas = [c for c in vizinhanca(pos) if c in expansao.saidas]
+            ligacoes[pos] = novas
+        else:
+            ligacoes.pop(pos, None)
+        for node in set(velhas) - set(novas):
+            restantes = [p for p in proximos[node] if p != pos]
+            if restantes:
+                proximos[node] = restantes
+            else:
+                del proximos[node]
+        for node in set(novas) - set(velhas):
+            proximos[node] = [*proximos.get(node, []), pos]
+        tocadas = tocadas | set(velhas) | set(novas) | {pos}
+
+    especiais_proximos = grafo.especiais_proximos
+    if vagas_tocadas:
+        indice = IndiceEspacial(especiais)
+        especiais_proximos = dict(especiais_proximos)
+        vizinhos = set()
+        for pos in especiais_tocados:
+            vizinhos.update(grafo.especiais_proximos.get(pos, ()))
+            if pos in especiais:
+                vizinhos.update(indice.proximos(pos))
+            else:
+                especiais_proximos.pop(pos, None)
+        for pos in (vizinhos | especiais_tocados) & especiais:
+            especiais_proximos[pos] = indice.proximos(pos)
+
+    # 2. Contração refeita só nos trechos que passam pelas células tocadas
+    antes = _Internos(
+        grafo.expansao,
+        _fixo(grafo.proximos, grafo.especiais, grafo.expansao, portoes),
+    )
+    depois = _Internos(expansao, _fixo(proximos, especiais, expansao, portoes))
+    refazer = set()
+    for node in tocadas:
+        refazer |= _pontas(node, grafo.expansao, antes)
+        refazer |= _pontas(node, expansao, depois)
+    for node in list(refazer):
+        refazer.update(grafo.reverso.get(node, ()))
+
+    adjacencia = dict(grafo.adjacencia)
+    reverso = dict(grafo.reverso)
+    alterados = set(refazer)
+    for node in refazer:
+        velhas = grafo.adjacencia.get(node, {})
+        novas = {}
+        if node in expansao.saidas and node not in depois:
+            novas = arestas_contraidas(expansao.saidas, node, depois)
+            adjacencia[node] = novas
+        else:
+            adjacencia.pop(node, None)
+        for neigh in velhas:
+            reverso[neigh] = {
+                u: p for u, p in reverso[neigh].items() if u != node
+            }
+        for neigh, peso in novas.items():
+            reverso[neigh] = {**reverso.get(neigh, {}), node: peso}
+        alterados |= velhas.keys() | novas.keys()
+    for node in refazer:
+        if node in adjacencia:
+            reverso.setdefault(node, {})
+        else:
+            reverso.pop(node, None)
+
+    novo = replace(
+        grafo,
+        versao=versao,
+        adjacencia=adjacencia,
+        vagas=vagas,
+        tipos_vaga=tipos,
+        ligacoes=ligacoes,
+        proximos=proximos,
+        especiais_proximos=especiais_proximos,
+        caminhos=caminhos,
+        arvores={},
+        medidas={},
+    )
+    # cached_property já calculadas seguem adiante em vez de recalculadas
+    novo.__dict__["expansao"] = expansao
+    novo.__dict__["reverso"] = reverso
+    if "adjacencia_a_pe" in grafo.__dict__:
+        a_pe = dict(grafo.adjacencia_a_pe)
+        for node in alterados:
+            if node not in adjacencia:
+                a_pe.pop(node, None)
+                continue
+            arestas = dict(adjacencia[node])
+            for u, peso in reverso.get(node, {}).items():
+                if peso < arestas.get(u, math.inf):
+                    arestas[u] = peso
+            a_pe[node] = arestas
+        novo.__dict__["adjacencia_a_pe"] = a_pe
+
+    # 3. Árvores de distância já calculadas: repara em vez de refazer
+    por_posicao = {}
+    for vaga_id, pos in vagas.items():
+        por_posicao.setdefault(pos, []).append(vaga_id)
+
+    mudadas = {}
+    for chave, dist in list(grafo.arvores.items()):
+        dist = dict(dist)
+        graph, rev, inicio, pos, especial = novo._fontes(chave)
+        inicio_antigo = grafo._fontes(chave)[2]
+        trocados = {
+            n
+            for n in inicio.keys() | inicio_antigo.keys()
+            if inicio.get(n) != inicio_antigo.get(n)
+        }
+        mudados = reparar_distancias(
+            graph, rev, dist, inicio, alterados | trocados
+        )
+
+        posicoes = set(especiais_tocados)
+        for node in mudados:
+            posicoes.update(proximos.get(node, ()))
+            posicoes.update(grafo.proximos.get(node, ()))
+            posicoes.add(node)
+        ids = set(vagas_tocadas)
+        for p in posicoes:
+            ids.update(por_posicao.get(p, ()))
+
+        medidas = dict(grafo.medidas[chave])
+        for vaga_id in ids:
+            medidas.pop(vaga_id, None)
+            if vaga_id in vagas:
+                d = novo._medir_vaga(dist, vagas[vaga_id], pos, especial)
+                if d is not None:
+                    medidas[vaga_id] = d
+        novo.arvores[chave] = dist
+        novo.medidas[chave] = medidas
+        mudadas[chave] = ids
+
+    return novo, mudadas
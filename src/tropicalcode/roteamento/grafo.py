@@ -0,0 +1,298 @@
+import heapq
+import math
+from itertools import pairwise
+
+
+def percorrer(caminho):
+    # Células do caminho em ordem: anda primeiro em x e depois em y
+    current = (caminho.origem_x, caminho.origem_y)
+    d = (caminho.destino_x, caminho.destino_y)
+    yield current
+    while current != d:
+        if current[0] < d[0]:
+            current = (current[0] + 1, current[1])
+        elif current[0] > d[0]:
+            current = (current[0] - 1, current[1])
+        elif current[1] < d[1]:
+            current = (current[0], current[1] + 1)
+        else:
+            current = (current[0], current[1] - 1)
+        yield current
+
+
+def passos(caminho):
+    # Arestas de uma célula para a seguinte que o caminho libera
+    celulas = list(percorrer(caminho))
+    for current, next_node in pairwise(celulas):
+        if caminho.direcao in ("IDA", "AMBOS"):
+            yield current, next_node
+        if caminho.direcao in ("VOLTA", "AMBOS"):
+            yield next_node, current
+
+
+def expandir_caminhos(caminhos):
+    graph = {}
+
+    for c in caminhos:
+        graph.setdefault((c.origem_x, c.origem_y), [])
+        graph.setdefault((c.destino_x, c.destino_y), [])
+        for current in percorrer(c):
+            graph.setdefault(current, [])
+        for current, next_node in passos(c):
+            if next_node not in graph[current]:
+                graph[current].append(next_node)
+
+    return graph
+
+
+def vizinhanca(pos):
+    # Células inteiras na mesma linha ou coluna a até 1.5 de pos
+    x, y = pos
+    celulas = []
+    if float(x).is_integer():
+        for cy in range(math.ceil(y - 1.5), math.floor(y + 1.5) + 1):
+            celulas.append((int(x), cy))
+    if float(y).is_integer():
+        for cx in range(math.ceil(x - 1.5), math.floor(x + 1.5) + 1):
+            celulas.append((cx, int(y)))
+    return [c for c in celulas if c != pos]
+
+
+class IndiceEspacial:
+    """Grade para achar os nós na mesma linha ou coluna a até 1.5."""
+
+    def __init__(self, nodes=()):
+        self.ordem = {}
+        self.colunas = {}
+        self.linhas = {}
+        for node in nodes:
+            self.adicionar(node)
+
+    def adicionar(self, node):
+        if node in self.ordem:
+            return
+        self.ordem[node] = len(self.ordem)
+        x, y = node
+        self.colunas.setdefault((x, math.floor(y)), []).append(node)
+        self.linhas.setdefault((math.floor(x), y), []).append(node)
+
+    def proximos(self, pos):
+        x, y = pos
+        candidatos = []
+        for fy in range(math.floor(y - 1.5), math.floor(y + 1.5) + 1):
+            candidatos.extend(self.colunas.get((x, fy), ()))
+        for fx in range(math.floor(x - 1.5), math.floor(x + 1.5) + 1):
+            candidatos.extend(self.linhas.get((fx, y), ()))
+
+        proximos = {
+            node
+            for node in candidatos
+            if node != pos and abs(node[0] - x) + abs(node[1] - y) <= 1.5
+        }
+        # Mesma ordem da varredura do grafo inteiro
+        return sorted(proximos, key=self.ordem.get)
+
+
+def conectar_nos(graph, posicoes):
+    indice = IndiceEspacial(graph)
+    for pos in posicoes:
+        if pos not in graph:
+            graph[pos] = []
+        indice.adicionar(pos)
+
+        for node in indice.proximos(pos):
+            if pos not in graph[node]:
+                graph[node].append(pos)
+            if node not in graph[pos]:
+                graph[pos].append(node)
+
+    return graph
+
+
+def interno(saidas, chegadas):
+    # Nó interno de um trecho: só dois vizinhos, ligado a eles nos dois
+    # sentidos ou atravessado num sentido só.
+    if len(saidas | chegadas) != 2:
+        return False
+    return saidas == chegadas or (len(saidas) == 1 and len(chegadas) == 1)
+
+
+def arestas_contraidas(graph, node, internos):
+    # Segue cada saída de node pelos nós internos até o próximo nó que
+    # sobrevive à contração; internos: nó interno -> suas saídas
+    contraido = {}
+    for neigh in graph[node]:
+        peso, anterior, atual = 1, node, neigh
+        while atual in internos:
+            saidas = internos[atual]
+            if len(saidas) == 2:
+                seguinte = next(n for n in saidas if n != anterior)
+            else:
+                seguinte = next(iter(saidas))
+            anterior, atual = atual, seguinte
+            peso += 1
+        if atual != node and peso < contraido.get(atual, math.inf):
+            contraido[atual] = peso
+    return contraido
+
+
+def contrair(graph, fixos):
+    """Troca cada trecho reto sem bifurcação por uma aresta com peso."""
+    entradas = {}
+    for node, vizinhos in graph.items():
+        for neigh in vizinhos:
+            entradas.setdefault(neigh, set()).add(node)
+
+    internos = {}
+    for node, vizinhos in graph.items():
+        if node in fixos:
+            continue
+        saidas = set(vizinhos)
+        if interno(saidas, entradas.get(node, set())):
+            internos[node] = saidas
+
+    return {
+        node: arestas_contraidas(graph, node, internos)
+        for node in graph
+        if node not in internos
+    }
+
+
+def arestas(graph, node):
+    # Grafo com pesos (nó -> {vizinho: peso}) ou por passos (nó -> [vizinho])
+    vizinhos = graph.get(node, [])
+    if isinstance(vizinhos, dict):
+        return vizinhos.items()
+    return ((neigh, 1) for neigh in vizinhos)
+
+
+def dijkstra(graph, start, target):
+    queue = [(0, start)]
+    visited = set()
+    while queue:
+        dist, node = heapq.heappop(queue)
+        if node == target:
+            return dist
+        if node in visited:
+            continue
+        visited.add(node)
+        for neigh, peso in arestas(graph, node):
+            heapq.heappush(queue, (dist + peso, neigh))
+    return float("inf")
+
+
+def dijkstra_mais_proximos(graph, start, alvos):
+    # Para na primeira distância em que algum alvo é alcançado e devolve
+    # todos os alvos empatados nela.
+    queue = [(0, start)]
+    visited = set()
+    menor = float("inf")
+    encontrados = set()
+    while queue:
+        dist, node = heapq.heappop(queue)
+        if dist > menor:
+            break
+        if node in visited:
+            continue
+        visited.add(node)
+        if node in alvos:
+            menor = dist
+            encontrados.add(node)
+        for neigh, peso in arestas(graph, node):
+            if neigh not in visited:
+                heapq.heappush(queue, (dist + peso, neigh))
+    return menor, encontrados
+
+
+def dijkstra_distancias(graph, inicio):
+    # inicio: nó -> distância inicial
+    queue = [(d, node) for node, d in inicio.items()]
+    heapq.heapify(queue)
+    dist = {}
+    while queue:
+        d, node = heapq.heappop(queue)
+        if node in dist:
+            continue
+        dist[node] = d
+        for neigh, peso in arestas(graph, node):
+            if neigh not in dist:
+                heapq.heappush(queue, (d + peso, neigh))
+    return dist
+
+
+def dijkstra_multiplas_fontes(graph, fontes):
+    # fontes: rótulo -> {nó: distância inicial}. Uma fila só para todas as
+    # fontes; cada nó é fechado uma vez por rótulo.
+    queue = [
+        (d, i, node)
+        for i, inicio in enumerate(fontes.values())
+        for node, d in inicio.items()
+    ]
+    heapq.heapify(queue)
+    dist = [{} for _ in fontes]
+    while queue:
+        d, i, node = heapq.heappop(queue)
+        if node in dist[i]:
+            continue
+        dist[i][node] = d
+        for neigh, peso in arestas(graph, node):
+            if neigh not in dist[i]:
+                heapq.heappush(queue, (d + peso, i, neigh))
+    return dict(zip(fontes, dist))
+
+
+def reparar_distancias(graph, reverso, dist, inicio, alterados):
+    """Atualiza dist (nó -> distância) depois de uma edição no grafo.
+
+    graph e reverso já são os novos; alterados são os nós cujas arestas de
+    chegada ou distância inicial mudaram. Só os nós que perderam o caminho
+    mínimo são recalculados, e a busca só anda por onde a distância muda.
+    Devolve os nós cuja distância mudou.
+    """
+    mudados = set()
+    for node in list(dist):
+        if node not in graph:
+            del dist[node]
+            mudados.add(node)
+
+    def apoiado(node):
+        if inicio.get(node) == dist[node]:
+            return True
+        return any(
+            u in dist and u not in perdidos and dist[u] + peso == dist[node]
+            for u, peso in reverso.get(node, {}).items()
+        )
+
+    # Com pesos positivos quem apoia um nó está sempre mais perto, então
+    # basta reavaliar os vizinhos de cada nó que perde o apoio.
+    perdidos = set()
+    pendentes = [node for node in alterados if node in dist]
+    while pendentes:
+        node = pendentes.pop()
+        if node in perdidos or apoiado(node):
+            continue
+        perdidos.add(node)
+        pendentes.extend(n for n, _ in arestas(graph, node) if n in dist)
+    antes = {node: dist.pop(node) for node in perdidos}
+
+    queue = []
+    for node in perdidos | {n for n in alterados if n in graph}:
+        melhor = inicio.get(node, math.inf)
+        for u, peso in reverso.get(node, {}).items():
+            if u in dist:
+                melhor = min(melhor, dist[u] + peso)
+        if melhor < dist.get(node, math.inf):
+            queue.append((melhor, node))
+    heapq.heapify(queue)
+    while queue:
+        d, node = heapq.heappop(queue)
+        if d >= dist.get(node, math.inf):
+            continue
+        dist[node] = d
+        if antes.get(node) != d:
+            mudados.add(node)
+        for neigh, peso in arestas(graph, node):
+            if d + peso < dist.get(neigh, math.inf):
+                heapq.heappush(queue, (d + peso, neigh))
+
+    return mudados | {node for node in perdidos if node not in dist}
@@ -0,0 +1,209 @@
+import asyncio
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from tropicalcode.database import get_session
+from tropicalcode.roteamento import cache
+from tropicalcode.settings import Settings
+
+SETTINGS = Settings()
+
+_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=1)
+_tabela = None
+_agendada = False
+
+
+@dataclass(frozen=True)
+class TabelaDistancias:
+    versao: int
+    # id do portão -> {id da vaga -> distância a partir do portão}
+    portoes: dict
+    # id do local de trabalho -> {id da vaga -> distância a pé}
+    locais: dict
+    # id do portão -> tipo_vaga -> [(distância, id da vaga)] em ordem
+    # crescente
+    ordenadas: dict
+    # (id do portão, id do local) -> tipo_vaga -> [(pontuação, id da vaga)]
+    por_local: dict
+
+
+def pontuar(conducao, caminhada):
+    if not SETTINGS.PESO_CAMINHADA:
+        return SETTINGS.PESO_CONDUCAO * conducao
+    # Sem caminho a pé até o local a vaga só serve depois de todas as outras
+    if caminhada is None:
+        return math.inf
+    return (
+        SETTINGS.PESO_CONDUCAO * conducao + SETTINGS.PESO_CAMINHADA * caminhada
+    )
+
+
+def _ordenar(pontuacoes, tipos_vaga):
+    ordenadas = {}
+    for vaga_id, pontuacao in pontuacoes.items():
+        tipo = tipos_vaga[vaga_id]
+        ordenadas.setdefault(tipo, []).append((pontuacao, vaga_id))
+    for lista in ordenadas.values():
+        lista.sort()
+    return ordenadas
+
+
+def calcular_tabela(grafo):
+    # Uma busca com todos os portões e uma árvore a pé por local de trabalho
+    dos_portoes = grafo.distancias_portoes()
+    dos_locais = {
+        local_id: grafo.distancias_a_pe(local_id) for local_id in grafo.locais
+    }
+
+    ordenadas = {}
+    por_local = {}
+    for portao_id, conducao in dos_portoes.items():
+        ordenadas[portao_id] = _ordenar(conducao, grafo.tipos_vaga)
+        for local_id, a_pe in dos_locais.items():
+            pontuacoes = {
+                vaga_id: pontuar(d, a_pe.get(vaga_id))
+                for vaga_id, d in conducao.items()
+            }
+            por_local[portao_id, local_id] = _ordenar(
+                pontuacoes, grafo.tipos_vaga
+            )
+
+    return TabelaDistancias(
+        grafo.versao, dos_portoes, dos_locais, ordenadas, por_local
+    )
+
+
+def _reordenar(ordenadas, pontuacoes, mudadas, tipos_vaga):
+    # Tira as vagas que mudaram e reinsere com a pontuação nova; o resto
+    # da lista já está em ordem
+    if not mudadas:
+        return ordenadas
+    novas = {}
+    tipos = set(ordenadas) | {tipos_vaga[v] for v in pontuacoes}
+    for tipo in tipos:
+        lista = [e for e in ordenadas.get(tipo, []) if e[1] not in mudadas]
+        lista.extend(
+            (p, v) for v, p in pontuacoes.items() if tipos_vaga[v] == tipo
+        )
+        if lista:
+            novas[tipo] = sorted(lista)
+    return novas
+
+
+def reparar_tabela(tabela, grafo, mudadas):
+    # Mesmas contas de calcular_tabela, refeitas só para as vagas cujas
+    # distâncias mudaram em cada árvore
+    # Árvore que não veio reparada (calculada depois da edição): todas
+    todas = set(grafo.vagas).union(*tabela.portoes.values())
+    dos_portoes = grafo.distancias_portoes()
+    dos_locais = {
+        local_id: grafo.distancias_a_pe(local_id) for local_id in grafo.locais
+    }
+
+    ordenadas = {}
+    por_local = {}
+    for portao_id, conducao in dos_portoes.items():
+        m_portao = mudadas.get(("portao", portao_id), todas)
+        ordenadas[portao_id] = _reordenar(
+            tabela.ordenadas[portao_id],
+            {v: conducao[v] for v in m_portao if v in conducao},
+            m_portao,
+            grafo.tipos_vaga,
+        )
+        for local_id, a_pe in dos_locais.items():
+            m = m_portao | mudadas.get(("local", local_id), todas)
+            por_local[portao_id, local_id] = _reordenar(
+                tabela.por_local[portao_id, local_id],
+                {
+                    v: pontuar(conducao[v], a_pe.get(v))
+                    for v in m
+                    if v in conducao
+                },
+                m,
+                grafo.tipos_vaga,
+            )
+
+    return TabelaDistancias(
+        grafo.versao, dos_portoes, dos_locais, ordenadas, por_local
+    )
+
+
+async def get_tabela(session):
+    # A versão vem do banco: mapa alterado por outro processo também
+    # descarta a tabela e agenda a reconstrução
+    versao = await cache.sincronizar(session)
+    with _lock:
+        tabela = _tabela
+    if tabela is None or tabela.versao != versao:
+        agendar_reconstrucao()
+        return None
+    return tabela
+
+
+def _publicar(tabela):
+    # Só publica a tabela da versão atual do mapa; as versões voltam a
+    # contar do zero quando o banco é recriado
+    global _tabela
+    with _lock:
+        if tabela.versao == cache.versao_mapa():
+            _tabela = tabela
+
+
+async def _reconstruir():
+    async for session in get_session():
+        grafo = await cache.get_grafo(session)
+    _publicar(calcular_tabela(grafo))
+
+
+async def calcular_fora_do_laco(grafo):
+    # Para quem não pode esperar a reconstrução agendada: a conta roda no
+    # executor dela, e o laço de eventos segue atendendo as outras páginas
+    loop = asyncio.get_running_loop()
+    tabela = await loop.run_in_executor(_executor, calcular_tabela, grafo)
+    _publicar(tabela)
+    return tabela
+
+
+def _executar():
+    global _agendada
+    with _lock:
+        _agendada = False
+    asyncio.run(_reconstruir())
+
+
+@cache.ao_editar
+def atualizar_tabela(antigo, novo, mudadas):
+    global _tabela
+    with _lock:
+        tabela = _tabela
+    if tabela is None or tabela.versao != antigo.versao:
+        agendar_reconstrucao()
+        return
+
+    reparada = reparar_tabela(tabela, novo, mudadas)
+    with _lock:
+        if _tabela is tabela:
+            _tabela = reparada
+
+
+@cache.ao_invalidar
+def _descartar():
+    # Grafo invalidado: a tabela dele também sai, mesmo que a versão
+    # coincida com a de um banco recriado do zero
+    global _tabela
+    with _lock:
+        _tabela = None
+
+
+@cache.ao_invalidar
+def agendar_reconstrucao():
+    # Edições seguidas no mapa viram uma só reconstrução pendente
+    global _agendada
+    with _lock:
+        if _agendada:
+            return
+        _agendada = True
+    return _executor.submit(_executar)
@@ -4,10 +4,12 @@ from datetime import datetime, timezone
 
 from tropicalcode.database import get_session
 from tropicalcode.repositorios.estacionamento_repo import (
-    create_estacionamento,
+    create_estacionamentos,
     get_estacionamentos,
 )
-from tropicalcode.repositorios.registro_atividade_repo import create_registro
+from tropicalcode.repositorios.registro_atividade_repo import (
+    create_registros,
+)
 from tropicalcode.repositorios.usuario_repo import get_usuarios
 
 tipos = ["MOTO", "CARRO", "PCD", "CARRO_ELETRICO"]
@@ -15,35 +17,39 @@ tipos = ["MOTO", "CARRO", "PCD", "CARRO_ELETRICO"]
 
 async def seed():
     async for session in get_session():
-        ests = await get_estacionamentos(session)
+        ests = (await get_estacionamentos(session)).itens
         if not ests:
-            for i in range(20):
-                await create_estacionamento(
-                    session,
+            await create_estacionamentos(
+                session,
+                [
                     {
                         "codigo_vaga": f"V{i + 1}",
                         "tipo_vaga": random.choice(tipos),
                         "posicao_geral": i + 1,
                         "posicao_x": random.uniform(0, 50),
                         "posicao_y": random.uniform(0, 50),
-                    },
-                )
-            ests = await get_estacionamentos(session)
+                    }
+                    for i in range(20)
+                ],
+            )
+            ests = (await get_estacionamentos(session)).itens
 
-        usuarios = await get_usuarios(session)
+        usuarios = (await get_usuarios(session)).itens
 
         if usuarios and ests:
-            for u in usuarios:
-                e = random.choice(ests)
-                await create_registro(
-                    session,
+            await create_registros(
+                session,
+                [
                     {
-                        "estacionamento_id": e.id,
+                        "estacionamento_id": random.choice(ests).id,
+                        "usuario_id": u.id,
                         "tipo": random.choice(["ENTRADA", "SAIDA"]),
                         "caminho": "seed",
                         "horario": datetime.now(timezone.utc),
-                    },
-                )
+                    }
+                    for u in usuarios
+                ],
+            )
 
 
 if __name__ == "__main__":
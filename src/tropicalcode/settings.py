@@ -9,3 +9,56 @@ class Settings(BaseSettings):
     DATABASE_URL: str
     URL_ENTRADA: str
     URL_SAIDA: str
+
+    # Acima deste número de células o grafo de rotas vai para o formato CSR
+    GRAFO_CSR_CELULAS: int = 200_000
+
+    # Pesos da escolha de vaga: distância dirigindo da entrada até a vaga
+    # e distância a pé da vaga até o local de trabalho do usuário
+    PESO_CONDUCAO: float = 1.0
+    PESO_CAMINHADA: float = 1.0
+
+    # Intervalo máximo, em segundos, para as filas de vagas livres verem
+    # entradas e saídas gravadas por outros processos; 0 confere a cada
+    # escolha
+    ALOCADOR_SINCRONIA_SEGUNDOS: float = 1.0
+
+    # Registros de estadias fechadas há mais que o horizonte vão para o
+    # arquivo, em lotes deste tamanho
+    ARQUIVO_HORIZONTE_DIAS: int = 180
+    ARQUIVO_LOTE: int = 1000
+
+    # Um snapshot da ocupação a cada tantos registros; os mais antigos
+    # além dos últimos SNAPSHOT_MANTER são apagados
+    SNAPSHOT_INTERVALO: int = 5000
+    SNAPSHOT_MANTER: int = 48
+
+    # Pool de conexões; DB_POOL_RECYCLE em segundos, -1 não recicla
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = False
+
+    # PRAGMAs aplicados a cada conexão SQLite nova; com o WAL leitores não
+    # esperam o escritor e o busy_timeout segura a disputa entre escritores
+    SQLITE_PERFIL: bool = True
+    SQLITE_JOURNAL_MODE: str = "WAL"
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_MMAP_MB: int = 256
+    SQLITE_CACHE_MB: int = 64
+    SQLITE_FOREIGN_KEYS: bool = True
+
+    # Cache de leitura de locais, vagas e usuários por nome: itens por
+    # cache e validade em segundos; mudanças feitas por outro processo
+    # chegam pela versão gravada no banco, sem esperar a validade
+    CACHE_REFERENCIA_TAMANHO: int = 1024
+    CACHE_REFERENCIA_VALIDADE: float = 300
+
+    # Medição dos comandos SQL de cada página: um resumo em JSON por página
+    # no arquivo de log e um aviso quando a mesma forma de comando se repete
+    # mais que SQL_REPETICOES_AVISO vezes numa página (N+1)
+    SQL_MEDIR: bool = False
+    SQL_LOG_ARQUIVO: str = "sql_paginas.jsonl"
+    SQL_REPETICOES_AVISO: int = 10
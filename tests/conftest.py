@@ -0,0 +1,28 @@
+import asyncio
+
+import pytest
+
+# Antes de qualquer outro import do pacote: aponta o DATABASE_URL para um
+# banco descartável
+from tropicalcode.benchmark.banco_temporario import recriar_banco
+from tropicalcode.database import engine
+from tropicalcode.roteamento import alocador
+
+
+@pytest.fixture
+def rodar():
+    """Roda a corrotina num banco recém-criado e vazio."""
+
+    def rodar(corrotina):
+        async def no_banco():
+            await recriar_banco()
+            # Banco novo é como um processo novo: sem filas do anterior
+            alocador.invalidar()
+            try:
+                return await corrotina
+            finally:
+                await engine.dispose()
+
+        return asyncio.run(no_banco())
+
+    return rodar
@@ -0,0 +1,170 @@
+import asyncio
+
+from sqlalchemy import event
+
+from tropicalcode.database import engine, get_session
+from tropicalcode.models import Caminho
+from tropicalcode.repositorios import registro_atividade_repo, versoes
+from tropicalcode.repositorios.estacionamento_repo import (
+    create_estacionamentos,
+    find_best_for_user,
+    get_estacionamentos,
+)
+from tropicalcode.repositorios.usuario_repo import (
+    create_usuarios,
+    get_usuario_por_nome,
+)
+from tropicalcode.roteamento import alocador
+from tropicalcode.roteamento.tabela import get_tabela
+
+
+async def _preparar(session):
+    session.add(Caminho(0, 0, 0, 10, "AMBOS"))
+    await versoes.subir(session, versoes.MAPA)
+    await session.commit()
+    await create_estacionamentos(
+        session,
+        [
+            {
+                "codigo_vaga": f"V{y}",
+                "tipo_vaga": "CARRO",
+                "posicao_geral": y,
+                "posicao_x": 1,
+                "posicao_y": y,
+            }
+            for y in (1, 2, 3)
+        ],
+    )
+    await create_usuarios(
+        session,
+        [
+            {
+                "nome_usuario": f"u{i}",
+                "senha": "",
+                "email": f"u{i}@x",
+                "local_trabalho": None,
+            }
+            for i in range(3)
+        ],
+    )
+    while await get_tabela(session) is None:
+        await session.commit()
+        await asyncio.sleep(0.01)
+
+
+async def _melhor(session, nome):
+    usuario = await get_usuario_por_nome(session, nome)
+    vaga = await find_best_for_user(session, usuario, "CARRO")
+    await session.commit()
+    return vaga.codigo_vaga
+
+
+async def _registrar_em_outro_processo(session, vaga, usuario, tipo):
+    # Gravado como a página de outro processo gravaria: as filas deste não
+    # recebem o aviso depois do commit
+    aviso = registro_atividade_repo._avisar_alocador
+    registro_atividade_repo._avisar_alocador = lambda _: None
+    try:
+        await registro_atividade_repo.create_registro(
+            session,
+            {
+                "estacionamento_id": vaga,
+                "usuario_id": usuario.id,
+                "tipo": tipo,
+                "caminho": "/teste",
+            },
+        )
+    finally:
+        registro_atividade_repo._avisar_alocador = aviso
+
+
+def _contador(comandos):
+    def contar(conn, cursor, statement, *args):
+        comandos.append(statement)
+
+    return contar
+
+
+def test_filas_seguem_registros_de_outro_processo(rodar, monkeypatch):
+    monkeypatch.setattr(alocador.SETTINGS, "ALOCADOR_SINCRONIA_SEGUNDOS", 0)
+
+    async def cenario():
+        async for session in get_session():
+            await _preparar(session)
+            vagas = {
+                v.codigo_vaga: v.id
+                for v in (await get_estacionamentos(session)).itens
+            }
+            u0 = await get_usuario_por_nome(session, "u0")
+            u2 = await get_usuario_por_nome(session, "u2")
+            await registro_atividade_repo.reservar_vaga(session, u0, "CARRO")
+            escolhas = [await _melhor(session, "u1")]
+
+            await _registrar_em_outro_processo(
+                session, vagas["V2"], u2, "ENTRADA"
+            )
+            escolhas.append(await _melhor(session, "u1"))
+
+            await _registrar_em_outro_processo(
+                session, vagas["V1"], u0, "SAIDA"
+            )
+            escolhas.append(await _melhor(session, "u1"))
+            return escolhas
+
+    assert rodar(cenario()) == ["V2", "V3", "V1"]
+
+
+def test_fila_nao_cresce_com_entradas_e_saidas(rodar):
+    async def cenario():
+        async for session in get_session():
+            await _preparar(session)
+            vagas = {
+                v.codigo_vaga: v.id
+                for v in (await get_estacionamentos(session)).itens
+            }
+            await _melhor(session, "u1")
+        # V3 nunca chega ao topo: sai e volta sem passar pelo heappop
+        for _ in range(1000):
+            alocador.ocupar(vagas["V3"])
+            alocador.liberar(vagas["V3"])
+        return [len(fila) for fila, _ in alocador._filas.values()]
+
+    assert rodar(cenario()) == [3]
+
+
+def test_escolha_sem_consulta_entre_conferencias(rodar, monkeypatch):
+    monkeypatch.setattr(alocador.SETTINGS, "ALOCADOR_SINCRONIA_SEGUNDOS", 3600)
+
+    async def cenario():
+        async for session in get_session():
+            await _preparar(session)
+            u0 = await get_usuario_por_nome(session, "u0")
+            await registro_atividade_repo.reservar_vaga(session, u0, "CARRO")
+            tabela = await get_tabela(session)
+            await session.commit()
+
+            comandos = []
+            contar = _contador(comandos)
+
+            event.listen(engine.sync_engine, "before_cursor_execute", contar)
+            try:
+                escolhas = [
+                    await alocador.melhor_vaga(
+                        session, tabela, None, None, "CARRO"
+                    )
+                    for _ in range(3)
+                ]
+            finally:
+                event.remove(
+                    engine.sync_engine, "before_cursor_execute", contar
+                )
+            vagas = {
+                v.id: v.codigo_vaga
+                for v in (await get_estacionamentos(session)).itens
+            }
+        return [vagas[v] for v in escolhas], comandos
+
+    escolhas, comandos = rodar(cenario())
+    # A própria entrada chegou pelo aviso depois do commit, sem releitura
+    assert escolhas == ["V2", "V2", "V2"]
+    assert comandos == []
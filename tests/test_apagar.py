@@ -0,0 +1,102 @@
+import pytest
+
+from tropicalcode.database import get_session
+from tropicalcode.repositorios.automovel_repo import (
+    create_automovel,
+    delete_automovel,
+)
+from tropicalcode.repositorios.em_massa import EmUso
+from tropicalcode.repositorios.estacionamento_repo import (
+    create_estacionamentos,
+    delete_estacionamento,
+    delete_estacionamentos,
+    get_estacionamentos,
+)
+from tropicalcode.repositorios.registro_atividade_repo import (
+    create_registro,
+    get_estadia_aberta,
+)
+from tropicalcode.repositorios.trabalho_repo import (
+    create_local_trabalho,
+    delete_local_trabalho,
+)
+from tropicalcode.repositorios.usuario_repo import (
+    create_usuario,
+    delete_usuario,
+    get_usuario,
+)
+
+
+async def _cadastrar(session):
+    local = await create_local_trabalho(
+        session, {"nome": "Bloco A", "posicao_x": 5, "posicao_y": 5}
+    )
+    usuario = await create_usuario(
+        session,
+        {
+            "nome_usuario": "ana",
+            "senha": "",
+            "email": "ana@x",
+            "local_trabalho": local.id,
+        },
+    )
+    automovel = await create_automovel(
+        session,
+        {"usuario_id": usuario.id, "placa": "ABC1D23", "tipo": "CARRO"},
+    )
+    vagas = await create_estacionamentos(
+        session,
+        [
+            {
+                "codigo_vaga": f"V{y}",
+                "tipo_vaga": "CARRO",
+                "posicao_geral": y,
+                "posicao_x": 1,
+                "posicao_y": y,
+            }
+            for y in (1, 2)
+        ],
+    )
+    await create_registro(
+        session,
+        {
+            "estacionamento_id": vagas[0],
+            "usuario_id": usuario.id,
+            "tipo": "ENTRADA",
+            "caminho": "/teste",
+        },
+        automovel.id,
+    )
+    return local, usuario, automovel, vagas
+
+
+def test_recusa_apagar_o_que_tem_historico(rodar):
+    async def cenario():
+        async for session in get_session():
+            _, usuario, _, vagas = await _cadastrar(session)
+            with pytest.raises(EmUso):
+                await delete_estacionamento(session, vagas[0])
+            with pytest.raises(EmUso):
+                await delete_estacionamentos(session, vagas)
+            with pytest.raises(EmUso):
+                await delete_usuario(session, usuario.id)
+
+            # Nada foi escrito: a vaga sem histórico também ficou
+            restantes = (await get_estacionamentos(session)).itens
+            assert len(restantes) == 2
+            assert await get_estadia_aberta(session, usuario.id)
+            assert await delete_estacionamento(session, vagas[1])
+
+    rodar(cenario())
+
+
+def test_solta_referencias_opcionais(rodar):
+    async def cenario():
+        async for session in get_session():
+            local, usuario, automovel, _ = await _cadastrar(session)
+            assert await delete_local_trabalho(session, local.id)
+            assert await delete_automovel(session, automovel.id)
+            usuario = await get_usuario(session, usuario.id)
+            assert usuario.local_trabalho is None
+
+    rodar(cenario())
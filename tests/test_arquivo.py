@@ -0,0 +1,138 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import select
+
+from tropicalcode.database import get_session
+from tropicalcode.models import (
+    EstadiaAberta,
+    Ocupacao,
+    RegistroAtividade,
+    registro_historico,
+)
+from tropicalcode.repositorios.estacionamento_repo import (
+    create_estacionamentos,
+)
+from tropicalcode.repositorios.registro_atividade_repo import (
+    arquivar_registros,
+    create_registros,
+    reconstruir_ocupacoes,
+)
+from tropicalcode.repositorios.usuario_repo import create_usuarios
+
+AGORA = datetime.now(timezone.utc).replace(microsecond=0)
+
+# (usuário, vaga, tipo, dias atrás)
+HISTORICO = [
+    # Estadia fechada antes do horizonte: vai toda para o arquivo
+    (0, 0, "ENTRADA", 400),
+    (0, 0, "SAIDA", 399),
+    # Estadia ainda aberta
+    (1, 1, "ENTRADA", 300),
+    # Mesmo horário da anterior, fechada antes do horizonte
+    (2, 2, "ENTRADA", 300),
+    (2, 2, "SAIDA", 290),
+    # Fechada depois do horizonte: a entrada antiga fica
+    (3, 3, "ENTRADA", 350),
+    (3, 3, "SAIDA", 10),
+]
+ARQUIVADOS = [0, 1, 3, 4]
+
+
+async def _preparar(session):
+    vagas = await create_estacionamentos(
+        session,
+        [
+            {
+                "codigo_vaga": f"V{i}",
+                "tipo_vaga": "CARRO",
+                "posicao_geral": i,
+                "posicao_x": 1,
+                "posicao_y": i,
+            }
+            for i in range(4)
+        ],
+    )
+    usuarios = await create_usuarios(
+        session,
+        [
+            {
+                "nome_usuario": f"u{i}",
+                "senha": "",
+                "email": f"u{i}@x",
+                "local_trabalho": None,
+            }
+            for i in range(4)
+        ],
+    )
+    ids = await create_registros(
+        session,
+        [
+            {
+                "usuario_id": usuarios[u],
+                "estacionamento_id": vagas[v],
+                "tipo": tipo,
+                "horario": AGORA - timedelta(days=dias),
+                "caminho": "/teste",
+            }
+            for u, v, tipo, dias in HISTORICO
+        ],
+    )
+    return vagas, usuarios, ids
+
+
+async def _estado(session):
+    ocupacoes = await session.execute(
+        select(Ocupacao.estacionamento_id, Ocupacao.registro_id)
+    )
+    estadias = await session.execute(
+        select(EstadiaAberta.usuario_id, EstadiaAberta.registro_id)
+    )
+    return set(ocupacoes.all()), set(estadias.all())
+
+
+def _linhas(result):
+    return sorted(
+        (r.id, r.usuario_id, r.estacionamento_id, r.tipo, r.horario)
+        for r in result
+    )
+
+
+@pytest.mark.parametrize("lote", [1, 2, 1000])
+def test_arquivo_guarda_estadias_abertas(rodar, lote):
+    async def cenario():
+        async for session in get_session():
+            vagas, usuarios, ids = await _preparar(session)
+            historico = select(registro_historico)
+            antes = _linhas(await session.execute(historico))
+            estado = await _estado(session)
+            movidos = await arquivar_registros(session, 180, lote)
+            result = await session.execute(select(RegistroAtividade.id))
+            quentes = set(result.scalars())
+            depois = _linhas(await session.execute(historico))
+            # As reconstruções só leem a tabela quente
+            await reconstruir_ocupacoes(session)
+            refeito = await _estado(session)
+        return {
+            "ids": ids,
+            "aberta": (vagas[1], usuarios[1], ids[2]),
+            "antes": antes,
+            "depois": depois,
+            "movidos": movidos,
+            "quentes": quentes,
+            "estado": estado,
+            "refeito": refeito,
+        }
+
+    r = rodar(cenario())
+    ids = r["ids"]
+    assert r["movidos"] == len(ARQUIVADOS)
+    assert r["quentes"] == {
+        ids[i] for i in range(len(HISTORICO)) if i not in ARQUIVADOS
+    }
+    # A visão do histórico devolve as linhas movidas como eram
+    assert r["depois"] == r["antes"]
+    assert len(r["depois"]) == len(HISTORICO)
+    vaga, usuario, registro = r["aberta"]
+    assert r["estado"] == ({(vaga, registro)}, {(usuario, registro)})
+    assert r["refeito"] == r["estado"]
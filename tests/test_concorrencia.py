@@ -0,0 +1,97 @@
+import asyncio
+from collections import Counter
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from tropicalcode.database import engine, get_session
+from tropicalcode.models import Caminho, Ocupacao, RegistroAtividade
+from tropicalcode.repositorios import versoes
+from tropicalcode.repositorios.estacionamento_repo import (
+    create_estacionamentos,
+)
+from tropicalcode.repositorios.registro_atividade_repo import reservar_vaga
+from tropicalcode.repositorios.usuario_repo import (
+    create_usuarios,
+    get_usuarios,
+)
+from tropicalcode.roteamento.tabela import get_tabela
+
+VAGAS = 10
+USUARIOS = 30
+
+
+async def _preparar(session, esperar_tabela):
+    session.add(Caminho(0, 0, 0, VAGAS + 1, "AMBOS"))
+    await versoes.subir(session, versoes.MAPA)
+    await session.commit()
+    await create_estacionamentos(
+        session,
+        [
+            {
+                "codigo_vaga": f"V{y}",
+                "tipo_vaga": "CARRO",
+                "posicao_geral": y,
+                "posicao_x": 1,
+                "posicao_y": y,
+            }
+            for y in range(1, VAGAS + 1)
+        ],
+    )
+    await create_usuarios(
+        session,
+        [
+            {
+                "nome_usuario": f"u{i:02}",
+                "senha": "",
+                "email": f"u{i}@x",
+                "local_trabalho": None,
+            }
+            for i in range(USUARIOS)
+        ],
+    )
+    # Sem esperar, as escolhas caem na busca no grafo em vez das filas
+    while esperar_tabela and await get_tabela(session) is None:
+        await session.commit()
+        await asyncio.sleep(0.01)
+    return (await get_usuarios(session)).itens
+
+
+async def _reservar(usuario):
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        resultado = await reservar_vaga(session, usuario, "CARRO")
+    return resultado.get("estacionamento")
+
+
+@pytest.mark.parametrize("esperar_tabela", [True, False])
+def test_entradas_simultaneas_nao_repetem_vaga(rodar, esperar_tabela):
+    async def cenario():
+        async for session in get_session():
+            usuarios = await _preparar(session, esperar_tabela)
+        # Cada usuário chega duas vezes, todos ao mesmo tempo
+        vagas = await asyncio.gather(
+            *(_reservar(u) for u in usuarios + usuarios)
+        )
+        async for session in get_session():
+            entradas = (
+                await session.execute(
+                    select(
+                        RegistroAtividade.estacionamento_id,
+                        RegistroAtividade.usuario_id,
+                    ).where(RegistroAtividade.tipo == "ENTRADA")
+                )
+            ).all()
+            ocupacoes = (
+                await session.execute(select(Ocupacao.estacionamento_id))
+            ).all()
+        return vagas, entradas, ocupacoes
+
+    vagas, entradas, ocupacoes = rodar(cenario())
+    entregues = [v.id for v in vagas if v is not None]
+    assert len(entregues) == VAGAS
+    assert len(set(entregues)) == VAGAS
+    assert len(entradas) == VAGAS
+    assert Counter(v for v, _ in entradas).most_common(1)[0][1] == 1
+    assert Counter(u for _, u in entradas).most_common(1)[0][1] == 1
+    assert sorted(v for (v,) in ocupacoes) == sorted(entregues)
@@ -0,0 +1,97 @@
+import random
+
+import pytest
+
+from tropicalcode.roteamento.cache import montar_grafo
+from tropicalcode.roteamento.delta import Trecho, com_caminho, com_vaga
+from tropicalcode.roteamento.tabela import calcular_tabela, reparar_tabela
+
+TIPOS = ["MOTO", "CARRO"]
+DIRECOES = ["IDA", "VOLTA", "AMBOS"]
+
+
+def _trecho(r, n):
+    while True:
+        x, y = r.randrange(n), r.randrange(n)
+        if r.random() < 0.5:
+            x2, y2 = r.randrange(n), y
+        else:
+            x2, y2 = x, r.randrange(n)
+        if (x, y) != (x2, y2):
+            break
+    (ox, oy), (dx, dy) = sorted([(x, y), (x2, y2)])
+    return Trecho(ox, oy, dx, dy, r.choice(DIRECOES))
+
+
+def _posicao(r, n):
+    # Vagas também ficam em meia célula, fora da grade dos caminhos
+    return (r.randrange(n) + r.choice([0, 0, 0.5]), float(r.randrange(n)))
+
+
+def _editar(r, n, grafo, proximo_id):
+    versao = grafo.versao + 1
+    op = r.random()
+    if op < 0.35 or not grafo.caminhos:
+        return com_caminho(grafo, versao, None, _trecho(r, n))
+    if op < 0.5:
+        antigo = r.choice(grafo.caminhos)
+        novo = antigo._replace(direcao=r.choice(DIRECOES))
+        return com_caminho(grafo, versao, antigo, novo)
+    if op < 0.65:
+        return com_caminho(grafo, versao, r.choice(grafo.caminhos), None)
+    depois = (_posicao(r, n), r.choice(TIPOS))
+    if op < 0.8 or not grafo.vagas:
+        return com_vaga(grafo, versao, proximo_id, None, depois)
+    vaga_id = r.choice(list(grafo.vagas))
+    antes = (grafo.vagas[vaga_id], grafo.tipos_vaga[vaga_id])
+    if op < 0.9:
+        depois = None
+    return com_vaga(grafo, versao, vaga_id, antes, depois)
+
+
+def _conjuntos(d):
+    return {k: set(v) for k, v in d.items()}
+
+
+@pytest.mark.parametrize("semente", range(40))
+def test_edicao_igual_a_recompilar(semente):
+    r = random.Random(semente)
+    n = r.choice([6, 10, 14])
+    caminhos = [_trecho(r, n) for _ in range(r.randrange(1, 15))]
+    vagas = {i: _posicao(r, n) for i in range(1, r.randrange(2, 25))}
+    tipos = {i: r.choice(TIPOS) for i in vagas}
+    locais = {
+        i: (float(r.randrange(n)), float(r.randrange(n)))
+        for i in range(1, r.randrange(1, 4))
+    }
+    portoes = r.choice([
+        {None: (0, 0)},
+        {i: (r.randrange(n), r.randrange(n)) for i in (1, 2)},
+    ])
+    grafo = montar_grafo(1, caminhos, vagas, locais, tipos, portoes)
+    tabela = calcular_tabela(grafo)
+
+    for passo in range(12):
+        editado = _editar(r, n, grafo, 100 + passo)
+        if editado is None:
+            continue
+        grafo, mudadas = editado
+        tabela = reparar_tabela(tabela, grafo, mudadas)
+
+        inteiro = montar_grafo(
+            grafo.versao,
+            list(grafo.caminhos),
+            grafo.vagas,
+            locais,
+            grafo.tipos_vaga,
+            portoes,
+        )
+        assert grafo.adjacencia == inteiro.adjacencia
+        assert grafo.reverso == inteiro.reverso
+        assert grafo.adjacencia_a_pe == inteiro.adjacencia_a_pe
+        assert _conjuntos(grafo.ligacoes) == _conjuntos(inteiro.ligacoes)
+        assert _conjuntos(grafo.proximos) == _conjuntos(inteiro.proximos)
+        assert _conjuntos(grafo.especiais_proximos) == _conjuntos(
+            inteiro.especiais_proximos
+        )
+        assert tabela == calcular_tabela(inteiro)
@@ -0,0 +1,102 @@
+from sqlalchemy import select
+
+from tropicalcode.database import get_session
+from tropicalcode.models import Estacionamento, Usuario
+from tropicalcode.repositorios.estacionamento_repo import (
+    create_estacionamentos,
+    upsert_estacionamentos,
+)
+from tropicalcode.repositorios.usuario_repo import (
+    create_usuarios,
+    upsert_usuarios,
+)
+
+
+def _vaga(codigo, y, **extra):
+    return {
+        "codigo_vaga": codigo,
+        "tipo_vaga": "CARRO",
+        "posicao_geral": y,
+        "posicao_x": 1,
+        "posicao_y": y,
+        **extra,
+    }
+
+
+def _usuario(nome, email):
+    return {
+        "nome_usuario": nome,
+        "senha": "",
+        "email": email,
+        "local_trabalho": None,
+    }
+
+
+def test_upsert_devolve_ids_na_ordem_das_linhas(rodar):
+    async def cenario():
+        async for session in get_session():
+            criadas = await create_estacionamentos(
+                session, [_vaga(f"V{i}", i) for i in range(3)]
+            )
+            # Inserts e updates misturados, em grupos de colunas
+            # diferentes e dentro do mesmo grupo (id novo e id existente)
+            ids = await upsert_estacionamentos(
+                session,
+                [
+                    _vaga("N1", 10),
+                    _vaga("V1-editada", 11, id=criadas[1]),
+                    _vaga("N2", 12),
+                    _vaga("N3", 13, id=100),
+                    _vaga("V0-editada", 14, id=criadas[0]),
+                ],
+            )
+            result = await session.execute(
+                select(Estacionamento.id, Estacionamento.codigo_vaga)
+            )
+            return criadas, ids, dict(result.all())
+
+    criadas, ids, codigos = rodar(cenario())
+    assert ids[1] == criadas[1]
+    assert ids[3] == 100
+    assert ids[4] == criadas[0]
+    assert len(set(ids)) == 5
+    assert [codigos[i] for i in ids] == [
+        "N1",
+        "V1-editada",
+        "N2",
+        "N3",
+        "V0-editada",
+    ]
+    assert codigos[criadas[2]] == "V2"
+    assert len(codigos) == 6
+
+
+def test_upsert_de_usuarios_pelo_nome(rodar):
+    async def cenario():
+        async for session in get_session():
+            criados = await create_usuarios(
+                session, [_usuario(f"u{i}", f"u{i}@x") for i in range(3)]
+            )
+            ids = await upsert_usuarios(
+                session,
+                [
+                    _usuario("novo", "novo@x"),
+                    _usuario("u2", "u2@novo"),
+                    _usuario("u0", "u0@novo"),
+                ],
+            )
+            result = await session.execute(
+                select(Usuario.id, Usuario.nome_usuario, Usuario.email)
+            )
+            return criados, ids, {i: (n, e) for i, n, e in result}
+
+    criados, ids, usuarios = rodar(cenario())
+    assert ids[1:] == [criados[2], criados[0]]
+    assert ids[0] not in criados
+    assert [usuarios[i] for i in ids] == [
+        ("novo", "novo@x"),
+        ("u2", "u2@novo"),
+        ("u0", "u0@novo"),
+    ]
+    assert usuarios[criados[1]] == ("u1", "u1@x")
+    assert len(usuarios) == 4
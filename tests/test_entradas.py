@@ -0,0 +1,133 @@
+import asyncio
+
+import pytest
+from sqlalchemy import select
+
+from tropicalcode.database import get_session
+from tropicalcode.models import Caminho, Ocupacao
+from tropicalcode.repositorios import versoes
+from tropicalcode.repositorios.automovel_repo import (
+    create_automoveis,
+    get_automovel,
+)
+from tropicalcode.repositorios.estacionamento_repo import (
+    create_estacionamentos,
+)
+from tropicalcode.repositorios.registro_atividade_repo import (
+    ENTRADA_ATIVA,
+    PORTAO_DESCONHECIDO,
+    registrar_entradas,
+)
+from tropicalcode.repositorios.usuario_repo import (
+    create_usuarios,
+    get_usuarios,
+)
+from tropicalcode.roteamento import tabela
+from tropicalcode.roteamento.tabela import get_tabela
+
+VAGAS = 4
+
+
+async def _preparar(session, esperar_tabela):
+    session.add(Caminho(0, 0, 0, VAGAS + 1, "AMBOS"))
+    await versoes.subir(session, versoes.MAPA)
+    await session.commit()
+    await create_estacionamentos(
+        session,
+        [
+            {
+                "codigo_vaga": f"V{y}",
+                "tipo_vaga": "CARRO",
+                "posicao_geral": y,
+                "posicao_x": 1,
+                "posicao_y": y,
+            }
+            for y in range(1, VAGAS + 1)
+        ],
+    )
+    await create_usuarios(
+        session,
+        [
+            {
+                "nome_usuario": f"u{i}",
+                "senha": "",
+                "email": f"u{i}@x",
+                "local_trabalho": None,
+            }
+            for i in range(VAGAS + 2)
+        ],
+    )
+    usuarios = (await get_usuarios(session)).itens
+    ids = await create_automoveis(
+        session,
+        [
+            {"usuario_id": u.id, "placa": f"P{u.id}", "tipo": "CARRO"}
+            for u in usuarios
+        ],
+    )
+    automoveis = [await get_automovel(session, i) for i in ids]
+    while esperar_tabela and await get_tabela(session) is None:
+        await session.commit()
+        await asyncio.sleep(0.01)
+    return list(zip(usuarios, automoveis))
+
+
+@pytest.mark.parametrize("esperar_tabela", [True, False])
+def test_onda_de_entradas(rodar, monkeypatch, esperar_tabela):
+    if not esperar_tabela:
+        # Nenhuma reconstrução em segundo plano: a onda calcula a tabela
+        monkeypatch.setattr(tabela, "_executar", lambda: None)
+        monkeypatch.setattr(tabela, "_agendada", False)
+        monkeypatch.setattr(tabela, "_tabela", None)
+
+    async def cenario():
+        async for session in get_session():
+            pedidos = await _preparar(session, esperar_tabela)
+            antes = await get_tabela(session)
+            # u0 chega duas vezes na mesma onda; sobram pedidos sem vaga
+            onda = [pedidos[0], *pedidos]
+            resultados = await registrar_entradas(session, onda)
+            # Na onda seguinte u1 já está dentro
+            repetido = await registrar_entradas(session, [pedidos[1]])
+            ocupacoes = (
+                await session.execute(select(Ocupacao.estacionamento_id))
+            ).scalars()
+            depois = await get_tabela(session)
+            return resultados, repetido, set(ocupacoes), antes, depois
+
+    resultados, repetido, ocupadas, antes, depois = rodar(cenario())
+    # Calculada para a onda, a tabela fica publicada para as seguintes
+    assert antes is not None if esperar_tabela else antes is None
+    assert depois is not None
+    entregues = [
+        r["estacionamento"].codigo_vaga
+        for r in resultados
+        if "estacionamento" in r
+    ]
+    # Quem chegou antes leva a vaga mais perto, sem repetir vaga
+    assert entregues == ["V1", "V2", "V3", "V4"]
+    assert resultados[1] == {"error": ENTRADA_ATIVA}
+    assert [r.get("error", "") for r in resultados[-2:]] == [
+        "Nenhuma vaga do tipo 'CARRO' está disponível no momento."
+    ] * 2
+    assert repetido == [{"error": ENTRADA_ATIVA}]
+    assert ocupadas == {
+        r["estacionamento"].id for r in resultados if "estacionamento" in r
+    }
+
+
+def test_onda_com_portao_desconhecido(rodar):
+    async def cenario():
+        async for session in get_session():
+            pedidos = await _preparar(session, False)
+            resultados = await registrar_entradas(
+                session, pedidos[:2], portao_id=999
+            )
+            ocupacoes = (
+                await session.execute(select(Ocupacao.estacionamento_id))
+            ).all()
+            return resultados, ocupacoes
+
+    resultados, ocupacoes = rodar(cenario())
+    assert resultados == [{"error": PORTAO_DESCONHECIDO}] * 2
+    assert ocupacoes == []
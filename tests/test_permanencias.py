@@ -0,0 +1,123 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, select
+
+from tropicalcode.database import engine, get_session
+from tropicalcode.models import Permanencia
+from tropicalcode.repositorios.automovel_repo import create_automoveis
+from tropicalcode.repositorios.estacionamento_repo import (
+    create_estacionamentos,
+)
+from tropicalcode.repositorios.registro_atividade_repo import (
+    create_registros,
+    delete_registro,
+    reconstruir_permanencias,
+)
+from tropicalcode.repositorios.usuario_repo import create_usuarios
+
+
+async def _permanencias(session):
+    result = await session.execute(
+        select(Permanencia).order_by(Permanencia.entrada_id)
+    )
+    return [
+        (p.entrada_id, p.saida_id, p.duracao, p.automovel_id)
+        for p in result.scalars()
+    ]
+
+
+async def _historico(session, n):
+    usuarios = await create_usuarios(
+        session,
+        [
+            {
+                "nome_usuario": f"u{i}",
+                "senha": "",
+                "email": f"u{i}@x",
+                "local_trabalho": None,
+            }
+            for i in range(n)
+        ],
+    )
+    vagas = await create_estacionamentos(
+        session,
+        [
+            {
+                "codigo_vaga": f"V{i}",
+                "tipo_vaga": "CARRO",
+                "posicao_geral": i,
+                "posicao_x": 1,
+                "posicao_y": i,
+            }
+            for i in range(n)
+        ],
+    )
+    automoveis = await create_automoveis(
+        session,
+        [
+            {"usuario_id": u, "placa": f"P{u}", "tipo": "CARRO"}
+            for u in usuarios
+        ],
+    )
+    inicio = datetime(2026, 1, 5, 8)
+    dados = [
+        {
+            "estacionamento_id": v,
+            "usuario_id": u,
+            "tipo": tipo,
+            "horario": inicio + timedelta(days=dia, hours=horas),
+            "caminho": "/teste",
+        }
+        for dia in range(3)
+        for u, v in zip(usuarios, vagas)
+        for tipo, horas in (("ENTRADA", 0), ("SAIDA", 9))
+    ]
+    await create_registros(session, dados)
+
+    # O histórico não registra o automóvel: só a permanência o guarda
+    result = await session.execute(select(Permanencia))
+    for p, a in zip(result.scalars(), automoveis * 3):
+        p.automovel_id = a
+    await session.commit()
+
+
+def _comandos_ao_reconstruir(rodar, n):
+    comandos = []
+
+    def contar(*_):
+        comandos.append(1)
+
+    async def cenario():
+        async for session in get_session():
+            await _historico(session, n)
+            antes = await _permanencias(session)
+            event.listen(engine.sync_engine, "before_cursor_execute", contar)
+            try:
+                await reconstruir_permanencias(session)
+            finally:
+                event.remove(
+                    engine.sync_engine, "before_cursor_execute", contar
+                )
+            assert await _permanencias(session) == antes
+
+    rodar(cenario())
+    return len(comandos)
+
+
+def test_reconstruir_guarda_automovel_sem_n_mais_1(rodar):
+    # O número de comandos não cresce com as permanências
+    assert _comandos_ao_reconstruir(rodar, 2) == _comandos_ao_reconstruir(
+        rodar, 20
+    )
+
+
+def test_reconstruir_tira_permanencia_da_entrada_apagada(rodar):
+    async def cenario():
+        async for session in get_session():
+            await _historico(session, 2)
+            antes = await _permanencias(session)
+            await delete_registro(session, antes[0][0])
+            return antes, await _permanencias(session)
+
+    antes, depois = rodar(cenario())
+    assert depois == antes[1:]
@@ -0,0 +1,70 @@
+from sqlalchemy import update
+
+from tropicalcode.database import get_session
+from tropicalcode.models import Estacionamento, Usuario
+from tropicalcode.repositorios import versoes
+from tropicalcode.repositorios.estacionamento_repo import (
+    create_estacionamento,
+    get_estacionamento,
+)
+from tropicalcode.repositorios.usuario_repo import (
+    create_usuario,
+    get_usuario_por_nome,
+)
+
+
+async def _escrita_de_outro_processo(session, comando, versao):
+    # Mesma escrita que outra página faria: não limpa os caches deste
+    # processo, só sobe a versão no banco
+    await session.execute(comando)
+    await versoes.subir(session, versao)
+    await session.commit()
+
+
+def test_cache_ve_escrita_de_outro_processo(rodar):
+    async def cenario():
+        async for session in get_session():
+            vaga = await create_estacionamento(
+                session,
+                {
+                    "codigo_vaga": "A1",
+                    "tipo_vaga": "CARRO",
+                    "posicao_geral": 1,
+                    "posicao_x": 1,
+                    "posicao_y": 1,
+                },
+            )
+            await create_usuario(
+                session,
+                {
+                    "nome_usuario": "ana",
+                    "senha": "",
+                    "email": "ana@x",
+                    "local_trabalho": None,
+                },
+            )
+            # Lidas duas vezes para estarem no cache
+            for _ in range(2):
+                await get_estacionamento(session, vaga.id)
+                await get_usuario_por_nome(session, "ana")
+                await session.commit()
+
+            await _escrita_de_outro_processo(
+                session,
+                update(Estacionamento)
+                .where(Estacionamento.id == vaga.id)
+                .values(tipo_vaga="MOTO"),
+                versoes.MAPA,
+            )
+            await _escrita_de_outro_processo(
+                session,
+                update(Usuario)
+                .where(Usuario.nome_usuario == "ana")
+                .values(email="ana@y"),
+                versoes.USUARIOS,
+            )
+            vaga = await get_estacionamento(session, vaga.id)
+            usuario = await get_usuario_por_nome(session, "ana")
+            return vaga.tipo_vaga, usuario.email
+
+    assert rodar(cenario()) == ("MOTO", "ana@y")
@@ -0,0 +1,263 @@
+"""Grafo compilado e CSR contra o roteamento original.
+
+O oráculo é o build_graph célula a célula e o dijkstra de passo 1 de
+antes da compilação, copiados aqui como eram: a busca única a partir da
+origem, a ligação pelo índice espacial e a contração dos trechos retos
+têm de dar as mesmas distâncias e as mesmas escolhas.
+"""
+
+import heapq
+import random
+
+import pytest
+
+from tropicalcode.roteamento.cache import montar_grafo
+from tropicalcode.roteamento.csr import GrafoCSR
+from tropicalcode.roteamento.delta import Trecho
+from tropicalcode.roteamento.grafo import (
+    conectar_nos,
+    contrair,
+    dijkstra,
+    expandir_caminhos,
+)
+
+ORIGEM = (0, 0)
+TIPOS = ["MOTO", "CARRO"]
+
+
+def build_graph_original(caminhos, especiais):
+    graph = {}
+
+    for c in caminhos:
+        o = (c.origem_x, c.origem_y)
+        d = (c.destino_x, c.destino_y)
+
+        if o not in graph:
+            graph[o] = []
+        if d not in graph:
+            graph[d] = []
+
+        current = o
+        while current != d:
+            if current not in graph:
+                graph[current] = []
+
+            next_node = None
+            if current[0] < d[0]:
+                next_node = (current[0] + 1, current[1])
+            elif current[0] > d[0]:
+                next_node = (current[0] - 1, current[1])
+            elif current[1] < d[1]:
+                next_node = (current[0], current[1] + 1)
+            elif current[1] > d[1]:
+                next_node = (current[0], current[1] - 1)
+            else:
+                break
+
+            if next_node not in graph:
+                graph[next_node] = []
+
+            ida = c.direcao in ("IDA", "AMBOS")
+            if ida and next_node not in graph[current]:
+                graph[current].append(next_node)
+            volta = c.direcao in ("VOLTA", "AMBOS")
+            if volta and current not in graph[next_node]:
+                graph[next_node].append(current)
+
+            current = next_node
+
+    for pos in especiais:
+        if pos not in graph:
+            graph[pos] = []
+
+        for node, vizinhos in graph.items():
+            alinhado = node[0] == pos[0] or node[1] == pos[1]
+            perto = abs(node[0] - pos[0]) + abs(node[1] - pos[1]) <= 1.5
+            if node != pos and alinhado and perto:
+                if pos not in vizinhos:
+                    vizinhos.append(pos)
+                if node not in graph[pos]:
+                    graph[pos].append(node)
+
+    return graph
+
+
+def dijkstra_original(graph, start, target):
+    queue = [(0, start)]
+    visited = set()
+    while queue:
+        dist, node = heapq.heappop(queue)
+        if node == target:
+            return dist
+        if node in visited:
+            continue
+        visited.add(node)
+        for neigh in graph.get(node, []):
+            heapq.heappush(queue, (dist + 1, neigh))
+    return float("inf")
+
+
+def distancia_original(caminhos, pos):
+    # calcular_distancia: grafo só com a vaga
+    graph = build_graph_original(caminhos, [pos])
+    if ORIGEM not in graph or pos not in graph:
+        return float("inf")
+    return dijkstra_original(graph, ORIGEM, pos)
+
+
+def escolha_original(caminhos, compativeis, local):
+    # find_best_for_user: grafo com todas as compatíveis e o local de
+    # trabalho, primeira vaga da lista com a menor distância
+    especiais = list(compativeis.values())
+    if local is not None:
+        especiais.append(local)
+    graph = build_graph_original(caminhos, especiais)
+    if ORIGEM not in graph:
+        return None
+    menor, menor_dist = None, float("inf")
+    for vaga_id, pos in compativeis.items():
+        d = dijkstra_original(graph, ORIGEM, pos)
+        if d < menor_dist:
+            menor, menor_dist = vaga_id, d
+    return menor
+
+
+def escolha_compilada(grafo, compativeis, local):
+    ativos = set(compativeis.values())
+    if local is not None:
+        ativos.add(local)
+    mais_proximos = grafo.mais_proximos(
+        ORIGEM, set(compativeis.values()), ativos
+    )
+    for vaga_id, pos in compativeis.items():
+        if pos in mais_proximos:
+            return vaga_id
+    return None
+
+
+def _trecho(r, n):
+    while True:
+        x, y = r.randrange(n), r.randrange(n)
+        if r.random() < 0.5:
+            x2, y2 = r.randrange(n), y
+        else:
+            x2, y2 = x, r.randrange(n)
+        if (x, y) != (x2, y2):
+            break
+    # Origem e destino em qualquer ordem: o sentido de IDA e VOLTA segue
+    return Trecho(x, y, x2, y2, r.choice(["IDA", "VOLTA", "AMBOS"]))
+
+
+def _posicao(r, n):
+    # Vagas também em meia célula, fora da grade dos caminhos
+    x, y = float(r.randrange(n)), float(r.randrange(n))
+    meia = r.random()
+    if meia < 0.2:
+        x += 0.5
+    elif meia < 0.4:
+        y += 0.5
+    return x, y
+
+
+def _mapa(semente):
+    r = random.Random(semente)
+    n = r.choice([5, 8, 12])
+    caminhos = [_trecho(r, n) for _ in range(r.randrange(1, 14))]
+    # O portão sempre na ponta de um caminho, como nos lotes reais
+    caminhos.append(Trecho(0, 0, r.randrange(1, n), 0, "AMBOS"))
+    vagas = {}
+    for i in range(1, r.randrange(2, 20)):
+        pos = _posicao(r, n)
+        if pos not in vagas.values():
+            vagas[i] = pos
+    tipos = {i: r.choice(TIPOS) for i in vagas}
+    local = (float(r.randrange(n)), float(r.randrange(n)))
+    return caminhos, vagas, tipos, local
+
+
+def _montados(caminhos, vagas, tipos, local):
+    args = (caminhos, vagas, {1: local}, tipos, {None: ORIGEM})
+    return montar_grafo(1, *args), GrafoCSR.de_caminhos(1, *args)
+
+
+def _compativeis(vagas, tipos, tipo):
+    return {i: pos for i, pos in vagas.items() if tipos[i] == tipo}
+
+
+MAPA_PEQUENO = (
+    [
+        Trecho(0, 0, 4, 0, "AMBOS"),
+        # Mão única: de (4, 0) sobe até (4, 3), não desce
+        Trecho(4, 0, 4, 3, "IDA"),
+        Trecho(4, 3, 0, 3, "AMBOS"),
+        # Só se desce por aqui, de (0, 3) para (0, 1)
+        Trecho(0, 1, 0, 3, "VOLTA"),
+    ],
+    {
+        1: (2.0, 1.0),
+        2: (5.0, 2.0),
+        3: (1.0, 1.0),
+        4: (2.5, 3.0),
+        5: (0.0, 1.5),
+        6: (7.0, 7.0),
+    },
+    {1: "CARRO", 2: "CARRO", 3: "MOTO", 4: "CARRO", 5: "MOTO", 6: "CARRO"},
+    (4.0, 4.0),
+)
+
+
+@pytest.mark.parametrize(
+    "mapa", [MAPA_PEQUENO, *map(_mapa, range(60))], ids=lambda m: ""
+)
+def test_distancias_iguais_ao_original(mapa):
+    caminhos, vagas, tipos, local = mapa
+    compilado, csr = _montados(caminhos, vagas, tipos, local)
+    de_compilado = compilado.distancias_vagas(ORIGEM)
+    de_csr = csr.distancias_vagas(ORIGEM)
+    for vaga_id, pos in vagas.items():
+        esperada = distancia_original(caminhos, pos)
+        inf = float("inf")
+        assert de_compilado.get(vaga_id, inf) == esperada
+        assert de_csr.get(vaga_id, inf) == esperada
+        assert compilado.distancia(ORIGEM, pos) == esperada
+        assert csr.distancia(ORIGEM, pos) == esperada
+
+
+@pytest.mark.parametrize(
+    "mapa", [MAPA_PEQUENO, *map(_mapa, range(60))], ids=lambda m: ""
+)
+def test_escolha_igual_a_original(mapa):
+    caminhos, vagas, tipos, local = mapa
+    compilado, _ = _montados(caminhos, vagas, tipos, local)
+    for tipo in TIPOS:
+        compativeis = _compativeis(vagas, tipos, tipo)
+        for com_local in (None, local):
+            assert escolha_compilada(
+                compilado, compativeis, com_local
+            ) == escolha_original(caminhos, compativeis, com_local)
+
+
+@pytest.mark.parametrize("semente", range(30))
+def test_ligacao_pelo_indice_igual_a_original(semente):
+    caminhos, vagas, _, local = _mapa(semente)
+    especiais = [*vagas.values(), local]
+    original = build_graph_original(caminhos, especiais)
+    indexado = conectar_nos(expandir_caminhos(caminhos), especiais)
+    assert {k: set(v) for k, v in indexado.items()} == {
+        k: set(v) for k, v in original.items()
+    }
+
+
+@pytest.mark.parametrize("semente", range(30))
+def test_contracao_mantem_distancias(semente):
+    caminhos, vagas, _, local = _mapa(semente)
+    especiais = [*vagas.values(), local]
+    original = build_graph_original(caminhos, especiais)
+    # Só portão e especiais ficam fixos: o resto dos trechos retos some
+    fixos = {ORIGEM, *especiais}
+    contraido = contrair(original, fixos)
+    assert len(contraido) <= len(original)
+    for destino in especiais:
+        for origem in (ORIGEM, local):
+            esperada = dijkstra_original(original, origem, destino)
+            assert dijkstra(contraido, origem, destino) == esperada
@@ -0,0 +1,156 @@
+import random
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, func, select
+
+from tropicalcode.database import get_session
+from tropicalcode.models import Snapshot, SnapshotOcupacao
+from tropicalcode.repositorios.estacionamento_repo import (
+    create_estacionamentos,
+)
+from tropicalcode.repositorios.registro_atividade_repo import (
+    arquivar_registros,
+    create_registros,
+    update_registro,
+)
+from tropicalcode.repositorios.snapshot_repo import (
+    invalidar_snapshots,
+    ocupacoes_em,
+    tirar_snapshot,
+)
+from tropicalcode.repositorios.usuario_repo import create_usuarios
+
+INICIO = datetime.now(timezone.utc).replace(microsecond=0) - timedelta(
+    days=100
+)
+VAGAS = 4
+USUARIOS = 6
+EVENTOS = 60
+
+
+def _historico(vagas, usuarios):
+    # Entradas e saídas coerentes, uma a cada 12 horas
+    r = random.Random(0)
+    dentro = {}
+    linhas = []
+    for i in range(EVENTOS):
+        usuario = r.choice(usuarios)
+        livres = sorted(set(vagas) - set(dentro.values()))
+        if usuario in dentro:
+            vaga, tipo = dentro.pop(usuario), "SAIDA"
+        elif livres:
+            vaga, tipo = r.choice(livres), "ENTRADA"
+            dentro[usuario] = vaga
+        else:
+            continue
+        linhas.append({
+            "usuario_id": usuario,
+            "estacionamento_id": vaga,
+            "tipo": tipo,
+            "horario": INICIO + timedelta(hours=12 * i),
+            "caminho": "/teste",
+        })
+    return linhas
+
+
+def _repetir(linhas, ids, horario=None):
+    # A ocupação refeita à mão, registro a registro, na ordem do histórico
+    ocupadas = {}
+    for linha, id_ in sorted(
+        zip(linhas, ids), key=lambda par: (par[0]["horario"], par[1])
+    ):
+        if horario is not None and linha["horario"] > horario:
+            break
+        vaga = linha["estacionamento_id"]
+        if linha["tipo"] == "ENTRADA":
+            ocupadas[vaga] = (linha["usuario_id"], id_)
+        else:
+            ocupadas.pop(vaga, None)
+    return ocupadas
+
+
+def _consultas():
+    # Entre dois eventos, para não depender do formato do horário gravado
+    return [None] + [
+        INICIO + timedelta(hours=12 * i + 6) for i in range(-1, EVENTOS, 5)
+    ]
+
+
+async def _conferir(session, linhas, ids):
+    for horario in _consultas():
+        consulta = None if horario is None else horario.replace(tzinfo=None)
+        obtida = await ocupacoes_em(session, consulta)
+        assert obtida == _repetir(linhas, ids, horario), horario
+
+
+async def _snapshots(session):
+    return await session.scalar(select(func.count(Snapshot.id)))
+
+
+def test_ocupacoes_com_e_sem_snapshot(rodar):
+    async def cenario():
+        async for session in get_session():
+            vagas = await create_estacionamentos(
+                session,
+                [
+                    {
+                        "codigo_vaga": f"V{i}",
+                        "tipo_vaga": "CARRO",
+                        "posicao_geral": i,
+                        "posicao_x": 1,
+                        "posicao_y": i,
+                    }
+                    for i in range(VAGAS)
+                ],
+            )
+            usuarios = await create_usuarios(
+                session,
+                [
+                    {
+                        "nome_usuario": f"u{i}",
+                        "senha": "",
+                        "email": f"u{i}@x",
+                        "local_trabalho": None,
+                    }
+                    for i in range(USUARIOS)
+                ],
+            )
+            linhas = _historico(vagas, usuarios)
+
+            # Sem snapshot: o histórico inteiro é percorrido
+            metade = len(linhas) // 2
+            ids = await create_registros(session, linhas[:metade])
+            await _conferir(session, linhas[:metade], ids)
+
+            # Snapshots no meio e no fim do histórico
+            await tirar_snapshot(session)
+            ids += await create_registros(session, linhas[metade:])
+            await tirar_snapshot(session)
+            assert await _snapshots(session) == 2
+            await _conferir(session, linhas, ids)
+
+            # Parte do histórico vai para o arquivo
+            assert await arquivar_registros(session, 60) > 0
+            await _conferir(session, linhas, ids)
+
+            # Editar um registro apaga os snapshots que ele deixou errados
+            i = len(linhas) - 3
+            horario = linhas[i]["horario"] - timedelta(hours=30)
+            await update_registro(session, ids[i], {"horario": horario})
+            linhas[i] = {**linhas[i], "horario": horario}
+            assert await _snapshots(session) == 1
+            await _conferir(session, linhas, ids)
+
+            # Chamada direta: some o snapshot que cobre o registro
+            await invalidar_snapshots(session, ids[0], INICIO)
+            assert await _snapshots(session) == 0
+            await _conferir(session, linhas, ids)
+
+            # E sem snapshot nenhum o resultado é o mesmo
+            await tirar_snapshot(session)
+            await session.execute(delete(SnapshotOcupacao))
+            await session.execute(delete(Snapshot))
+            await session.commit()
+            await _conferir(session, linhas, ids)
+
+    rodar(cenario())
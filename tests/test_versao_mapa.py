@@ -0,0 +1,62 @@
+from tropicalcode.database import get_session
+from tropicalcode.models import Caminho, Estacionamento
+from tropicalcode.repositorios import versoes
+from tropicalcode.repositorios.estacionamento_repo import (
+    create_estacionamento,
+)
+from tropicalcode.roteamento.cache import get_grafo
+
+
+def _vaga(codigo, y):
+    return {
+        "codigo_vaga": codigo,
+        "tipo_vaga": "CARRO",
+        "posicao_geral": y,
+        "posicao_x": 1,
+        "posicao_y": y,
+    }
+
+
+async def _escrita_de_outro_processo(session, codigo, y):
+    # Mesma escrita que outra página faria: sem passar pelo cache deste
+    # processo, só subindo a versão no banco
+    session.add(Estacionamento(**_vaga(codigo, y)))
+    await versoes.subir(session, versoes.MAPA)
+    await session.commit()
+
+
+def test_grafo_ve_escrita_de_outro_processo(rodar):
+    async def cenario():
+        async for session in get_session():
+            session.add(Caminho(0, 0, 0, 10, "AMBOS"))
+            await versoes.subir(session, versoes.MAPA)
+            await session.commit()
+            await create_estacionamento(session, _vaga("A", 1))
+            antes = await get_grafo(session)
+
+            await _escrita_de_outro_processo(session, "B", 2)
+            depois = await get_grafo(session)
+            return antes, depois
+
+    antes, depois = rodar(cenario())
+    assert len(antes.vagas) == 1
+    assert len(depois.vagas) == 2
+    assert depois.versao == antes.versao + 1
+
+
+def test_edicao_depois_de_outro_processo_recompila(rodar):
+    async def cenario():
+        async for session in get_session():
+            session.add(Caminho(0, 0, 0, 10, "AMBOS"))
+            await versoes.subir(session, versoes.MAPA)
+            await session.commit()
+            await get_grafo(session)
+
+            # A edição deste processo não pode ser aplicada sobre um grafo
+            # que não tem a vaga B
+            await _escrita_de_outro_processo(session, "B", 2)
+            await create_estacionamento(session, _vaga("C", 3))
+            return await get_grafo(session)
+
+    grafo = rodar(cenario())
+    assert sorted(grafo.vagas.values()) == [(1, 2), (1, 3)]